@@ -1,35 +1,17 @@
-from collections import Counter
+import sys
 from pathlib import Path
-import Import
 
+# The counts come from the STEP entities, scanned by the pyocc tools without
+# importing any geometry into a FreeCAD document
+sys.path.append((Path(__file__).resolve().parent.parent / 'pyocc').as_posix())
+from step_scan import find_step_files, write_shape_stats
 
-def count_objects(step_file_path):
-    doc = App.newDocument('doc')
-    Import.insert(step_file_path, 'doc')
-    shape_types = [i.Shape.ShapeType for i in doc.Objects if hasattr(i, 'Shape')]
-    print(shape_types)
-
-    if len(shape_types) == 0:
-        print('no shapes found')
-
-    App.closeDocument('doc')
-    counts = Counter(shape_types)
-    return counts
 
 def main():
-    root = Path('../step_files')
-    step_file_paths = list(root.glob('**/*.stp')) + list(root.glob('**/*.STEP'))
+    step_file_paths = find_step_files(Path('../step_files'))
     outfile = Path('freecad_step_file_stats.csv')
-    with outfile.open('w') as f:
-        f.write('filepath,num_compsolids,num_compounds,num_solids\n')
-
-    for step_file_path in step_file_paths:
-        counts = count_objects(step_file_path.as_posix())
-        print(counts)
-        num_compsolids = counts.get('CompSolids', 0)
-        num_compounds = counts.get('Compound', 0)
-        num_solids = counts.get('Solid', 0)
-        with outfile.open('a') as f:
-            f.write(f'{step_file_path.as_posix()},{num_compsolids},{num_compounds},{num_solids}\n')
+    # FreeCAD's embedded interpreter cannot start worker processes
+    write_shape_stats(step_file_paths, outfile, workers=1)
+    print(f'counted objects of {len(step_file_paths)} files into {outfile}')
 
 main()
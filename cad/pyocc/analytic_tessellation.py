@@ -0,0 +1,148 @@
+from typing import Any, List, Optional, Tuple
+
+import OCC.Core.GeomAbs as G
+import numpy as np
+from OCC.Core.BRepAdaptor import BRepAdaptor_Surface
+from OCC.Core.TopAbs import TopAbs_REVERSED
+
+from grid_density import DensityPolicy
+from uv_classify import face_uv_polygons
+from uv_triangulate import clean_ring, simplify_ring, points_in_rings, triangulate_rings
+
+# Surface types with a dedicated tessellator, every other type goes through
+# the NURBS grid
+ANALYTIC_TYPES = (G.GeomAbs_Plane, G.GeomAbs_Cylinder, G.GeomAbs_Cone)
+
+
+def _coords(v: Any) -> np.ndarray:
+    return np.array(v.Coord())
+
+
+def _frame(ax3: Any) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    # Origin and X, Y, Z directions of a gp_Ax3
+    return (_coords(ax3.Location()), _coords(ax3.XDirection()),
+            _coords(ax3.YDirection()), _coords(ax3.Direction()))
+
+
+def _face_rings(face: Any, uv_rings: Optional[List[np.ndarray]] = None) -> Optional[List[np.ndarray]]:
+    polygons = face_uv_polygons(face) if uv_rings is None else uv_rings
+    if not polygons:
+        return None
+    extent = np.ptp(np.vstack(polygons), axis=0).max()
+    rings = [clean_ring(p, 1e-9 * extent) for p in polygons]
+    if any(r.shape[0] < 3 for r in rings):
+        return None
+    return rings
+
+
+def _angular_step(radius: float, policy: DensityPolicy) -> float:
+    # Angle subtended by a chord that deviates chord_tol from the circle and
+    # is no longer than max_edge_length
+    step = np.pi / 2
+    if policy.chord_tol < radius:
+        step = min(step, 2. * np.arccos(1. - policy.chord_tol / radius))
+    if policy.max_edge_length < 2. * radius:
+        step = min(step, 2. * np.arcsin(policy.max_edge_length / (2. * radius)))
+    return step
+
+
+def _is_rectangle(rings: List[np.ndarray], eps: float) -> bool:
+    # A single ring running along the sides of its bounding box
+    if len(rings) != 1:
+        return False
+    ring = rings[0]
+    lo, hi = ring.min(axis=0), ring.max(axis=0)
+    on_side = (np.abs(ring - lo) < eps) | (np.abs(ring - hi) < eps)
+    return bool(on_side.any(axis=1).all())
+
+
+def _tessellate_plane(adaptor: Any, rings: List[np.ndarray], policy: DensityPolicy,
+                      simplify: bool = True) -> Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    # UV is an isometry of the plane: the boundary polygon, simplified to the
+    # chord tolerance unless its vertices are shared, is triangulated as is
+    if simplify:
+        rings = [simplify_ring(r, policy.chord_tol) for r in rings]
+    triangulation = triangulate_rings(rings)
+    if triangulation is None:
+        return None
+    UV, tris = triangulation
+    O, X, Y, _ = _frame(adaptor.Plane().Position())
+    XYZ = O + UV[:, 0:1] * X + UV[:, 1:2] * Y
+    return UV, XYZ, tris
+
+
+def _tessellate_ruled(adaptor: Any, rings: List[np.ndarray], policy: DensityPolicy,
+                      band: bool = True) -> Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    # U is the angle around the axis and V runs along the straight rulings.
+    # Only U is sampled; along V the mesh needs no more than the trimming
+    # boundary and the max edge length. Untrimmed bands get a plain grid
+    # when `band` is set, which replaces their boundary vertices.
+    stype = adaptor.GetType()
+    if stype == G.GeomAbs_Cylinder:
+        surface = adaptor.Cylinder()
+        R0, sin_a, cos_a = surface.Radius(), 0., 1.
+    else:
+        surface = adaptor.Cone()
+        R0, sin_a, cos_a = surface.RefRadius(), np.sin(surface.SemiAngle()), np.cos(surface.SemiAngle())
+    O, X, Y, Z = _frame(surface.Position())
+
+    (U1, V1), (U2, V2) = np.vstack(rings).min(axis=0), np.vstack(rings).max(axis=0)
+    radius = max(abs(R0 + V1 * sin_a), abs(R0 + V2 * sin_a))
+    NU = policy.clamp(int(np.ceil((U2 - U1) / _angular_step(radius, policy))) + 1)
+    NV = max(int(np.ceil((V2 - V1) / policy.max_edge_length)) + 1, 2)
+    Ulist = np.linspace(U1, U2, NU)
+    Vlist = np.linspace(V1, V2, NV)
+
+    if band and _is_rectangle(rings, 1e-7 * max(U2 - U1, V2 - V1)):
+        # Untrimmed band: one strip of quads between the boundary circles
+        Ugrid, Vgrid = np.meshgrid(Ulist, Vlist)
+        UV = np.column_stack((Ugrid.ravel(), Vgrid.ravel()))
+        k = np.arange(NU - 1)[None, :] + NU * np.arange(NV - 1)[:, None]
+        a, b, c, d = k.ravel(), k.ravel() + 1, k.ravel() + NU + 1, k.ravel() + NU
+        tris = np.vstack((np.column_stack((a, b, c)), np.column_stack((a, c, d))))
+    else:
+        # Trimmed: the boundary plus the ruling samples strictly inside it
+        Ugrid, Vgrid = np.meshgrid(Ulist[1:-1], Vlist[1:-1])
+        steiner = np.column_stack((Ugrid.ravel(), Vgrid.ravel()))
+        steiner = steiner[points_in_rings(steiner, rings)]
+        triangulation = triangulate_rings(rings, steiner)
+        if triangulation is None:
+            return None
+        UV, tris = triangulation
+
+    r = R0 + UV[:, 1:2] * sin_a
+    XYZ = O + r * (np.cos(UV[:, 0:1]) * X + np.sin(UV[:, 0:1]) * Y) + UV[:, 1:2] * cos_a * Z
+    return UV, XYZ, tris
+
+
+def tessellate_analytic_face(face: Any, policy: DensityPolicy,
+                             uv_rings: Optional[List[np.ndarray]] = None) -> Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    """
+    Tessellates planar, cylindrical and conical faces directly from their
+    surface definition and trimming boundary. Returns the UV vertices, the
+    XYZ vertices and the triangles oriented along the face normal, or None
+    if `face` is of another surface type (or has no pcurves, or a boundary
+    that does not triangulate) and needs the NURBS grid.
+    The boundary is `uv_rings`, the shared edge samples of the wires, kept
+    vertex for vertex so that neighbouring faces meet on them; without them
+    the pcurves are sampled here.
+    """
+    adaptor = BRepAdaptor_Surface(face)
+    stype = adaptor.GetType()
+    if stype not in ANALYTIC_TYPES:
+        return None
+    rings = _face_rings(face, uv_rings)
+    if rings is None:
+        return None
+    shared = uv_rings is not None
+    if stype == G.GeomAbs_Plane:
+        tessellation = _tessellate_plane(adaptor, rings, policy, simplify=not shared)
+    else:
+        tessellation = _tessellate_ruled(adaptor, rings, policy, band=not shared)
+    if tessellation is None:
+        # The boundary could not be recovered as triangle edges
+        return None
+    UV, XYZ, tris = tessellation
+    if face.Orientation() == TopAbs_REVERSED:
+        tris = tris[:, [0, 2, 1]]
+    return UV, XYZ, tris
@@ -0,0 +1,165 @@
+"""
+Stage-level benchmark of the trimmed-face exporter.
+
+Every STEP file is processed in a fresh worker process, so that its peak RSS
+is not inflated by earlier files. Faces go through the exporter's own
+`_export_face` with a StageTimer, so the numbers are those of the production
+code path for the engine and options of the density policy:
+
+    read          STEPControl_Reader.ReadFile
+    transfer      TransferRoot
+    nurbs         NURBS conversion and B-spline data extraction
+    density       grid resolution from size and curvature
+    classify      UV grid classification against the trim
+    triangulate   quadtree refinement, analytic, cdt or occ meshing
+    surface_eval  surface evaluation at the mesh vertices
+    curves        shared edge, curve and pcurve sampling
+    stitch        snapping boundary quad vertices onto the boundary curves
+    serialize     writing the face meshes to a binary mesh file
+
+Usage:
+
+    python synthetic_step.py /tmp/bench_steps
+    python benchmark_stages.py --step-dir /tmp/bench_steps --output run_a
+    python benchmark_stages.py --step-dir /tmp/bench_steps --output run_b --baseline run_a.json
+"""
+import argparse
+import json
+import resource
+import tempfile
+from contextlib import ExitStack
+from dataclasses import asdict
+from multiprocessing import Pool
+from pathlib import Path
+from typing import Dict, Tuple
+
+from OCC.Core.IFSelect import IFSelect_RetDone
+from OCC.Core.STEPControl import STEPControl_Reader
+
+import pyocc_export_trimmed_faces_w_stitching as exporter
+from face_selection import FaceSelection, add_face_selection_args, face_selection_from_args, \
+    iter_selected_faces
+from grid_density import DensityPolicy, add_density_args, density_policy_from_args
+from mesh_io import MeshFileWriter
+from occ_mesh import mesh_shape
+from stage_timer import STAGES, StageTimer
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.
+
+
+def benchmark_file(step_file: str, policy: DensityPolicy, selection: FaceSelection) -> Dict:
+    timer = StageTimer()
+    with timer.stage('read'):
+        step_reader = STEPControl_Reader()
+        status = step_reader.ReadFile(step_file)
+    if status != IFSelect_RetDone:
+        raise ValueError(f'Error parsing STEP file {step_file}')
+    with timer.stage('transfer'):
+        step_reader.TransferRoot()
+        shape = step_reader.Shape()
+
+    if policy.engine == 'occ':
+        with timer.stage('triangulate'):
+            mesh_shape(shape, policy)
+    with timer.stage('curves'):
+        exporter._init_edges(shape, policy.chord_tol)
+    n_faces, n_failed = 0, 0
+    with ExitStack() as stack:
+        tmp_dir = stack.enter_context(tempfile.TemporaryDirectory())
+        writer = stack.enter_context(MeshFileWriter(Path(tmp_dir) / 'bench.bin'))
+        for i, face in iter_selected_faces(shape, selection):
+            n_faces += 1
+            try:
+                face_meshes = exporter._export_face(i, face, policy, timer)
+            except Exception as e:
+                print(f'\tface {i} failed: {e}')
+                n_failed += 1
+                continue
+            with timer.stage('serialize'):
+                for mesh in face_meshes:
+                    writer.append(mesh.to_arrays())
+
+    return {'filepath': step_file, 'num_faces': n_faces, 'num_failed_faces': n_failed,
+            'peak_rss_mb': _peak_rss_mb(), 'seconds': timer.seconds}
+
+
+def _benchmark_file_task(task: Tuple[str, DensityPolicy, FaceSelection]) -> Dict:
+    step_file, policy, selection = task
+    print(f'processing {step_file}')
+    return benchmark_file(step_file, policy, selection)
+
+
+def _totals(report: Dict) -> Dict[str, float]:
+    return {stage: sum(f['seconds'].get(stage, 0.) for f in report['files']) for stage in STAGES}
+
+
+def write_report(report: Dict, output: Path) -> None:
+    """
+    Writes `report` to `output`.json and one row per file to `output`.csv
+    """
+    with output.with_suffix('.json').open('w') as f:
+        json.dump(report, f, indent=2)
+    with output.with_suffix('.csv').open('w') as f:
+        f.write(','.join(['filepath', 'num_faces', 'num_failed_faces', 'peak_rss_mb', *STAGES, 'total']) + '\n')
+        for r in report['files']:
+            seconds = [r['seconds'][stage] for stage in STAGES]
+            row = [r['filepath'], r['num_faces'], r['num_failed_faces'], f'{r["peak_rss_mb"]:.1f}',
+                   *[f'{s:.4f}' for s in seconds], f'{sum(seconds):.4f}']
+            f.write(','.join(map(str, row)) + '\n')
+
+
+def print_diff(baseline: Dict, report: Dict) -> None:
+    """
+    Per-stage totals of two reports side by side, over the files both contain
+    """
+    common = {f['filepath'] for f in baseline['files']} & {f['filepath'] for f in report['files']}
+    old = _totals({'files': [f for f in baseline['files'] if f['filepath'] in common]})
+    new = _totals({'files': [f for f in report['files'] if f['filepath'] in common]})
+    print(f'{len(common)} files in common')
+    print(f'{"stage":<14}{"baseline":>12}{"current":>12}{"ratio":>8}')
+    for stage in [*STAGES, 'total']:
+        a = sum(old.values()) if stage == 'total' else old[stage]
+        b = sum(new.values()) if stage == 'total' else new[stage]
+        ratio = f'{b / a:.2f}' if a > 0 else '-'
+        print(f'{stage:<14}{a:>12.3f}{b:>12.3f}{ratio:>8}')
+
+
+def _process_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Time the stages of the STEP to mesh pipeline')
+    parser.add_argument('--step-dir', dest='step_dir', action='store', default='../step_files',
+                        help='directory searched recursively for STEP files')
+    parser.add_argument('--output', dest='output', action='store', default='benchmark_stages',
+                        help='report path without suffix; .json and .csv are written')
+    parser.add_argument('--baseline', dest='baseline', action='store', default=None,
+                        help='JSON report of an earlier run to compare against')
+    add_density_args(parser)
+    add_face_selection_args(parser)
+    return parser.parse_args()
+
+
+def main():
+    args = _process_args()
+    policy = density_policy_from_args(args)
+    root = Path(args.step_dir)
+    step_files = sorted(list(root.glob('**/*.stp')) + list(root.glob('**/*.STEP')))
+    selection = face_selection_from_args(args)
+    tasks = [(step_file.as_posix(), policy, selection) for step_file in step_files]
+
+    # One fresh process per file, so that peak RSS is measured per file
+    with Pool(1, maxtasksperchild=1) as pool:
+        files = list(pool.imap(_benchmark_file_task, tasks))
+
+    report = {'policy': asdict(policy), 'files': files}
+    report['totals'] = _totals(report)
+    write_report(report, Path(args.output))
+
+    if args.baseline is not None:
+        with Path(args.baseline).open() as f:
+            print_diff(json.load(f), report)
+
+
+if __name__ == '__main__':
+    main()
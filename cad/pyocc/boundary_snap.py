@@ -0,0 +1,88 @@
+from typing import List, Optional, Tuple
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+
+def boundary_face_vertices(faces: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Vertices of the boundary faces (face type 1-3) and of the interior faces
+    (face type 4) of surface `faces` whose last column is the face type.
+    `faces` may also be a list of rows of different lengths.
+    """
+    rows = [faces] if isinstance(faces, np.ndarray) else [np.asarray(r)[None, :] for r in faces]
+    boundary, interior = [], []
+    for F in rows:
+        if F.shape[0] == 0:
+            continue
+        types = F[:, -1]
+        boundary.append(F[(types > 0) & (types < 4), :-1].ravel())
+        interior.append(F[types == 4, :-1].ravel())
+    empty = np.zeros((0, ), dtype=np.int64)
+    return (np.unique(np.concatenate(boundary)) if boundary else empty,
+            np.unique(np.concatenate(interior)) if interior else empty)
+
+
+class BoundaryPolyline:
+    """
+    Boundary curve samples of a face with their polyline segments and, when
+    every pcurve is available, the UV of each sample
+    """
+    def __init__(self, points: List[np.ndarray], edges: List[np.ndarray],
+                 uv: Optional[List[np.ndarray]] = None):
+        offsets = np.cumsum([0] + [p.shape[0] for p in points])[:-1]
+        self.points = np.vstack(points).astype(np.float64)
+        self.segments = np.vstack([e.reshape(-1, 2) + o for e, o in zip(edges, offsets)]).astype(np.int64)
+        self.uv = None
+        if uv is not None and all(u.shape[0] == p.shape[0] for u, p in zip(uv, points)):
+            self.uv = np.vstack(uv).astype(np.float64)
+        n = self.points.shape[0]
+        self._next = np.full(n, -1, dtype=np.int64)
+        self._prev = np.full(n, -1, dtype=np.int64)
+        self._next[self.segments[:, 0]] = np.arange(self.segments.shape[0])
+        self._prev[self.segments[:, 1]] = np.arange(self.segments.shape[0])
+        self.tree = cKDTree(self.points)
+
+    def project(self, X: np.ndarray) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """
+        Closest points of the polyline to the points `X`, searched on the
+        segments around the nearest sample of each point, and their UV
+        interpolated along the same segments
+        """
+        _, nearest = self.tree.query(X)
+        best_xyz = self.points[nearest]
+        best_uv = self.uv[nearest] if self.uv is not None else None
+        best_d = np.linalg.norm(X - best_xyz, axis=1)
+        for incident in (self._prev[nearest], self._next[nearest]):
+            valid = incident >= 0
+            s = self.segments[np.where(valid, incident, 0)]
+            a, b = self.points[s[:, 0]], self.points[s[:, 1]]
+            ab = b - a
+            ab2 = np.einsum('ij,ij->i', ab, ab)
+            t = np.clip(np.einsum('ij,ij->i', X - a, ab) / np.where(ab2 > 0., ab2, 1.), 0., 1.)
+            xyz = a + t[:, None] * ab
+            d = np.linalg.norm(X - xyz, axis=1)
+            better = valid & (d < best_d)
+            best_xyz[better] = xyz[better]
+            best_d[better] = d[better]
+            if best_uv is not None:
+                uv = self.uv[s[:, 0]] + t[:, None] * (self.uv[s[:, 1]] - self.uv[s[:, 0]])
+                best_uv[better] = uv[better]
+        return best_xyz, best_uv
+
+
+def snap_vertices(XYZ: np.ndarray, UV: Optional[np.ndarray], vertices: np.ndarray,
+                  polyline: BoundaryPolyline) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """
+    Copies of `XYZ` and `UV` with the `vertices` moved onto `polyline` in
+    one batched query
+    """
+    XYZ = np.array(XYZ, dtype=np.float64)
+    UV = None if UV is None else np.array(UV, dtype=np.float64)
+    if vertices.shape[0] == 0:
+        return XYZ, UV
+    xyz, uv = polyline.project(XYZ[vertices])
+    XYZ[vertices] = xyz
+    if UV is not None and uv is not None:
+        UV[vertices] = uv
+    return XYZ, UV
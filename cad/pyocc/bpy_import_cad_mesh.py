@@ -4,8 +4,14 @@ import pickle
 import sys
 from pathlib import Path
 
+sys.path.insert(0, str(Path(__file__).parent))
+import numpy as np
+
+from mesh_io import face_groups, iter_meshes, surface_meshes
+
 try:
     import bpy
+    from mathutils import Matrix
     import aarwild_bpy.funcs as F
 except:
     print('cannot import `bpy`')
@@ -30,21 +36,75 @@ def _process_args() -> argparse.Namespace:
     args = parser.parse_args(argv)
     return args
 
+def _as_list(a):
+    # Arrays from the binary mesh file are converted to the nested lists
+    # that `from_pydata` expects; JSON meshes are already lists
+    if isinstance(a, list):
+        return [row.tolist() if hasattr(row, 'tolist') else row for row in a]
+    return a.tolist()
+
+def _vertices_3d(vertices):
+    # Pcurve vertices are UV points, placed on the z = 0 plane
+    V = np.asarray(vertices, dtype=np.float64)
+    V = V.reshape(-1, V.shape[-1]) if V.size else np.zeros((0, 3))
+    if V.shape[1] == 2:
+        V = np.column_stack((V, np.zeros(V.shape[0])))
+    return V.tolist()
+
+def _record_meshes(record):
+    """
+    (object suffix, vertices, edges, faces) of every mesh of an exported
+    record: flat records of the trimmed face exporters, and surface, curves
+    and pcurves of the records of the stitching exporter, whose face type
+    column is dropped
+    """
+    for mesh, has_face_types in surface_meshes(record):
+        faces = [row for F in face_groups(mesh['faces'], has_face_types) for row in F.tolist()]
+        yield 'surface', _vertices_3d(mesh['vertices']), _as_list(mesh['edges']), faces
+    if 'surface' in record:
+        for kind in ('curves', 'pcurves'):
+            for k, mesh in enumerate(record.get(kind) or []):
+                yield f'{mesh["type"]}_{k}', _vertices_3d(mesh['vertices']), _as_list(mesh['edges']), []
+    elif record.get('type') != 'surface':
+        yield record['type'], _vertices_3d(record['vertices']), _as_list(record['edges']), []
+
+def _place_instances(instances, face_objects):
+    # The first occurrence of a part moves the surface and 3D curve objects
+    # of its faces in place, every other occurrence gets linked duplicates
+    # sharing their mesh data
+    placed = set()
+    for record in instances:
+        transform = Matrix(record['transform'])
+        for face_name in record['face_names']:
+            for obj in face_objects.get(face_name, []):
+                if obj.name not in placed:
+                    placed.add(obj.name)
+                    duplicate = obj
+                else:
+                    duplicate = bpy.data.objects.new(f'{record["name"]}{obj.name}', obj.data)
+                    bpy.context.scene.collection.objects.link(duplicate)
+                duplicate.matrix_world = transform
+
 def import_step_mesh():
     args = _process_args()
-    with Path(args.meshes_file).open() as f:
-        meshes = json.load(f)
+    meshes = iter_meshes(Path(args.meshes_file))
 
     F.delete_default_objects()
     # Create new object from vertices, edges and faces
-    for i, mesh in enumerate(meshes):
-        mesh_type = mesh['type']
-        mesh_name = mesh['name']
-        obj_name = mesh_name = f'{mesh_name}_{mesh_type}'
-        _ = F.create_object_from_mesh_data(
-            mesh['vertices'], mesh['edges'], mesh['faces'],
-            obj_name=obj_name, mesh_name=mesh_name
-        )
+    face_objects = {}
+    instances = []
+    for record in meshes:
+        if record.get('type') == 'instance':
+            instances.append(record)
+            continue
+        face_name = record['name']
+        for suffix, vertices, edges, faces in _record_meshes(record):
+            obj_name = mesh_name = f'{face_name}_{suffix}'
+            obj = F.create_object_from_mesh_data(vertices, edges, faces, obj_name=obj_name, mesh_name=mesh_name)
+            # Pcurves live in the UV space of their face, not in part coordinates
+            if not suffix.startswith('pcurve'):
+                face_objects.setdefault(face_name, []).append(obj)
+    _place_instances(instances, face_objects)
     F.write_blendfile(args.output_file, relative_paths=False)
     
 if __name__ == '__main__':
@@ -0,0 +1,109 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import OCC
+from OCC.Core.BRep import BRep_Builder
+from OCC.Core.BRepTools import breptools_Read, breptools_Write
+from OCC.Core.TopoDS import TopoDS_Shape
+
+DEFAULT_CACHE_DIR = Path('~/.cache/aarwild/brep')
+DEFAULT_MAX_SIZE_MB = 4096
+
+
+def step_cache_key(step_file: str, options: Optional[Dict] = None) -> str:
+    """
+    SHA-256 of the contents of `step_file` and of the reader `options`. The
+    pythonocc version is part of the key because BRep files are not
+    guaranteed to be readable across OCC versions.
+    """
+    h = hashlib.sha256()
+    with open(step_file, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    key_options = {'occ_version': OCC.VERSION, **(options or {})}
+    h.update(json.dumps(key_options, sort_keys=True).encode('utf-8'))
+    return h.hexdigest()
+
+
+class BRepCache:
+    """
+    Directory of transferred STEP shapes stored as native BRep files, one per
+    cache key. Least recently used files are evicted once the directory
+    holds more than `max_bytes`.
+    """
+    def __init__(self, cache_dir: Path = DEFAULT_CACHE_DIR,
+                 max_bytes: int = DEFAULT_MAX_SIZE_MB * 2 ** 20):
+        self.cache_dir = Path(cache_dir).expanduser()
+        self.max_bytes = max_bytes
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f'{key}.brep'
+
+    def get(self, key: str) -> Optional[Any]:
+        path = self._path(key)
+        if not path.exists():
+            return None
+        shape = TopoDS_Shape()
+        if not breptools_Read(shape, path.as_posix(), BRep_Builder()):
+            # Partial or corrupt entry, drop it and read the STEP file again
+            path.unlink()
+            return None
+        os.utime(path)  # mark as recently used
+        return shape
+
+    def put(self, key: str, shape: Any) -> None:
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        path = self._path(key)
+        tmp_path = path.with_suffix(f'.{os.getpid()}.tmp')
+        breptools_Write(shape, tmp_path.as_posix())
+        os.replace(tmp_path, path)
+        self.evict()
+
+    def size(self) -> int:
+        if not self.cache_dir.exists():
+            return 0
+        return sum(p.stat().st_size for p in self.cache_dir.glob('*.brep'))
+
+    def evict(self) -> None:
+        """
+        Removes least recently used entries until the cache fits `max_bytes`
+        """
+        if not self.cache_dir.exists():
+            return
+        entries = sorted(((p.stat(), p) for p in self.cache_dir.glob('*.brep')),
+                         key=lambda e: e[0].st_mtime)
+        total = sum(st.st_size for st, _ in entries)
+        for st, path in entries:
+            if total <= self.max_bytes:
+                break
+            path.unlink()
+            total -= st.st_size
+
+    def clear(self) -> None:
+        if self.cache_dir.exists():
+            shutil.rmtree(self.cache_dir)
+
+
+def add_cache_args(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument('--no-cache', dest='no_cache', action='store_true',
+                        help='read the STEP file without the BRep cache')
+    parser.add_argument('--clear-cache', dest='clear_cache', action='store_true',
+                        help='empty the BRep cache before reading')
+    parser.add_argument('--cache-dir', dest='cache_dir', action='store', default=DEFAULT_CACHE_DIR,
+                        help='directory of the BRep cache')
+    parser.add_argument('--cache-max-size', dest='cache_max_size', action='store', type=int,
+                        default=DEFAULT_MAX_SIZE_MB, help='max size of the BRep cache in MB')
+
+
+def brep_cache_from_args(args: argparse.Namespace) -> Optional[BRepCache]:
+    cache = BRepCache(Path(args.cache_dir), args.cache_max_size * 2 ** 20)
+    if args.clear_cache:
+        cache.clear()
+    if args.no_cache:
+        return None
+    return cache
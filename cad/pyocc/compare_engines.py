@@ -0,0 +1,83 @@
+import argparse
+import time
+from dataclasses import replace
+from pathlib import Path
+from typing import Any, Tuple
+
+from OCC.Extend.TopologyUtils import TopologyExplorer
+
+from brep_cache import add_cache_args, brep_cache_from_args
+from grid_density import DensityPolicy, add_density_args, density_policy_from_args
+from occ_mesh import mesh_shape
+from pyocc_export_trimmed_faces_w_stitching import _export_face, _init_edges
+from step_io import read_step_shape
+
+# Policy overrides of each compared engine; 'analytic' is the grid engine
+# with planes, cylinders and cones tessellated from their surface definition
+ENGINES = {
+    'grid': {'engine': 'grid', 'analytic': False},
+    'analytic': {'engine': 'grid', 'analytic': True},
+    'cdt': {'engine': 'cdt', 'analytic': False},
+    'occ': {'engine': 'occ', 'analytic': False},
+}
+
+
+def _run(shape: Any, policy: DensityPolicy) -> Tuple[int, int]:
+    # Full face export of the stitching exporter, curves and stitch included
+    if policy.engine == 'occ':
+        mesh_shape(shape, policy)
+    _init_edges(shape, policy.chord_tol)
+    n_triangles, n_failed = 0, 0
+    for i, face in enumerate(TopologyExplorer(shape).faces()):
+        try:
+            face_meshes = _export_face(i, face, policy)
+        except Exception as e:
+            print(f'\t{policy.engine} engine failed on face {i}: {e}')
+            n_failed += 1
+            continue
+        if not face_meshes:
+            n_failed += 1
+            continue
+        # The last entry of every face is its face type; an n-gon is n - 2 triangles
+        n_triangles += sum(len(f) - 3 for f in face_meshes[0].surface.faces)
+    return n_triangles, n_failed
+
+
+def _process_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Compare tessellation engines on a directory of STEP files')
+    parser.add_argument('--step-dir', dest='step_dir', action='store', default='../step_files',
+                        help='directory searched recursively for STEP files')
+    parser.add_argument('--output', dest='output', action='store', default='engine_comparison.csv',
+                        help='path of the CSV report')
+    # Every engine of ENGINES is run, with and without analytic surfaces,
+    # the occ engine among them
+    add_density_args(parser, engines=(), analytic=False, occ_options=True)
+    add_cache_args(parser)
+    return parser.parse_args()
+
+
+def main():
+    args = _process_args()
+    policy = density_policy_from_args(args)
+    cache = brep_cache_from_args(args)
+    root = Path(args.step_dir)
+    step_files = list(root.glob('**/*.stp')) + list(root.glob('**/*.STEP'))
+
+    with Path(args.output).open('w') as f:
+        f.write('filepath,engine,num_faces,num_failed_faces,seconds,num_triangles\n')
+        for step_file in step_files:
+            print(f'processing {step_file}')
+            for engine, overrides in ENGINES.items():
+                # Fresh shape per engine so that no engine sees the other's triangulation
+                shape = read_step_shape(step_file.as_posix(), cache)
+                n_faces = TopologyExplorer(shape).number_of_faces()
+                t0 = time.perf_counter()
+                n_triangles, n_failed = _run(shape, replace(policy, **overrides))
+                seconds = time.perf_counter() - t0
+                print(f'\t{engine}: {seconds:.2f} s, {n_triangles} triangles')
+                f.write(f'{step_file.as_posix()},{engine},{n_faces},{n_failed},{seconds:.3f},{n_triangles}\n')
+                f.flush()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+from typing import Callable, Optional
+
+import numpy as np
+
+# Fractions of an interval at which the curve is compared with the chord;
+# the midpoint becomes the split point of a refined interval
+_PROBES = np.array([0.25, 0.5, 0.75])
+
+
+def _distance_to_segments(P: np.ndarray, A: np.ndarray, B: np.ndarray) -> np.ndarray:
+    # Distances of the points P[k, j] to the segments A[k] - B[k]
+    AB = (B - A)[:, None, :]
+    AP = P - A[:, None, :]
+    ab2 = np.einsum('kij,kij->ki', AB, AB)
+    t = np.clip(np.einsum('kij,kij->ki', AP, AB) / np.where(ab2 > 0., ab2, 1.), 0., 1.)
+    return np.linalg.norm(AP - t[..., None] * AB, axis=-1)
+
+
+def seed_params(first: float, last: float, min_segments: int = 1,
+                breaks: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Parameters of the initial intervals of `adaptive_params`: [first, last]
+    cut at the `breaks` inside it, e.g. the knots of a B-spline, and every
+    piece split evenly into `min_segments`
+    """
+    t = np.array([first, last], dtype=float)
+    if breaks is not None:
+        breaks = np.asarray(breaks, dtype=float)
+        t = np.unique(np.concatenate((t, breaks[(breaks > first) & (breaks < last)])))
+    fractions = np.arange(max(min_segments, 1)) / max(min_segments, 1)
+    return np.append((t[:-1, None] + np.diff(t)[:, None] * fractions).ravel(), last)
+
+
+def adaptive_params(evaluate: Callable[[np.ndarray], np.ndarray], first: float, last: float,
+                    chord_tol: float, min_segments: int = 1, max_depth: int = 12,
+                    breaks: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Parameters in [first, last] of a polyline that follows the curve
+    `evaluate(t) -> (n, dim) points` within `chord_tol`. Starting from the
+    intervals of `seed_params`, intervals are bisected while the curve at a
+    quarter, half or three quarters of the interval lies farther than
+    `chord_tol` from the chord, at most `max_depth` times. All intervals of
+    one level are evaluated in a single call. A single seed interval only
+    sees its three probes, so curves that may cross their chord there, e.g.
+    B-spline pieces, need their knots as `breaks` or a `min_segments`.
+    Lines give just their end points. An `evaluate(t) -> (n, k, dim)` gives
+    k curves sharing their parameters, e.g. an edge and its pcurves, and
+    intervals are bisected until all of them are within `chord_tol`.
+    """
+    def _evaluate(t):
+        P = evaluate(t)
+        return P if P.ndim == 3 else P[:, None, :]
+
+    t = seed_params(first, last, min_segments, breaks)
+    P = _evaluate(t)
+    k, dim = P.shape[1], P.shape[2]
+    a, b = t[:-1], t[1:]
+    Pa, Pb = P[:-1], P[1:]
+    accepted = [t]
+    for _ in range(max_depth):
+        if a.shape[0] == 0:
+            break
+        m = a.shape[0]
+        tp = a[:, None] + (b - a)[:, None] * _PROBES
+        Pp = _evaluate(tp.ravel()).reshape(m, _PROBES.shape[0], k, dim)
+        distance = _distance_to_segments(Pp.transpose(0, 2, 1, 3).reshape(m * k, -1, dim),
+                                         Pa.reshape(m * k, dim), Pb.reshape(m * k, dim))
+        refine = distance.max(axis=1).reshape(m, k).max(axis=1) > chord_tol
+        mid, Pmid = tp[refine, 1], Pp[refine, 1]
+        accepted.append(mid)
+        a, b = np.concatenate((a[refine], mid)), np.concatenate((mid, b[refine]))
+        Pa, Pb = np.concatenate((Pa[refine], Pmid)), np.concatenate((Pmid, Pb[refine]))
+    return np.unique(np.concatenate(accepted))
@@ -0,0 +1,172 @@
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from OCC.Core.BRep import BRep_Tool
+from OCC.Core.BRepAdaptor import BRepAdaptor_Surface
+from OCC.Core.Geom2dAdaptor import Geom2dAdaptor_Curve
+from OCC.Core.GeomAbs import GeomAbs_BSplineCurve, GeomAbs_Line
+from OCC.Core.GeomAdaptor import GeomAdaptor_Curve
+from OCC.Core.TopAbs import TopAbs_EDGE, TopAbs_FACE, TopAbs_REVERSED
+from OCC.Core.TopExp import topexp
+from OCC.Core.TopTools import TopTools_IndexedDataMapOfShapeListOfShape, TopTools_ListIteratorOfListOfShape
+from OCC.Core.TopoDS import topods_Edge, topods_Face
+from OCC.Core.gp import gp_Pnt, gp_Vec
+from OCC.Extend.TopologyUtils import WireExplorer
+
+from nurbs_eval import bspline_curve_data, curve_points, pcurve_points
+from curve_sampling import adaptive_params
+
+# Points along a pcurve at which the surface metric is estimated
+_METRIC_SAMPLES = 9
+
+# Initial intervals of curves other than lines and B-splines, so that the
+# chord test does not stop at probes that happen to lie on the chord
+_MIN_SEGMENTS = 4
+
+
+def _curve_seeds(adaptor: Any) -> Tuple[int, Optional[np.ndarray]]:
+    # Segments per piece and the piece breaks, the knots of B-splines, of a
+    # GeomAdaptor_Curve or Geom2dAdaptor_Curve for `adaptive_params`
+    curve_type = adaptor.GetType()
+    if curve_type == GeomAbs_Line:
+        return 1, None
+    if curve_type == GeomAbs_BSplineCurve:
+        data = bspline_curve_data(adaptor.BSpline())
+        return data.degree, data.knots
+    return _MIN_SEGMENTS, None
+
+
+def _uv_scale(face: Any, pcurve: Any, first: float, last: float) -> np.ndarray:
+    # Largest lengths of the surface derivatives along the pcurve; UV
+    # distances multiplied by them approximate the matching 3D distances
+    adaptor = BRepAdaptor_Surface(face)
+    P, Du, Dv = gp_Pnt(), gp_Vec(), gp_Vec()
+    scale = np.zeros(2)
+    for u, v in pcurve_points(pcurve, np.linspace(first, last, _METRIC_SAMPLES)):
+        adaptor.D1(u, v, P, Du, Dv)
+        scale = np.maximum(scale, (Du.Magnitude(), Dv.Magnitude()))
+    return scale
+
+
+@dataclass
+class EdgeSamples:
+    edge_id: int  # index of the edge in the edge -> faces map, starting at 1
+    params: np.ndarray  # (n, ) parameters on the edge, shared by its pcurves
+    points: np.ndarray  # (n, 3), the collapsed pole point repeated for degenerated edges
+
+
+@dataclass
+class WireSamples:
+    points: np.ndarray  # (n, 3) 3D samples of all edges
+    params: np.ndarray  # (n, ) edge parameters of `points`
+    uv: Optional[np.ndarray]  # (n, 2) pcurve samples of all edges, None without pcurves
+    edge_refs: List[List[int]]  # [edge_id, is_reversed, first row in `points`, n rows]
+
+
+class EdgeTessellation:
+    """
+    Samples every edge of `shape` once, at `n_samples` parameters spanning
+    its range or, with a `chord_tol`, at the parameters picked by
+    `adaptive_params` so that its 3D curve and its pcurves, their UV scaled
+    to 3D by the surface metric, are all within `chord_tol` of the polyline.
+    The faces on both sides of an edge reuse the same samples, so their
+    boundaries have identical vertices. The pcurves of an edge are sampled
+    at the same parameters as its 3D curve.
+    """
+    def __init__(self, shape: Any, n_samples: int = 50, chord_tol: Optional[float] = None):
+        self.n_samples = n_samples
+        self.chord_tol = chord_tol
+        self.edge_faces = TopTools_IndexedDataMapOfShapeListOfShape()
+        topexp.MapShapesAndAncestors(shape, TopAbs_EDGE, TopAbs_FACE, self.edge_faces)
+        self._samples: Dict[int, EdgeSamples] = {}
+
+    @property
+    def n_edges(self) -> int:
+        return self.edge_faces.Extent()
+
+    def edge_id(self, edge: Any) -> int:
+        # FindIndex compares with IsSame, so both orientations map to one id
+        return self.edge_faces.FindIndex(edge)
+
+    def samples(self, edge: Any) -> EdgeSamples:
+        edge_id = self.edge_id(edge)
+        if edge_id not in self._samples:
+            self._samples[edge_id] = self._sample(edge_id, edge)
+        return self._samples[edge_id]
+
+    def _sample(self, edge_id: int, edge: Any) -> EdgeSamples:
+        if BRep_Tool.Degenerated(edge):
+            # No 3D curve: every sample is the pole the edge collapses to, so
+            # that the 3D samples stay aligned with the pcurve samples
+            first, last = BRep_Tool.Range(edge)
+            pole = BRep_Tool.Pnt(topexp.FirstVertex(edge)).Coord()
+            points = np.tile(pole, (self.n_samples, 1))
+            return EdgeSamples(edge_id, np.linspace(first, last, self.n_samples), points)
+        curve, first, last = BRep_Tool.Curve(edge)
+        if self.chord_tol is not None:
+            pcurves = self._scaled_pcurves(edge_id, edge)
+
+            def _evaluate(t):
+                # The 3D curve and the scaled pcurves, padded to 3D
+                curves = [curve_points(curve, t)]
+                curves.extend(np.column_stack((pcurve_points(pcurve, t) * scale, np.zeros(t.shape[0])))
+                              for pcurve, scale in pcurves)
+                return np.stack(curves, axis=1)
+
+            # Pcurves share the parameters of the edge, and so their knots
+            seeds = [_curve_seeds(GeomAdaptor_Curve(curve))]
+            seeds.extend(_curve_seeds(Geom2dAdaptor_Curve(pcurve)) for pcurve, _ in pcurves)
+            breaks = [b for _, b in seeds if b is not None]
+            params = adaptive_params(_evaluate, first, last, self.chord_tol,
+                                     min_segments=max(n for n, _ in seeds),
+                                     breaks=np.concatenate(breaks) if breaks else None)
+        else:
+            params = np.linspace(first, last, self.n_samples)
+        return EdgeSamples(edge_id, params, curve_points(curve, params))
+
+    def _scaled_pcurves(self, edge_id: int, edge: Any) -> List[Tuple[Any, np.ndarray]]:
+        # Pcurves of the edge on each of its faces, both of them on the faces
+        # where it is a seam, with their UV scales
+        pcurves = []
+        faces = TopTools_ListIteratorOfListOfShape(self.edge_faces.FindFromIndex(edge_id))
+        while faces.More():
+            face = topods_Face(faces.Value())
+            seam = BRep_Tool.IsClosed(edge, face)
+            for e in (edge, topods_Edge(edge.Reversed())) if seam else (edge, ):
+                pcurve_object = BRep_Tool().CurveOnSurface(e, face)
+                if len(pcurve_object) == 3:
+                    pcurve, first, last = pcurve_object
+                    pcurves.append((pcurve, _uv_scale(face, pcurve, first, last)))
+            faces.Next()
+        return pcurves
+
+    def wire_samples(self, wire: Any, face: Any) -> WireSamples:
+        """
+        Shared samples of the edges of `wire` in wire order, each edge
+        traversed along its orientation in the wire, plus the UV samples of
+        the edges' pcurves on `face`
+        """
+        points, params, uv, edge_refs = [], [], [], []
+        n_points = 0
+        has_pcurves = True
+        for edge in WireExplorer(wire).ordered_edges():
+            s = self.samples(edge)
+            order = slice(None, None, -1) if edge.Orientation() == TopAbs_REVERSED else slice(None)
+            points.append(s.points[order])
+            params.append(s.params[order])
+            edge_refs.append([s.edge_id, int(order.step == -1), n_points, s.points.shape[0]])
+            n_points += s.points.shape[0]
+
+            pcurve_object = BRep_Tool().CurveOnSurface(edge, face)
+            if len(pcurve_object) == 3:
+                uv.append(pcurve_points(pcurve_object[0], s.params[order]))
+            else:
+                has_pcurves = False
+
+        def _stack(arrays: List[np.ndarray], shape: Tuple[int, ...]) -> np.ndarray:
+            return np.concatenate(arrays) if arrays else np.zeros(shape)
+
+        return WireSamples(points=_stack(points, (0, 3)), params=_stack(params, (0, )),
+                           uv=_stack(uv, (0, 2)) if has_pcurves else None,
+                           edge_refs=edge_refs)
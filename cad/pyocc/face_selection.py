@@ -0,0 +1,101 @@
+import argparse
+from dataclasses import dataclass
+from typing import Any, FrozenSet, Iterator, List, Optional, Tuple
+
+import OCC.Core.GeomAbs as G
+from OCC.Core.BRepAdaptor import BRepAdaptor_Surface
+from OCC.Core.TopAbs import TopAbs_FACE
+from OCC.Core.TopExp import TopExp_Explorer
+from OCC.Core.TopoDS import topods_Face
+
+SURFACE_TYPES = {
+    'plane': G.GeomAbs_Plane,
+    'cylinder': G.GeomAbs_Cylinder,
+    'cone': G.GeomAbs_Cone,
+    'sphere': G.GeomAbs_Sphere,
+    'torus': G.GeomAbs_Torus,
+    'bezier': G.GeomAbs_BezierSurface,
+    'bspline': G.GeomAbs_BSplineSurface,
+    'revolution': G.GeomAbs_SurfaceOfRevolution,
+    'extrusion': G.GeomAbs_SurfaceOfExtrusion,
+    'offset': G.GeomAbs_OffsetSurface,
+    'other': G.GeomAbs_OtherSurface,
+}
+
+
+@dataclass(frozen=True)
+class FaceSelection:
+    indices: Optional[FrozenSet[int]] = None  # None selects every index
+    surface_types: Optional[FrozenSet[int]] = None  # GeomAbs surface types, None selects all
+
+    def accepts(self, i: int, face: Any) -> bool:
+        if self.indices is not None and i not in self.indices:
+            return False
+        if self.surface_types is not None:
+            return BRepAdaptor_Surface(face).GetType() in self.surface_types
+        return True
+
+
+def parse_face_ranges(spec: str) -> List[int]:
+    """
+    Face indices from a comma separated list of indices and inclusive
+    ranges, e.g. '12,22,100-140'
+    """
+    indices = []
+    for part in spec.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if '-' in part:
+            first, last = part.split('-', 1)
+            indices.extend(range(int(first), int(last) + 1))
+        else:
+            indices.append(int(part))
+    return sorted(set(indices))
+
+
+def iter_faces(shape: Any) -> Iterator[Any]:
+    """
+    Lazily iterates the faces of `shape`, numbered as in
+    `list(TopologyExplorer(shape).faces())`: faces shared by several shells
+    are visited once, at their first occurrence.
+    """
+    explorer = TopExp_Explorer(shape, TopAbs_FACE)
+    seen = set()
+    while explorer.More():
+        face = explorer.Current()
+        key = hash(face)
+        if key not in seen:
+            seen.add(key)
+            yield topods_Face(face)
+        explorer.Next()
+
+
+def iter_selected_faces(shape: Any, selection: FaceSelection) -> Iterator[Tuple[int, Any]]:
+    """
+    Yields (face index, face) for the faces of `shape` accepted by
+    `selection`. The topology is explored lazily and exploration stops after
+    the last selected index.
+    """
+    last = max(selection.indices, default=-1) if selection.indices is not None else None
+    for i, face in enumerate(iter_faces(shape)):
+        if last is not None and i > last:
+            return
+        if selection.accepts(i, face):
+            yield i, face
+
+
+def add_face_selection_args(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument('--faces', dest='faces', action='store', default=None,
+                        help='face indices and ranges to export, e.g. 12,22,100-140 (all by default)')
+    parser.add_argument('--surface-type', dest='surface_types', action='append',
+                        choices=sorted(SURFACE_TYPES), default=None,
+                        help='export only faces of this surface type (repeatable)')
+
+
+def face_selection_from_args(args: argparse.Namespace) -> FaceSelection:
+    indices = frozenset(parse_face_ranges(args.faces)) if args.faces is not None else None
+    surface_types = None
+    if args.surface_types is not None:
+        surface_types = frozenset(SURFACE_TYPES[t] for t in args.surface_types)
+    return FaceSelection(indices=indices, surface_types=surface_types)
@@ -0,0 +1,185 @@
+"""
+Binary glTF 2.0 (.glb) output of the exported face meshes.
+
+Every surface mesh becomes one triangle primitive with interleaved float32
+POSITION and NORMAL attributes and uint16 or uint32 indices, whichever fits
+its vertex count. Faces are grouped into one glTF mesh per instanced part,
+placed by one node per instance record with its transform, and a mesh of all
+the other faces under an identity node. Boundary curves are not written.
+
+Vertex and index data are streamed to a temporary file as faces arrive; the
+JSON chunk, which indexes them, is assembled on close.
+"""
+import argparse
+import json
+import shutil
+import struct
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from mesh_io import face_groups, iter_meshes, surface_meshes
+from mesh_topology import triangulate_polygons, vertex_normals
+
+GLB_MAGIC = 0x46546C67  # b'glTF'
+CHUNK_JSON = 0x4E4F534A
+CHUNK_BIN = 0x004E4942
+ARRAY_BUFFER = 34962
+ELEMENT_ARRAY_BUFFER = 34963
+FLOAT = 5126
+UNSIGNED_SHORT = 5123
+UNSIGNED_INT = 5125
+TRIANGLES = 4
+
+
+def _padding(n: int) -> int:
+    return (-n) % 4
+
+
+class GlbWriter:
+    """
+    Appends exporter records (face meshes and instance records) and writes
+    them to a .glb file on `close()`
+    """
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._bin = tempfile.TemporaryFile()
+        self._bin_length = 0
+        self._buffer_views: List[Dict] = []
+        self._accessors: List[Dict] = []
+        self._face_primitives: Dict[str, List[Dict]] = {}
+        self._instances: List[Dict] = []
+
+    def _add_buffer_view(self, a: np.ndarray, target: int, byte_stride: Optional[int] = None) -> int:
+        view = {'buffer': 0, 'byteOffset': self._bin_length, 'byteLength': a.nbytes, 'target': target}
+        if byte_stride is not None:
+            view['byteStride'] = byte_stride
+        self._bin.write(a.tobytes())
+        self._bin.write(b'\0' * _padding(a.nbytes))
+        self._bin_length += a.nbytes + _padding(a.nbytes)
+        self._buffer_views.append(view)
+        return len(self._buffer_views) - 1
+
+    def _add_accessor(self, accessor: Dict) -> int:
+        self._accessors.append(accessor)
+        return len(self._accessors) - 1
+
+    def _add_primitive(self, mesh: Dict, has_face_types: bool) -> Optional[Dict]:
+        V = np.asarray(mesh['vertices'], dtype=np.float64).reshape(-1, 3)
+        groups = face_groups(mesh['faces'], has_face_types)
+        if V.shape[0] == 0 or not groups:
+            return None
+        T = np.vstack([triangulate_polygons(F) for F in groups])
+        N = vertex_normals(V, T)
+
+        # Interleaved POSITION and NORMAL, 24 bytes per vertex
+        interleaved = np.hstack((V, N)).astype(np.float32)
+        view = self._add_buffer_view(interleaved, ARRAY_BUFFER, byte_stride=24)
+        n = V.shape[0]
+        position = self._add_accessor({
+            'bufferView': view, 'byteOffset': 0, 'componentType': FLOAT, 'count': n, 'type': 'VEC3',
+            'min': interleaved[:, :3].min(axis=0).tolist(), 'max': interleaved[:, :3].max(axis=0).tolist(),
+        })
+        normal = self._add_accessor({
+            'bufferView': view, 'byteOffset': 12, 'componentType': FLOAT, 'count': n, 'type': 'VEC3',
+        })
+
+        if n <= 65535:
+            indices, component_type = T.astype(np.uint16), UNSIGNED_SHORT
+        else:
+            indices, component_type = T.astype(np.uint32), UNSIGNED_INT
+        index_view = self._add_buffer_view(indices.ravel(), ELEMENT_ARRAY_BUFFER)
+        index_accessor = self._add_accessor({
+            'bufferView': index_view, 'byteOffset': 0, 'componentType': component_type,
+            'count': int(indices.size), 'type': 'SCALAR',
+        })
+        return {'attributes': {'POSITION': position, 'NORMAL': normal},
+                'indices': index_accessor, 'mode': TRIANGLES}
+
+    def append(self, record: Dict) -> None:
+        if record.get('type') == 'instance':
+            self._instances.append(record)
+            return
+        for mesh, has_face_types in surface_meshes(record):
+            primitive = self._add_primitive(mesh, has_face_types)
+            if primitive is not None:
+                self._face_primitives.setdefault(record['name'], []).append(primitive)
+
+    def _scene(self) -> Dict:
+        meshes, nodes = [], []
+        part_meshes: Dict[int, int] = {}
+        grouped = set()
+        for record in self._instances:
+            p = record['part']
+            if p not in part_meshes:
+                primitives = [prim for name in record['face_names'] for prim in self._face_primitives.get(name, [])]
+                grouped.update(record['face_names'])
+                if not primitives:
+                    continue
+                meshes.append({'name': f'_PART_{p:06d}', 'primitives': primitives})
+                part_meshes[p] = len(meshes) - 1
+            # glTF matrices are column-major
+            matrix = np.asarray(record['transform'], dtype=np.float64).T.ravel().tolist()
+            nodes.append({'name': record['name'], 'mesh': part_meshes[p], 'matrix': matrix})
+
+        primitives = [prim for name, prims in self._face_primitives.items() if name not in grouped
+                      for prim in prims]
+        if primitives:
+            meshes.append({'name': '_FACES', 'primitives': primitives})
+            nodes.append({'name': '_FACES', 'mesh': len(meshes) - 1})
+
+        gltf = {
+            'asset': {'version': '2.0', 'generator': 'aarwild pyocc exporter'},
+            'scene': 0,
+            'scenes': [{'nodes': list(range(len(nodes)))}],
+            'nodes': nodes,
+            'meshes': meshes,
+        }
+        if self._bin_length > 0:
+            gltf.update(buffers=[{'byteLength': self._bin_length}],
+                        bufferViews=self._buffer_views, accessors=self._accessors)
+        return gltf
+
+    def close(self) -> None:
+        json_chunk = json.dumps(self._scene(), separators=(',', ':')).encode('utf-8')
+        json_chunk += b' ' * _padding(len(json_chunk))
+        length = 12 + 8 + len(json_chunk)
+        if self._bin_length > 0:
+            length += 8 + self._bin_length
+        with self.path.open('wb') as f:
+            f.write(struct.pack('<III', GLB_MAGIC, 2, length))
+            f.write(struct.pack('<II', len(json_chunk), CHUNK_JSON))
+            f.write(json_chunk)
+            if self._bin_length > 0:
+                f.write(struct.pack('<II', self._bin_length, CHUNK_BIN))
+                self._bin.seek(0)
+                shutil.copyfileobj(self._bin, f)
+        self._bin.close()
+
+    def __enter__(self) -> 'GlbWriter':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def _process_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Convert exported face meshes to binary glTF')
+    parser.add_argument('meshes_file', action='store', help='path to mesh file (.bin, .jsonl or .json)')
+    parser.add_argument('--output', dest='output', action='store', default='_meshes.glb',
+                        help='path of the .glb file')
+    return parser.parse_args()
+
+
+def main():
+    args = _process_args()
+    with GlbWriter(Path(args.output)) as writer:
+        for record in iter_meshes(Path(args.meshes_file)):
+            writer.append(record)
+    print(f'wrote {args.output}')
+
+
+if __name__ == '__main__':
+    main()
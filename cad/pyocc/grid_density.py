@@ -0,0 +1,141 @@
+import argparse
+from dataclasses import dataclass
+from typing import Any, Optional, Tuple
+
+import numpy as np
+
+from nurbs_eval import BSplineSurfaceData, evaluate_surface
+
+
+@dataclass
+class DensityPolicy:
+    chord_tol: float = 0.1  # max deviation of a grid edge from the surface
+    max_edge_length: float = 10.  # max 3D length of a grid edge
+    min_res: int = 4
+    max_res: int = 256
+    n_samples: int = 9  # samples per direction for the curvature estimate
+    refine_boundary: bool = False  # quadtree refinement of trim boundary cells
+    boundary_tol: float = 0.5  # max 3D diagonal of a refined boundary cell
+    max_depth: int = 4  # max quadtree subdivisions of a boundary cell
+    engine: str = 'grid'  # 'grid' (UV grid + classifier), 'cdt' (UV triangulation) or 'occ' (BRepMesh_IncrementalMesh)
+    angular_tol: float = 0.5  # angular deflection of the occ engine, in radians
+    analytic: bool = True  # tessellate planes, cylinders and cones without the NURBS grid
+
+    def clamp(self, n: int) -> int:
+        return int(min(max(n, self.min_res), self.max_res))
+
+
+def _polyline_stats(P: np.ndarray) -> Tuple[float, float]:
+    """
+    Longest length and largest discrete curvature of a stack of polylines
+    running along axis -2 of `P`
+    """
+    eps = 1e-12
+    seg = np.diff(P, axis=-2)
+    seg_len = np.linalg.norm(seg, axis=-1)
+    length = seg_len.sum(axis=-1).max()
+
+    # Curvature ~ turning angle between successive segments / arc length
+    a, b = seg[..., :-1, :], seg[..., 1:, :]
+    la, lb = seg_len[..., :-1], seg_len[..., 1:]
+    valid = (la > eps) & (lb > eps)
+    cos = (a * b).sum(axis=-1) / np.where(valid, la * lb, 1.)
+    angle = np.arccos(np.clip(cos, -1., 1.))
+    kappa = np.where(valid, angle / np.where(valid, 0.5 * (la + lb), 1.), 0.)
+    return float(length), float(kappa.max(initial=0.))
+
+
+def _segments_for_chord_tol(length: float, kappa: float, chord_tol: float) -> int:
+    # An arc of curvature `kappa` spanned by a chord of length h deviates
+    # from it by h^2 * kappa / 8
+    if kappa <= 0.:
+        return 1
+    h = np.sqrt(8. * chord_tol / kappa)
+    return int(np.ceil(length / h))
+
+
+def grid_resolution(surface: Any, surface_data: BSplineSurfaceData,
+                    policy: DensityPolicy) -> Tuple[int, int]:
+    """
+    Picks the number of grid points (NU, NV) for `surface` from its
+    parametric resolution, its extent and a sampled curvature estimate
+    """
+    U1, U2, V1, V2 = surface.Bounds()
+
+    # Size term: parametric step for which no grid edge exceeds max_edge_length
+    URES, VRES = surface.Resolution(policy.max_edge_length)
+    NU_size = int(np.ceil((U2 - U1) / URES)) + 1 if URES > 0 else policy.max_res
+    NV_size = int(np.ceil((V2 - V1) / VRES)) + 1 if VRES > 0 else policy.max_res
+
+    # Curvature term from a coarse sample of the surface
+    n = policy.n_samples
+    Ugrid, Vgrid = np.meshgrid(np.linspace(U1, U2, n), np.linspace(V1, V2, n))
+    UVgrid = np.column_stack((Ugrid.ravel(), Vgrid.ravel()))
+    XYZgrid = evaluate_surface(surface_data, UVgrid).reshape(n, n, 3)
+    Lu, kappa_u = _polyline_stats(XYZgrid)
+    Lv, kappa_v = _polyline_stats(XYZgrid.transpose(1, 0, 2))
+    NU_curv = _segments_for_chord_tol(Lu, kappa_u, policy.chord_tol) + 1
+    NV_curv = _segments_for_chord_tol(Lv, kappa_v, policy.chord_tol) + 1
+
+    NU = policy.clamp(max(NU_size, NU_curv))
+    NV = policy.clamp(max(NV_size, NV_curv))
+    return NU, NV
+
+
+ENGINES = ('grid', 'cdt', 'occ')
+
+
+def add_density_args(parser: argparse.ArgumentParser, engines: Tuple[str, ...] = ENGINES,
+                     boundary_refinement: bool = True, analytic: bool = True,
+                     occ_options: Optional[bool] = None) -> None:
+    """
+    Adds the density options to `parser`. `--engine` accepts the `engines`
+    the calling exporter implements and is left out if there are none; the
+    boundary refinement and analytic surface options are only added if it
+    implements them, the occ engine options if `engines` include 'occ'
+    unless `occ_options` says otherwise.
+    """
+    defaults = DensityPolicy()
+    parser.add_argument('--chord-tol', dest='chord_tol', action='store', type=float,
+                        default=defaults.chord_tol, help='max chordal deviation of the surface grid')
+    parser.add_argument('--max-edge-length', dest='max_edge_length', action='store', type=float,
+                        default=defaults.max_edge_length, help='max 3D length of a surface grid edge')
+    parser.add_argument('--min-res', dest='min_res', action='store', type=int,
+                        default=defaults.min_res, help='min grid points per direction')
+    parser.add_argument('--max-res', dest='max_res', action='store', type=int,
+                        default=defaults.max_res, help='max grid points per direction')
+    if boundary_refinement:
+        parser.add_argument('--refine-boundary', dest='refine_boundary', action='store_true',
+                            help='start from a coarse grid and refine only cells on the trim boundary')
+        parser.add_argument('--boundary-tol', dest='boundary_tol', action='store', type=float,
+                            default=defaults.boundary_tol, help='max 3D size of a refined boundary cell')
+        parser.add_argument('--max-depth', dest='max_depth', action='store', type=int,
+                            default=defaults.max_depth, help='max subdivisions of a boundary cell')
+    if engines:
+        engine_help = {'grid': 'on a classified UV grid',
+                       'cdt': 'by constrained triangulation of the trimmed UV domain',
+                       'occ': 'with the OCC mesher'}
+        parser.add_argument('--engine', dest='engine', action='store', choices=list(engines),
+                            default=defaults.engine,
+                            help='tessellate faces ' + ', '.join(engine_help[e] for e in engines))
+    if occ_options is None:
+        occ_options = 'occ' in engines
+    if occ_options:
+        parser.add_argument('--angular-tol', dest='angular_tol', action='store', type=float,
+                            default=defaults.angular_tol, help='angular deflection of the occ engine (radians)')
+    if analytic:
+        parser.add_argument('--no-analytic', dest='analytic', action='store_false',
+                            help='send planar, cylindrical and conical faces through the NURBS grid too')
+
+
+def density_policy_from_args(args: argparse.Namespace) -> DensityPolicy:
+    # Options an exporter did not add keep their defaults
+    defaults = DensityPolicy()
+    return DensityPolicy(chord_tol=args.chord_tol, max_edge_length=args.max_edge_length,
+                         min_res=args.min_res, max_res=args.max_res,
+                         refine_boundary=getattr(args, 'refine_boundary', defaults.refine_boundary),
+                         boundary_tol=getattr(args, 'boundary_tol', defaults.boundary_tol),
+                         max_depth=getattr(args, 'max_depth', defaults.max_depth),
+                         engine=getattr(args, 'engine', defaults.engine),
+                         angular_tol=getattr(args, 'angular_tol', defaults.angular_tol),
+                         analytic=getattr(args, 'analytic', defaults.analytic))
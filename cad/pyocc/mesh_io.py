@@ -0,0 +1,387 @@
+"""
+Containers for exported meshes.
+
+Layout of a binary mesh file:
+
+    magic            8 bytes, b'AWMESH01'
+    header_offset    uint64, byte offset of the JSON header, 0 until closed
+    records          one record per exported face
+    header           utf-8 JSON index of all records
+
+and of each record, aligned to 16 bytes:
+
+    marker           8 bytes, b'AWENTRY\\0'
+    json_length      uint64
+    data_length      uint64
+    json             utf-8 JSON of the face mesh, padded to 16 bytes
+    data             contiguous arrays, each aligned to 16 bytes
+
+The record JSON has the shape of the `to_dict()` of the exported mesh.
+Array valued fields (vertices, edges, faces, param_grid, edge_refs) are
+replaced by descriptors with the offset (relative to the record data), dtype
+and shape of the array. Lists are stored with the dtypes of ARRAY_DTYPES;
+NumPy arrays of the same kind keep their own dtype and are written without
+a copy. Rows of ragged arrays (e.g. faces mixing triangles and quads)
+are described by an extra `row_offsets` array. Readers memory-map the file,
+so a single face can be read without touching the arrays of the others.
+
+Records are flushed as soon as a face is appended. A file whose writer did
+not close it has no header; readers then recover all complete records by
+walking them from the start.
+
+The JSON Lines variant holds one `to_dict()` per line. Exporters hold their
+meshes in `Mesh`, whose `to_arrays()` feeds the binary writer without
+copies and whose `to_dict()` is built only for JSON.
+"""
+import json
+import struct
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+MAGIC = b'AWMESH01'
+RECORD_MARKER = b'AWENTRY\0'
+_PREAMBLE = struct.Struct('<8sQ')
+_RECORD = struct.Struct('<8sQQ')
+_ALIGN = 16
+ARRAY_DTYPES = {
+    'vertices': np.float32,
+    'param_grid': np.float32,
+    'edges': np.int32,
+    'faces': np.int32,
+    'edge_refs': np.int32,
+}
+
+
+def _padding(offset: int) -> int:
+    return (-offset) % _ALIGN
+
+
+def _as_array(value: Any, dtype: Any) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    if isinstance(value, np.ndarray) and value.dtype.kind == np.dtype(dtype).kind:
+        return np.ascontiguousarray(value), None
+    try:
+        return np.ascontiguousarray(value, dtype=dtype), None
+    except ValueError:
+        # Ragged rows, e.g. faces mixing triangles and quads
+        sizes = np.array([len(row) for row in value], dtype=np.int32)
+        flat = np.ascontiguousarray(np.concatenate([np.asarray(row) for row in value]), dtype=dtype)
+        row_offsets = np.concatenate(([0], np.cumsum(sizes))).astype(np.int32)
+        return flat, row_offsets
+
+
+def _float_array(a: Any, dtype: Any) -> Optional[np.ndarray]:
+    return None if a is None else np.ascontiguousarray(a, dtype=dtype)
+
+
+def _index_array(a: Any, width: int) -> Any:
+    # Rows of equal length are stacked into one (n, width) array; ragged rows
+    # (quads mixed with fan triangles) stay a list of per-row arrays
+    if len(a) == 0:
+        return np.zeros((0, width), dtype=np.int32)
+    try:
+        return np.ascontiguousarray(a, dtype=np.int32)
+    except ValueError:
+        return [np.asarray(row, dtype=np.int32) for row in a]
+
+
+def _to_list(a: Any) -> Any:
+    if a is None or isinstance(a, (bool, str)):
+        return a
+    if isinstance(a, list):
+        return [row.tolist() for row in a]
+    return a.tolist()
+
+
+class Mesh:
+    """
+    Surface, curve or pcurve mesh of a face held in contiguous arrays:
+    float32 XYZ vertices (float64 for the UV vertices of pcurves), float64
+    parameters and int32 indices. Surface faces of the stitching exporter
+    end with their face type.
+    """
+    __slots__ = ('name', 'type_', 'vertices', 'edges', 'faces', 'param_grid', 'edge_refs', 'is_outer_wire')
+
+    def __init__(self, name: str, type_: str, vertices: Any, edges: Any, faces: Any,
+                 param_grid: Any, edge_refs: Any = None, is_outer_wire: bool = False):
+        self.name = name
+        self.type_ = type_
+        self.vertices = _float_array(vertices, np.float64 if type_ == 'pcurve' else np.float32)
+        self.edges = _index_array(edges, 2)
+        self.faces = _index_array(faces, 4)
+        self.param_grid = _float_array(param_grid, np.float64)
+        # [edge_id, is_reversed, first vertex, n vertices]
+        self.edge_refs = None if edge_refs is None else _index_array(edge_refs, 4)
+        self.is_outer_wire = is_outer_wire
+
+    def __str__(self):
+        cn = self.__class__.__name__
+        type_ = self.type_
+        nv = self.vertices.shape[0]
+        ne = self.edges.shape[0]
+        nf = len(self.faces)
+        return f'{cn}({self.name}, type={type_}, faces={nf}, edges={ne}, vertices={nv})'
+
+    def __repr__(self):
+        return self.__str__()
+
+    def to_arrays(self) -> Dict:
+        """
+        Fields as views of the mesh arrays, for the binary mesh writer
+        """
+        return {
+            'name': self.name,
+            'type': self.type_,
+            'vertices': self.vertices,
+            'edges': self.edges,
+            'faces': self.faces,
+            'is_outer_wire': self.is_outer_wire,
+            'param_grid': self.param_grid,
+            'edge_refs': self.edge_refs
+        }
+
+    def to_dict(self) -> Dict:
+        """
+        Fields as nested lists, for JSON
+        """
+        return {key: _to_list(value) if key not in ('name', 'type') else value
+                for key, value in self.to_arrays().items()}
+
+
+class _RecordData:
+    """
+    Arrays of one record, laid out relative to the start of its data section
+    """
+    def __init__(self):
+        self.arrays = []
+        self.length = 0
+
+    def add(self, a: np.ndarray) -> Dict:
+        self.length += _padding(self.length)
+        descriptor = {'__array__': True, 'offset': self.length,
+                      'dtype': np.dtype(a.dtype).str, 'shape': list(a.shape)}
+        self.arrays.append((self.length, a))
+        self.length += a.nbytes
+        return descriptor
+
+    def pack(self, obj: Any) -> Any:
+        if isinstance(obj, dict):
+            packed = {}
+            for key, value in obj.items():
+                if key in ARRAY_DTYPES and value is not None:
+                    a, row_offsets = _as_array(value, ARRAY_DTYPES[key])
+                    packed[key] = self.add(a)
+                    if row_offsets is not None:
+                        packed[key]['row_offsets'] = self.add(row_offsets)
+                else:
+                    packed[key] = self.pack(value)
+            return packed
+        if isinstance(obj, (list, tuple)):
+            return [self.pack(o) for o in obj]
+        return obj
+
+
+class MeshFileWriter:
+    """
+    Appends mesh dicts to a binary mesh file, one flushed record per call.
+    The header index is written by `close()`.
+    """
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._f = self.path.open('wb')
+        self._f.write(_PREAMBLE.pack(MAGIC, 0))
+        self._offset = _PREAMBLE.size
+        self._entries = []
+
+    def _write(self, b: bytes) -> None:
+        self._f.write(b)
+        self._offset += len(b)
+
+    def _align(self) -> None:
+        self._write(b'\0' * _padding(self._offset))
+
+    def append(self, mesh: Dict) -> None:
+        data = _RecordData()
+        packed = data.pack(mesh)
+        record_json = json.dumps(packed).encode('utf-8')
+
+        self._align()
+        self._write(_RECORD.pack(RECORD_MARKER, len(record_json), data.length))
+        self._write(record_json)
+        self._align()
+        data_offset = self._offset
+        for offset, a in data.arrays:
+            self._write(b'\0' * (data_offset + offset - self._offset))
+            self._write(a.reshape(-1).view(np.uint8).data)
+        self._f.flush()
+        self._entries.append({'data_offset': data_offset, 'mesh': packed})
+
+    def close(self) -> None:
+        self._align()
+        header_offset = self._offset
+        self._write(json.dumps({'version': 1, 'meshes': self._entries}).encode('utf-8'))
+        self._f.seek(0)
+        self._f.write(_PREAMBLE.pack(MAGIC, header_offset))
+        self._f.close()
+
+    def __enter__(self) -> 'MeshFileWriter':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class JsonLinesWriter:
+    """
+    Appends mesh dicts to a JSON Lines file, one flushed line per call
+    """
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._f = self.path.open('w')
+
+    def append(self, mesh: Dict) -> None:
+        self._f.write(json.dumps(mesh))
+        self._f.write('\n')
+        self._f.flush()
+
+    def close(self) -> None:
+        self._f.close()
+
+    def __enter__(self) -> 'JsonLinesWriter':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def open_mesh_writer(path: Path) -> Any:
+    """
+    JSON Lines writer for .jsonl paths, binary mesh file writer otherwise
+    """
+    if Path(path).suffix == '.jsonl':
+        return JsonLinesWriter(path)
+    return MeshFileWriter(path)
+
+
+def write_meshes(path: Path, meshes: List[Dict]) -> None:
+    with open_mesh_writer(path) as writer:
+        for mesh in meshes:
+            writer.append(mesh)
+
+
+class MeshFile:
+    """
+    Read-only view of a binary mesh file. Indexing returns the mesh dict of
+    one face with its arrays as memory-mapped views.
+    """
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._data = np.memmap(self.path, dtype=np.uint8, mode='r')
+        magic, header_offset = _PREAMBLE.unpack(self._data[:_PREAMBLE.size].tobytes())
+        if magic != MAGIC:
+            raise ValueError(f'{self.path} is not a mesh file')
+        if header_offset > 0:
+            header = json.loads(self._data[header_offset:].tobytes().decode('utf-8'))
+            self.entries = header['meshes']
+        else:
+            self.entries = self._recover_entries()
+
+    def _recover_entries(self) -> List[Dict]:
+        # The writer did not close the file: walk the complete records
+        entries = []
+        file_size = self._data.shape[0]
+        pos = _PREAMBLE.size + _padding(_PREAMBLE.size)
+        while pos + _RECORD.size <= file_size:
+            marker, json_length, data_length = _RECORD.unpack(self._data[pos:pos + _RECORD.size].tobytes())
+            if marker != RECORD_MARKER:
+                break
+            json_start = pos + _RECORD.size
+            data_offset = json_start + json_length + _padding(json_start + json_length)
+            data_end = data_offset + data_length
+            if data_end > file_size:
+                break
+            mesh = json.loads(self._data[json_start:json_start + json_length].tobytes().decode('utf-8'))
+            entries.append({'data_offset': data_offset, 'mesh': mesh})
+            pos = data_end + _padding(data_end)
+        return entries
+
+    def _array(self, descriptor: Dict, data_offset: int) -> np.ndarray:
+        dtype = np.dtype(descriptor['dtype'])
+        shape = tuple(descriptor['shape'])
+        start = data_offset + descriptor['offset']
+        stop = start + dtype.itemsize * int(np.prod(shape, dtype=np.int64))
+        return self._data[start:stop].view(dtype).reshape(shape)
+
+    def _unpack(self, obj: Any, data_offset: int) -> Any:
+        if isinstance(obj, dict):
+            if obj.get('__array__'):
+                a = self._array(obj, data_offset)
+                if 'row_offsets' in obj:
+                    row_offsets = self._array(obj['row_offsets'], data_offset)
+                    return np.split(a, row_offsets[1:-1])
+                return a
+            return {key: self._unpack(value, data_offset) for key, value in obj.items()}
+        if isinstance(obj, list):
+            return [self._unpack(o, data_offset) for o in obj]
+        return obj
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __getitem__(self, i: int) -> Dict:
+        entry = self.entries[i]
+        return self._unpack(entry['mesh'], entry['data_offset'])
+
+    def __iter__(self) -> Iterator[Dict]:
+        for i in range(len(self)):
+            yield self[i]
+
+
+def surface_meshes(record: Dict) -> Iterator[Tuple[Dict, bool]]:
+    """
+    Surface meshes of an exported record and whether their faces end with a
+    face type column (records of the stitching exporter nest them)
+    """
+    if 'surface' in record:
+        yield record['surface'], True
+    elif record.get('type') == 'surface':
+        yield record, False
+
+
+def face_groups(faces: Any, has_face_types: bool) -> List[np.ndarray]:
+    """
+    Faces of a surface mesh grouped by polygon size, without the face type
+    column
+    """
+    try:
+        groups = [np.asarray(faces, dtype=np.int64)]
+    except ValueError:
+        by_size = {}
+        for row in faces:
+            by_size.setdefault(len(row), []).append(row)
+        groups = [np.asarray(rows, dtype=np.int64) for rows in by_size.values()]
+    groups = [F for F in groups if F.ndim == 2 and F.shape[0] > 0]
+    return [F[:, :-1] if has_face_types else F for F in groups]
+
+
+def iter_meshes(path: Path) -> Iterator[Dict]:
+    """
+    Lazily iterates the face meshes of a .jsonl, .json or binary mesh file
+    """
+    path = Path(path)
+    if path.suffix == '.jsonl':
+        with path.open() as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    # Last line of a file whose writer did not finish
+                    break
+    elif path.suffix == '.json':
+        with path.open() as f:
+            yield from json.load(f)
+    else:
+        yield from MeshFile(path)
@@ -0,0 +1,92 @@
+import numpy as np
+
+
+def grid_quads(NU: int, NV: int) -> np.ndarray:
+    """
+    Quads of the NU x NV grid whose points are ordered as in
+    `np.meshgrid(Ulist, Vlist)` raveled. Every row is (v1, v2, v3, v4) with
+    v1 = i * NU + j, v2 = v1 + 1, v3 = v2 + NU, v4 = v1 + NU.
+    Returns an int array of shape ((NU - 1) * (NV - 1), 4).
+    """
+    i, j = np.meshgrid(np.arange(NV - 1), np.arange(NU - 1), indexing='ij')
+    v1 = (i * NU + j).ravel()
+    return np.column_stack((v1, v1 + 1, v1 + 1 + NU, v1 + NU))
+
+
+def polyline_edges(n_verts: int, closed: bool = False) -> np.ndarray:
+    """
+    Edges (k, k + 1) of a polyline through `n_verts` vertices, plus the
+    closing edge (n_verts - 1, 0) if `closed`
+    """
+    v = np.arange(max(n_verts - 1, 0))
+    edges = np.column_stack((v, v + 1))
+    if closed and n_verts > 1:
+        edges = np.vstack((edges, [[n_verts - 1, 0]]))
+    return edges
+
+
+def face_types(faces: np.ndarray, is_point_on_face: np.ndarray) -> np.ndarray:
+    """
+    Number of vertices of every face that lie on the trimmed face
+    """
+    return is_point_on_face[faces].sum(axis=1)
+
+
+def classify_faces(faces: np.ndarray, is_point_on_face: np.ndarray,
+                   require_all: bool = False) -> np.ndarray:
+    """
+    Boolean mask of faces with any (or, if `require_all`, every) vertex on
+    the trimmed face
+    """
+    on_face = is_point_on_face[faces]
+    return on_face.all(axis=1) if require_all else on_face.any(axis=1)
+
+
+def remap_vertices(faces: np.ndarray, keep: np.ndarray) -> np.ndarray:
+    """
+    Rewrites the vertex indices in `faces` to indices into the vertices
+    selected by the boolean mask `keep`. Every vertex referenced by `faces`
+    must be kept.
+    """
+    inverse = np.full(keep.shape[0], -1, dtype=np.int64)
+    inverse[keep] = np.arange(np.count_nonzero(keep))
+    return inverse[faces]
+
+
+
+def boundary_vertices(faces: np.ndarray, n_verts: int) -> np.ndarray:
+    """
+    Boolean mask of the vertices on edges used by a single face of the
+    polygons `faces` (one polygon of equal size per row)
+    """
+    a = faces.astype(np.int64)
+    b = np.roll(a, -1, axis=1)
+    keys = (np.minimum(a, b) * n_verts + np.maximum(a, b)).ravel()
+    unique_keys, counts = np.unique(keys, return_counts=True)
+    open_keys = unique_keys[counts == 1]
+    is_boundary = np.zeros(n_verts, dtype=bool)
+    is_boundary[open_keys // n_verts] = True
+    is_boundary[open_keys % n_verts] = True
+    return is_boundary
+
+
+def triangulate_polygons(faces: np.ndarray) -> np.ndarray:
+    """
+    Fans every convex polygon of `faces` (one polygon of equal size per row)
+    into triangles around its first vertex
+    """
+    k = faces.shape[1]
+    return np.vstack([faces[:, [0, i, i + 1]] for i in range(1, k - 1)]).reshape(-1, 3)
+
+
+def vertex_normals(vertices: np.ndarray, triangles: np.ndarray) -> np.ndarray:
+    """
+    Area weighted unit normals of the vertices of `triangles`
+    """
+    a, b, c = vertices[triangles[:, 0]], vertices[triangles[:, 1]], vertices[triangles[:, 2]]
+    face_normals = np.cross(b - a, c - a)
+    normals = np.zeros(vertices.shape, dtype=np.float64)
+    for k in range(3):
+        np.add.at(normals, triangles[:, k], face_normals)
+    length = np.linalg.norm(normals, axis=1, keepdims=True)
+    return np.divide(normals, length, out=np.zeros_like(normals), where=length > 0.)
@@ -0,0 +1,92 @@
+from typing import Any, Callable, Dict, List, Tuple
+
+from OCC.Core.BRep import BRep_Tool, BRep_Tool_Curve
+from OCC.Core.BRepBuilderAPI import BRepBuilderAPI_NurbsConvert
+from OCC.Core.GeomConvert import geomconvert_CurveToBSplineCurve, geomconvert_SurfaceToBSplineSurface
+from OCC.Core.TopAbs import TopAbs_FORWARD
+from OCC.Core.TopoDS import topods_Edge, topods_Face
+
+
+class _ShapeMap:
+    """
+    Dict-like map from TopoDS shapes to values. Shapes are bucketed by
+    (hash, orientation); within a bucket they are compared with IsEqual, so
+    distinct shapes with colliding hashes never share a value.
+    """
+    def __init__(self):
+        self._buckets: Dict[Tuple[int, int], List[Tuple[Any, Any]]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_build(self, shape: Any, build: Callable[[Any], Any]) -> Any:
+        bucket = self._buckets.setdefault((hash(shape), shape.Orientation()), [])
+        for other, value in bucket:
+            if other.IsEqual(shape):
+                self.hits += 1
+                return value
+        self.misses += 1
+        value = build(shape)
+        bucket.append((shape, value))
+        return value
+
+    def __len__(self) -> int:
+        return sum(len(bucket) for bucket in self._buckets.values())
+
+
+def _convert_face(face: Any) -> Any:
+    return topods_Face(BRepBuilderAPI_NurbsConvert(face).Shape())
+
+
+def _convert_edge(edge: Any) -> Any:
+    nurbs_converter = BRepBuilderAPI_NurbsConvert(edge)
+    nurbs_converter.Perform(edge)
+    nurbs_edge = topods_Edge(nurbs_converter.Shape())
+    nurbs_curve = BRep_Tool_Curve(nurbs_edge)[0]
+    return geomconvert_CurveToBSplineCurve(nurbs_curve)
+
+
+class NurbsConversionCache:
+    """
+    Memoizes BRepBuilderAPI_NurbsConvert results for the faces and edges of
+    one run. Converted geometry is shared by all callers, so it must be
+    treated as read-only (copy before modifying it in place).
+    """
+    def __init__(self):
+        self._faces = _ShapeMap()
+        self._surfaces = _ShapeMap()
+        self._curves = _ShapeMap()
+
+    def nurbs_face(self, face: Any) -> Any:
+        """
+        TopoDS_Face with the surface of `face` converted to NURBS
+        """
+        return self._faces.get_or_build(face, _convert_face)
+
+    def bspline_surface(self, face: Any) -> Any:
+        """
+        Geom_BSplineSurface of `face`
+        """
+        def _build(f):
+            return geomconvert_SurfaceToBSplineSurface(BRep_Tool.Surface(self.nurbs_face(f)))
+        return self._surfaces.get_or_build(face, _build)
+
+    def bspline_curve(self, edge: Any) -> Any:
+        """
+        Geom_BSplineCurve of the 3D curve of `edge`. The curve does not depend
+        on the orientation of the edge, so the faces on both sides of an edge
+        share one conversion.
+        """
+        return self._curves.get_or_build(edge.Oriented(TopAbs_FORWARD), _convert_edge)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {name: {'hits': m.hits, 'misses': m.misses, 'size': len(m)}
+                for name, m in (('faces', self._faces), ('surfaces', self._surfaces),
+                                ('curves', self._curves))}
+
+    def report(self) -> str:
+        return ', '.join(f'{name}: {s["hits"]} hits / {s["misses"]} misses'
+                         for name, s in self.stats().items())
+
+
+# Conversion cache of the current process. Pool workers each get their own.
+NURBS_CACHE = NurbsConversionCache()
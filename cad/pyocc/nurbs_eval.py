@@ -0,0 +1,248 @@
+from dataclasses import dataclass
+from typing import Any
+
+import numpy as np
+import OCC.Core.GeomAbs as G
+from OCC.Core.Geom2dAdaptor import Geom2dAdaptor_Curve
+from OCC.Core.GeomAdaptor import GeomAdaptor_Curve
+from OCC.Core.Geom2dConvert import geom2dconvert_CurveToBSplineCurve
+from OCC.Core.GeomConvert import geomconvert_SurfaceToBSplineSurface, geomconvert_CurveToBSplineCurve
+
+
+@dataclass
+class BSplineSurfaceData:
+    u_degree: int
+    v_degree: int
+    u_knots: np.ndarray  # flat knot vector, length num_Upoles + u_degree + 1
+    v_knots: np.ndarray  # flat knot vector, length num_Vpoles + v_degree + 1
+    poles: np.ndarray  # (num_Upoles, num_Vpoles, 3)
+    weights: np.ndarray  # (num_Upoles, num_Vpoles)
+    u_periodic: bool = False  # parameters are wrapped into the knot domain
+    v_periodic: bool = False
+
+
+@dataclass
+class BSplineCurveData:
+    degree: int
+    knots: np.ndarray  # flat knot vector, length num_poles + degree + 1
+    poles: np.ndarray  # (num_poles, 3) for 3D curves, (num_poles, 2) for pcurves
+    weights: np.ndarray  # (num_poles, )
+    periodic: bool = False  # parameters are wrapped into the knot domain
+
+
+def _flat_knots(knots, mults) -> np.ndarray:
+    return np.repeat(np.asarray(knots, dtype=float), np.asarray(mults, dtype=int))
+
+
+def wrap_params(degree: int, knots: np.ndarray, t: np.ndarray) -> np.ndarray:
+    """
+    Parameters `t` of a periodic B-spline reduced modulo the period into its
+    knot domain [knots[degree], knots[n_poles]]
+    """
+    first, last = knots[degree], knots[knots.shape[0] - degree - 1]
+    wrapped = first + np.mod(t - first, last - first)
+    # The end of the domain stays there instead of wrapping to its start
+    return np.where(np.isclose(t, last, rtol=0., atol=1e-12 * (last - first)), last, wrapped)
+
+
+def find_spans(degree: int, knots: np.ndarray, t: np.ndarray) -> np.ndarray:
+    """
+    Returns knot span index `k` with knots[k] <= t < knots[k + 1] for every
+    parameter in `t`. Parameters at the end of the domain map to the last
+    non-empty span, parameters outside of it to the first or last span;
+    periodic parameters must be wrapped with `wrap_params` first.
+    """
+    n_poles = knots.shape[0] - degree - 1
+    t = np.clip(t, knots[degree], knots[n_poles])
+    spans = np.searchsorted(knots, t, side='right') - 1
+    return np.clip(spans, degree, n_poles - 1)
+
+
+def basis_functions(degree: int, knots: np.ndarray, t: np.ndarray,
+                    spans: np.ndarray) -> np.ndarray:
+    """
+    Nonzero B-spline basis functions N[span - degree + k](t), k = 0..degree,
+    for every parameter in `t` (Cox-de Boor recursion, vectorized over `t`).
+    Returns an array of shape (len(t), degree + 1).
+    """
+    m = t.shape[0]
+    N = np.zeros((m, degree + 1))
+    left = np.zeros((m, degree + 1))
+    right = np.zeros((m, degree + 1))
+    N[:, 0] = 1.
+    for j in range(1, degree + 1):
+        left[:, j] = t - knots[spans + 1 - j]
+        right[:, j] = knots[spans + j] - t
+        saved = np.zeros(m)
+        for r in range(j):
+            denom = right[:, r + 1] + left[:, j - r]
+            temp = np.divide(N[:, r], denom, out=np.zeros(m), where=denom != 0.)
+            N[:, r] = saved + right[:, r + 1] * temp
+            saved = left[:, j - r] * temp
+        N[:, j] = saved
+    return N
+
+
+def bspline_surface_data(surface: Any) -> BSplineSurfaceData:
+    """
+    Pulls degrees, flat knot vectors, poles and weights out of a
+    Geom_BSplineSurface so that it can be evaluated without going through OCC.
+    Periodic surfaces are converted to their non-periodic representation,
+    over one period, and remember that their parameters wrap.
+    """
+    u_periodic, v_periodic = surface.IsUPeriodic(), surface.IsVPeriodic()
+    if u_periodic or v_periodic:
+        # GeomConvert returns a copy, so the caller's surface is untouched
+        surface = geomconvert_SurfaceToBSplineSurface(surface)
+        if surface.IsUPeriodic():
+            surface.SetUNotPeriodic()
+        if surface.IsVPeriodic():
+            surface.SetVNotPeriodic()
+
+    NU = surface.NbUPoles()
+    NV = surface.NbVPoles()
+    u_knots = _flat_knots([surface.UKnot(i) for i in range(1, surface.NbUKnots() + 1)],
+                          [surface.UMultiplicity(i) for i in range(1, surface.NbUKnots() + 1)])
+    v_knots = _flat_knots([surface.VKnot(i) for i in range(1, surface.NbVKnots() + 1)],
+                          [surface.VMultiplicity(i) for i in range(1, surface.NbVKnots() + 1)])
+
+    poles = np.zeros((NU, NV, 3))
+    weights = np.ones((NU, NV))
+    is_rational = surface.IsURational() or surface.IsVRational()
+    for i in range(NU):
+        for j in range(NV):
+            poles[i, j] = surface.Pole(i + 1, j + 1).Coord()
+            if is_rational:
+                weights[i, j] = surface.Weight(i + 1, j + 1)
+
+    return BSplineSurfaceData(surface.UDegree(), surface.VDegree(),
+                              u_knots, v_knots, poles, weights, u_periodic, v_periodic)
+
+
+def evaluate_surface(data: BSplineSurfaceData, UV: np.ndarray) -> np.ndarray:
+    """
+    Evaluates the surface at every row (u, v) of `UV` in one batched pass and
+    returns the (N, 3) array of XYZ points, matching `Geom_BSplineSurface.Value`.
+    """
+    UV = np.asarray(UV, dtype=float).reshape(-1, 2)
+    p, q = data.u_degree, data.v_degree
+    u, v = UV[:, 0], UV[:, 1]
+    if data.u_periodic:
+        u = wrap_params(p, data.u_knots, u)
+    if data.v_periodic:
+        v = wrap_params(q, data.v_knots, v)
+    u_spans = find_spans(p, data.u_knots, u)
+    v_spans = find_spans(q, data.v_knots, v)
+    Nu = basis_functions(p, data.u_knots, u, u_spans)
+    Nv = basis_functions(q, data.v_knots, v, v_spans)
+
+    # Gather the (p + 1) x (q + 1) homogeneous poles that support each point
+    iu = (u_spans - p)[:, None] + np.arange(p + 1)
+    iv = (v_spans - q)[:, None] + np.arange(q + 1)
+    W = data.weights[iu[:, :, None], iv[:, None, :]]
+    P = data.poles[iu[:, :, None], iv[:, None, :]]
+
+    basis = Nu[:, :, None] * Nv[:, None, :] * W
+    numerator = np.einsum('mab,mabk->mk', basis, P)
+    denominator = basis.sum(axis=(1, 2))
+    return numerator / denominator[:, None]
+
+
+def bspline_curve_data(curve: Any) -> BSplineCurveData:
+    """
+    Pulls degree, flat knot vector, poles and weights out of a
+    Geom_BSplineCurve or a Geom2d_BSplineCurve. Periodic curves are converted
+    to their non-periodic representation, over one period, and remember that
+    their parameters wrap.
+    """
+    periodic = curve.IsPeriodic()
+    if periodic:
+        # The converters return a copy, so the caller's curve is untouched
+        is_2d = len(curve.Pole(1).Coord()) == 2
+        if is_2d:
+            curve = geom2dconvert_CurveToBSplineCurve(curve)
+        else:
+            curve = geomconvert_CurveToBSplineCurve(curve)
+        curve.SetNotPeriodic()
+
+    n_knots = curve.NbKnots()
+    knots = _flat_knots([curve.Knot(i) for i in range(1, n_knots + 1)],
+                        [curve.Multiplicity(i) for i in range(1, n_knots + 1)])
+    n_poles = curve.NbPoles()
+    poles = np.array([curve.Pole(i).Coord() for i in range(1, n_poles + 1)])
+    if curve.IsRational():
+        weights = np.array([curve.Weight(i) for i in range(1, n_poles + 1)])
+    else:
+        weights = np.ones((n_poles, ))
+    return BSplineCurveData(curve.Degree(), knots, poles, weights, periodic)
+
+
+def evaluate_curve(data: BSplineCurveData, t: np.ndarray) -> np.ndarray:
+    """
+    Evaluates the curve at every parameter in `t` in one batched pass and
+    returns an (N, dim) array of points, matching `Value(t).Coord()`.
+    """
+    t = np.asarray(t, dtype=float).ravel()
+    p = data.degree
+    if data.periodic:
+        t = wrap_params(p, data.knots, t)
+    spans = find_spans(p, data.knots, t)
+    N = basis_functions(p, data.knots, t, spans)
+    idx = (spans - p)[:, None] + np.arange(p + 1)
+    basis = N * data.weights[idx]
+    numerator = np.einsum('ma,mak->mk', basis, data.poles[idx])
+    return numerator / basis.sum(axis=1)[:, None]
+
+
+def pcurve_points(pcurve: Any, t: np.ndarray) -> np.ndarray:
+    """
+    Evaluates a 2D pcurve, as returned by `BRep_Tool.CurveOnSurface`, at every
+    parameter in `t`. Lines and circles are evaluated in closed form and
+    B-splines through `evaluate_curve`; other curve types fall back to OCC.
+    """
+    t = np.asarray(t, dtype=float).ravel()
+    adaptor = Geom2dAdaptor_Curve(pcurve)
+    curve_type = adaptor.GetType()
+    if curve_type == G.GeomAbs_Line:
+        line = adaptor.Line()
+        origin = np.array(line.Location().Coord())
+        direction = np.array(line.Direction().Coord())
+        return origin + t[:, None] * direction
+    if curve_type == G.GeomAbs_Circle:
+        circle = adaptor.Circle()
+        center = np.array(circle.Location().Coord())
+        xdir = np.array(circle.XAxis().Direction().Coord())
+        ydir = np.array(circle.YAxis().Direction().Coord())
+        r = circle.Radius()
+        return center + r * (np.cos(t)[:, None] * xdir + np.sin(t)[:, None] * ydir)
+    if curve_type == G.GeomAbs_BSplineCurve:
+        return evaluate_curve(bspline_curve_data(adaptor.BSpline()), t)
+    return np.array([adaptor.Value(ti).Coord() for ti in t]).reshape(-1, 2)
+
+
+def curve_points(curve: Any, t: np.ndarray) -> np.ndarray:
+    """
+    Evaluates a 3D curve, as returned by `BRep_Tool.Curve`, at every parameter
+    in `t` without changing its parametrization, so that the points match the
+    pcurves of the edge at the same parameters. Lines and circles are
+    evaluated in closed form and B-splines through `evaluate_curve`; other
+    curve types fall back to OCC.
+    """
+    t = np.asarray(t, dtype=float).ravel()
+    adaptor = GeomAdaptor_Curve(curve)
+    curve_type = adaptor.GetType()
+    if curve_type == G.GeomAbs_Line:
+        line = adaptor.Line()
+        origin = np.array(line.Location().Coord())
+        direction = np.array(line.Direction().Coord())
+        return origin + t[:, None] * direction
+    if curve_type == G.GeomAbs_Circle:
+        circle = adaptor.Circle()
+        center = np.array(circle.Location().Coord())
+        xdir = np.array(circle.XAxis().Direction().Coord())
+        ydir = np.array(circle.YAxis().Direction().Coord())
+        r = circle.Radius()
+        return center + r * (np.cos(t)[:, None] * xdir + np.sin(t)[:, None] * ydir)
+    if curve_type == G.GeomAbs_BSplineCurve:
+        return evaluate_curve(bspline_curve_data(adaptor.BSpline()), t)
+    return np.array([adaptor.Value(ti).Coord() for ti in t]).reshape(-1, 3)
@@ -0,0 +1,53 @@
+from typing import Any, Optional, Tuple
+
+import numpy as np
+from OCC.Core.BRep import BRep_Tool
+from OCC.Core.BRepMesh import BRepMesh_IncrementalMesh
+from OCC.Core.TopAbs import TopAbs_REVERSED
+from OCC.Core.TopLoc import TopLoc_Location
+
+from grid_density import DensityPolicy
+from shape_instances import location_matrix
+
+
+def mesh_shape(shape: Any, policy: DensityPolicy) -> None:
+    """
+    Triangulates every face of `shape` in place with OCC's incremental
+    mesher, running faces in parallel. The linear deflection is the policy's
+    chord tolerance.
+    """
+    mesher = BRepMesh_IncrementalMesh(shape, policy.chord_tol, False, policy.angular_tol, True)
+    if not mesher.IsDone():
+        raise ValueError('Error meshing shape')
+
+
+def face_triangulation(face: Any) -> Optional[Tuple[np.ndarray, Optional[np.ndarray], np.ndarray]]:
+    """
+    Reads the triangulation stored on `face` by `mesh_shape`. Returns the XYZ
+    vertices (in the global frame), the UV vertices if the triangulation has
+    them, and the 0-based triangles oriented along the face normal. Returns
+    None if the face has no triangulation.
+    """
+    location = TopLoc_Location()
+    triangulation = BRep_Tool.Triangulation(face, location)
+    if triangulation is None or triangulation.NbTriangles() == 0:
+        return None
+
+    n_nodes = triangulation.NbNodes()
+    nodes = triangulation.Nodes()
+    xyz = np.array([nodes.Value(k).Coord() for k in range(1, n_nodes + 1)])
+    if not location.IsIdentity():
+        M = location_matrix(location)
+        xyz = xyz @ M[:3, :3].T + M[:3, 3]
+
+    uv = None
+    if triangulation.HasUVNodes():
+        uv_nodes = triangulation.UVNodes()
+        uv = np.array([uv_nodes.Value(k).Coord() for k in range(1, n_nodes + 1)])
+
+    n_triangles = triangulation.NbTriangles()
+    triangles = triangulation.Triangles()
+    tris = np.array([triangles.Value(k).Get() for k in range(1, n_triangles + 1)]) - 1
+    if face.Orientation() == TopAbs_REVERSED:
+        tris = tris[:, [0, 2, 1]]
+    return xyz, uv, tris
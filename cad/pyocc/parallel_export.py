@@ -0,0 +1,60 @@
+import tempfile
+from functools import partial
+from multiprocessing import Pool
+from pathlib import Path
+from typing import Any, Callable, Iterator, List, Optional
+
+from OCC.Core.BRep import BRep_Builder
+from OCC.Core.BRepTools import breptools_Read, breptools_Write
+from OCC.Core.TopoDS import TopoDS_Shape
+
+from face_selection import iter_faces
+
+# Faces of the shape loaded by each worker process
+_worker_faces = None
+
+
+def _init_worker(brep_file: str, on_load: Optional[Callable]) -> None:
+    global _worker_faces
+    shape = TopoDS_Shape()
+    if not breptools_Read(shape, brep_file, BRep_Builder()):
+        raise ValueError(f'Error reading BRep file {brep_file}')
+    _worker_faces = list(iter_faces(shape))
+    if on_load is not None:
+        on_load(shape)
+
+
+def _export_chunk(export_face: Callable, options: Any, face_indices: List[int]) -> List[Any]:
+    results = []
+    for i in face_indices:
+        results.append(export_face(i, _worker_faces[i], options))
+    return results
+
+
+def export_faces_parallel(export_face: Callable, shape: Any, face_indices: List[int],
+                          options: Any, n_workers: int,
+                          chunk_size: Optional[int] = None,
+                          on_load: Optional[Callable] = None) -> Iterator[Any]:
+    """
+    Calls `export_face(i, face, options)` for every face index in
+    `face_indices` on a pool of `n_workers` processes and yields the results
+    in the order of `face_indices` as soon as they are available. `export_face` and `options` must be
+    picklable. The shape is serialized to a BRep file once and every worker
+    loads it a single time, so faces are numbered identically everywhere.
+    Progress is reported from this process as chunks of faces come back.
+    `on_load(shape)`, if given, is called in every worker once its shape is
+    loaded, e.g. to build per-process state derived from the whole shape.
+    """
+    if chunk_size is None:
+        chunk_size = max(1, len(face_indices) // (4 * n_workers))
+    chunks = [face_indices[k:k + chunk_size] for k in range(0, len(face_indices), chunk_size)]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        brep_file = (Path(tmp_dir) / 'shape.brep').as_posix()
+        breptools_Write(shape, brep_file)
+        with Pool(n_workers, initializer=_init_worker, initargs=(brep_file, on_load)) as pool:
+            n_done = 0
+            for chunk_results in pool.imap(partial(_export_chunk, export_face, options), chunks):
+                n_done += len(chunk_results)
+                print(f'Processed {n_done}/{len(face_indices)} faces')
+                yield from chunk_results
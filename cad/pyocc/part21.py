@@ -0,0 +1,120 @@
+"""
+Streaming tokenizer for STEP Part 21 (ISO 10303-21) files. Statements are
+read in chunks and split at ';' outside of strings and comments, without
+building any geometry.
+"""
+import re
+from dataclasses import dataclass
+from typing import BinaryIO, Iterator, List, Optional
+
+# Statement terminators, plus strings ('' escapes a quote) and comments that
+# are skipped whole so that ';' inside them is ignored. A lone quote or
+# comment opener is a string or comment that continues past the buffer.
+_TOKEN = re.compile(rb"'[^']*(?:''[^']*)*'|/\*.*?\*/|;|'|/\*", re.S)
+_STRING = re.compile(rb"'[^']*(?:''[^']*)*'")
+_STRING_OR_COMMENT = re.compile(rb"'[^']*(?:''[^']*)*'|/\*.*?\*/", re.S)
+_LEADING = re.compile(rb"(?:\s|/\*.*?\*/)*", re.S)
+_INSTANCE = re.compile(rb"#(\d+)\s*=\s*(\()?\s*([A-Za-z_][A-Za-z0-9_]*)?")
+_COMPLEX_TOKEN = re.compile(rb"[()]|[A-Za-z_][A-Za-z0-9_]*")
+_REFERENCE = re.compile(rb"#(\d+)")
+
+CHUNK_SIZE = 1 << 20
+
+
+@dataclass
+class Statement:
+    offset: int  # byte offset of the statement in the file
+    text: bytes  # statement text including the terminating ';'
+
+
+@dataclass
+class Instance:
+    entity_id: int
+    types: List[str]  # one type, or the partial types of a complex instance
+    offset: int
+    length: int
+    text: bytes
+
+
+def iter_statements(f: BinaryIO, chunk_size: int = CHUNK_SIZE) -> Iterator[Statement]:
+    """
+    Yields the statements of a Part 21 file opened in binary mode
+    """
+    buf = b''
+    buf_offset = 0
+    while True:
+        chunk = f.read(chunk_size)
+        buf += chunk
+        start = 0
+        for m in _TOKEN.finditer(buf):
+            token = m.group(0)
+            if token == b';':
+                yield Statement(buf_offset + start, buf[start:m.end()])
+                start = m.end()
+            elif token == b"'" or token == b'/*':
+                break  # read more before deciding where the statement ends
+        buf_offset += start
+        buf = buf[start:]
+        if not chunk:
+            return
+
+
+def _complex_types(text: bytes) -> List[str]:
+    # Partial entity names at depth 1 of `(A(...) B(...) ...)`
+    types = []
+    depth = 0
+    for m in _COMPLEX_TOKEN.finditer(text):
+        token = m.group(0)
+        if token == b'(':
+            depth += 1
+        elif token == b')':
+            depth -= 1
+        elif depth == 1:
+            types.append(token.decode('ascii').upper())
+    return types
+
+
+def parse_instance(statement: Statement) -> Optional[Instance]:
+    """
+    Entity id and type(s) of an entity instance statement `#id=TYPE(...);`
+    or `#id=(A(...) B(...));`. Returns None for other statements.
+    """
+    text = statement.text
+    m = _INSTANCE.match(text, _LEADING.match(text).end())
+    if m is None:
+        return None
+    if m.group(2):
+        body = _STRING_OR_COMMENT.sub(b'', text[m.start(2):])
+        types = _complex_types(body)
+    elif m.group(3):
+        types = [m.group(3).decode('ascii').upper()]
+    else:
+        return None
+    return Instance(int(m.group(1)), types, statement.offset, len(text), text)
+
+
+def iter_instances(f: BinaryIO, chunk_size: int = CHUNK_SIZE) -> Iterator[Instance]:
+    for statement in iter_statements(f, chunk_size):
+        instance = parse_instance(statement)
+        if instance is not None:
+            yield instance
+
+
+
+def instance_references(instance: Instance) -> List[int]:
+    """
+    Ids of the entities referenced by `instance`, in order of appearance
+    """
+    text = _STRING_OR_COMMENT.sub(b'', instance.text)
+    body_start = text.index(b'=') + 1
+    return [int(m.group(1)) for m in _REFERENCE.finditer(text, body_start)]
+
+
+def first_string(instance: Instance) -> Optional[str]:
+    """
+    First string argument of `instance`, e.g. the id of a PRODUCT
+    """
+    m = _STRING.search(instance.text)
+    if m is None:
+        return None
+    return m.group(0)[1:-1].replace(b"''", b"'").decode('latin-1')
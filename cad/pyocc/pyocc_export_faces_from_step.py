@@ -1,3 +1,4 @@
+import argparse
 import json
 import sys
 from dataclasses import dataclass
@@ -16,7 +17,7 @@ from OCC.Core.BRepTools import breptools_OuterWire
 from OCC.Core.GeomConvert import GeomConvert_CompCurveToBSplineCurve, geomconvert_CurveToBSplineCurve
 from OCC.Core.IFSelect import IFSelect_RetDone, IFSelect_ItemsByEntity
 from OCC.Core.STEPControl import STEPControl_Reader
-from OCC.Core.TopoDS import topods_Face, TopoDS_Wire, topods_Edge
+from OCC.Core.TopoDS import topods_Face, TopoDS_Wire, topods_Edge, TopoDS_Face
 from OCC.Core.gp import gp_Pnt, gp_Vec
 from OCC.Extend.TopologyUtils import TopologyExplorer, WireExplorer
 from OCC.Core.GeomAPI import GeomAPI_ProjectPointOnCurve
@@ -24,6 +25,18 @@ from OCC.Core.TopAbs import TopAbs_Orientation
 from OCC.Core.BOPTools import BOPTools_AlgoTools2D_BuildPCurveForEdgeOnFace
 from OCC.Core.TopTools import TopTools_ListOfShape
 
+from nurbs_cache import NURBS_CACHE
+from nurbs_eval import bspline_surface_data, evaluate_surface, bspline_curve_data, evaluate_curve
+from curve_sampling import adaptive_params
+from grid_density import DensityPolicy, add_density_args, density_policy_from_args, grid_resolution
+from parallel_export import export_faces_parallel
+from step_io import read_step_shape
+from brep_cache import add_cache_args, brep_cache_from_args
+from mesh_io import Mesh, open_mesh_writer
+from face_selection import add_face_selection_args, face_selection_from_args, iter_selected_faces
+from occ_mesh import mesh_shape, face_triangulation
+from mesh_topology import grid_quads, polyline_edges, classify_faces, remap_vertices
+
 NURBSObject = NewType('NURBSObject', Any)
 
 @dataclass
@@ -41,27 +54,6 @@ class NurbsParams:
             'poles_coords': [list(a) for a in self.poles_coords]
         }
 
-@dataclass
-class Mesh:
-    name: str
-    type_: str
-    edges: List[List]
-    faces: List[Tuple]
-    vertices: List[Tuple]
-    param_grid: Optional[List[List]]
-    is_outer_wire: bool = False
-
-    def to_dict(self) -> Dict:
-        return {
-            'name': self.name,
-            'type': self.type_,
-            'vertices': self.vertices,
-            'edges': self.edges,
-            'faces': self.faces,
-            'is_outer_wire': self.is_outer_wire,
-            'param_grid': self.param_grid
-        }
-
 def _get_2d_spline_params(spline: NURBSObject) -> Optional[NurbsParams]:
     NU = spline.NbUPoles()
     NV = spline.NbVPoles()
@@ -89,67 +81,41 @@ def _get_1d_spline_params(spline: NURBSObject) -> Optional[NurbsParams]:
     pass
 
 def _convert_to_nurbs(face: Any) -> Any:
-    nurbs_face = topods_Face(BRepBuilderAPI_NurbsConvert(face).Shape())
-    nurbs_surf = BRepAdaptor_Surface(nurbs_face)
+    nurbs_surf = BRepAdaptor_Surface(NURBS_CACHE.nurbs_face(face))
     return nurbs_surf
 
-def _compute_faces_from_verts(NU, NV) -> List:
-    faces = []
-    for i in range(NV - 1):
-        f_v1 = i * NU
-        for j in range(NU - 1):
-            f_v2 = f_v1 + 1
-            f_v3 = f_v2 + NU
-            f_v4 = f_v1 + NU
-            face = (f_v1, f_v2, f_v3, f_v4)
-            faces.append(face)
-            f_v1 += 1
-        f_v1 += NU
-    return faces
-
-def _compute_edges_from_verts(NU):
-    return [[i, i + 1] for i in range(NU - 1)]
-
-def _compute_mesh_from_spline_surface(name: str, spline: NURBSObject) -> Mesh:
+def _compute_mesh_from_spline_surface(name: str, spline: NURBSObject, policy: DensityPolicy) -> Mesh:
+    surface_data = bspline_surface_data(spline)
     U1, U2, V1, V2 = spline.Bounds()
-    tol = 10.
-    URES, VRES = spline.Resolution(tol)
-    NU = int((U2 - U1) / URES)
-    NV = int((V2 - V1) / VRES)
-    NU = NV = 50
+    NU, NV = grid_resolution(spline, surface_data, policy)
     Ulist = np.linspace(U1, U2, NU)
     Vlist = np.linspace(V1, V2, NV)
     Ugrid, Vgrid = np.meshgrid(Ulist, Vlist)
     UVgrid = np.column_stack((Ugrid.ravel(), Vgrid.ravel()))
-    Npoints = UVgrid.shape[0]
-    XYZgrid = np.zeros((Npoints, 3))
-    for i in range(Npoints):
-        u, v = UVgrid[i, :]
-        point = spline.Value(u, v)
-        XYZgrid[i, :] = point.Coord()
-    verts = [tuple(row) for row in XYZgrid]
-    faces = _compute_faces_from_verts(NU, NV)
-    return Mesh(name=name, type_='surface', vertices=verts,
-                edges=[], faces=faces, param_grid=UVgrid.tolist())
-
-def _compute_mesh_from_spline_curve(name: str, spline: NURBSObject) -> Mesh:
+    XYZgrid = evaluate_surface(surface_data, UVgrid)
+    faces = grid_quads(NU, NV)
+    return Mesh(name=name, type_='surface', vertices=XYZgrid,
+                edges=[], faces=faces, param_grid=UVgrid)
+
+def _compute_mesh_from_triangulation(name: str, face: TopoDS_Face) -> Optional[Mesh]:
+    triangulation = face_triangulation(face)
+    if triangulation is None:
+        print(f'No triangulation for {name}')
+        return
+    XYZ, UV, tris = triangulation
+    return Mesh(name=name, type_='surface', vertices=XYZ, edges=[], faces=tris, param_grid=UV)
+
+def _compute_mesh_from_spline_curve(name: str, spline: NURBSObject, policy: DensityPolicy) -> Mesh:
     U1, U2 = spline.FirstParameter(), spline.LastParameter()
-    tol = 10.
-    URES = spline.Resolution(tol)
-    NU = int((U2 - U1) / URES)
-    NU = 200
-    Ugrid = np.linspace(U1, U2, NU)
-    Xgrid = np.zeros((NU, ))
-    Ygrid = np.zeros((NU, ))
-    Zgrid = np.zeros((NU, ))
-    for i in range(NU):
-        point = spline.Value(Ugrid[i])
-        Xgrid[i], Ygrid[i], Zgrid[i] = point.Coord()
-    verts = np.column_stack((Xgrid, Ygrid, Zgrid))
-    verts = verts.tolist()
-    edges = _compute_edges_from_verts(NU)
+    curve_data = bspline_curve_data(spline)
+    # Seeded with the knot spans, then bisected until every chord is within
+    # the chord tolerance of the curve
+    Ugrid = adaptive_params(lambda t: evaluate_curve(curve_data, t), U1, U2, policy.chord_tol,
+                            min_segments=curve_data.degree, breaks=curve_data.knots)
+    verts = evaluate_curve(curve_data, Ugrid)
+    edges = polyline_edges(Ugrid.shape[0])
     return Mesh(name=name, type_='curve', vertices=verts,
-                edges=edges, faces=[], param_grid=Ugrid.tolist())
+                edges=edges, faces=[], param_grid=Ugrid)
 
 def _bspline_curve_from_wire(wire: NURBSObject) -> NURBSObject:
     """
@@ -172,16 +138,9 @@ def _bspline_curve_from_wire(wire: NURBSObject) -> NURBSObject:
         if BRep_Tool.Degenerated(edge):
             continue
 
-        # the edge must be converted to Nurbs edge
-        nurbs_converter = BRepBuilderAPI_NurbsConvert(edge)
-        nurbs_converter.Perform(edge)
-        nurbs_edge = topods_Edge(nurbs_converter.Shape())
-
-        # here we extract the underlying curve from the Nurbs edge
-        nurbs_curve = BRep_Tool_Curve(nurbs_edge)[0]
-
-        # we convert the Nurbs curve to Bspline curve
-        bspline_curve = geomconvert_CurveToBSplineCurve(nurbs_curve)
+        # the edge is converted to a Nurbs edge and its curve to a Bspline
+        # curve; edges shared with already processed faces hit the cache
+        bspline_curve = NURBS_CACHE.bspline_curve(edge)
 
         # we can now add the Bspline curve to the composite wire curve
         tolerance = 0.1
@@ -205,7 +164,7 @@ def _partition_verts_by_wire(surface_spline: NURBSObject, surface_mesh: Mesh,
         # and curves have suffixes `_s` or `s` and `_c` or `c`
 
         # Compute normal vector to the surface
-        pt_s = gp_Pnt(*verts[i])
+        pt_s = gp_Pnt(*verts[i].tolist())
         us, vs = uvs[i]
         normalu_s = gp_Vec()
         normalv_s = gp_Vec()
@@ -252,92 +211,111 @@ def _trim(surface_spline: NURBSObject, surface_mesh: Mesh,
 
 def _recompute_mesh(name: str, old_mesh: Mesh, is_interior_vert: np.ndarray) -> Mesh:
     M = old_mesh
-    n_verts = len(old_mesh.vertices)
-    n_faces = len(M.faces)
+    faces = M.faces
 
     # Partition faces into interior and exterior
-    is_interior_face = np.zeros((n_faces,), dtype=bool)
-    for i, face in enumerate(M.faces):
-        if all(is_interior_vert[np.array(face)]):
-            is_interior_face[i] = True
+    is_interior_face = classify_faces(faces, is_interior_vert, require_all=True)
 
     # Remap the indices of interior faces to new filtered vertex indices
-    interior_verts_idx = np.where(is_interior_vert)[0]
-    vertex_index_map = VM = dict(zip(interior_verts_idx, range(n_verts)))
-    interior_faces = np.array(M.faces)[is_interior_face]
-    new_verts = np.array(M.vertices)[is_interior_vert]
-    new_faces = [(VM[i1], VM[i2], VM[i3], VM[i4]) for i1, i2, i3, i4 in interior_faces]
-    new_mesh = Mesh(name=name, type_='surface', vertices=new_verts.tolist(),
+    interior_faces = faces[is_interior_face]
+    new_verts = M.vertices[is_interior_vert]
+    new_faces = remap_vertices(interior_faces, is_interior_vert)
+    new_mesh = Mesh(name=name, type_='surface', vertices=new_verts,
                     edges=[], faces=new_faces, param_grid=None)
     return new_mesh
 
 
-def main():
-    step_reader = STEPControl_Reader()
-    status = step_reader.ReadFile(sys.argv[1])
-
-    if status != IFSelect_RetDone:
-        raise ValueError('Error parsing STEP file')
-
-    failsonly = False
-    step_reader.PrintCheckLoad(failsonly, IFSelect_ItemsByEntity)
-    step_reader.PrintCheckTransfer(failsonly, IFSelect_ItemsByEntity)
-    step_reader.TransferRoot()
-    shape = step_reader.Shape()
-    topo_explorer = TopologyExplorer(shape)
-    shape_faces = list(topo_explorer.faces())
-    n_faces = len(shape_faces)
-    nurbs_params_list = []
+def _export_face(i: int, face: TopoDS_Face, policy: DensityPolicy) -> List[Mesh]:
+    face_id = f'_FACE_{i:06d}'
     meshes_list = []
+    if policy.engine == 'occ':
+        # The OCC mesher handles every surface type and the trimming
+        surface_mesh = _compute_mesh_from_triangulation(face_id, face)
+        if surface_mesh is not None:
+            meshes_list.append(surface_mesh)
+        return meshes_list
+
+    surface = BRepAdaptor_Surface(face)
+    surface_type = surface.GetType()
+
+    primitive_types = [G.GeomAbs_Cylinder, G.GeomAbs_Torus, G.GeomAbs_Sphere]
+    if surface_type in primitive_types:
+        surface = _convert_to_nurbs(face)
+
+    if surface_type != G.GeomAbs_BSplineSurface:
+        print(f'Ignored shape of type {surface_type}')
+        return meshes_list
+
+    surface_spline = surface.BSpline()
+
+    # Compute mesh from NURBS params
+    surface_mesh = _compute_mesh_from_spline_surface(face_id, surface_spline, policy)
+
+    # Handle wires
+    face_explorer = TopologyExplorer(face, ignore_orientation=True)
+    wires = list(face_explorer.wires())
+    inner_wire_splines = []
+    outer_wire_splines = []
+
+    for wire in wires:
+        wire_spline = _bspline_curve_from_wire(wire)
+        if wire == breptools_OuterWire(face):
+            outer_wire_splines.append(wire_spline)
+        else:
+            inner_wire_splines.append(wire_spline.Reversed())
+        wire_mesh = _compute_mesh_from_spline_curve(face_id, wire_spline, policy)
+        meshes_list.append(wire_mesh)
+
+    is_interior_vert = _trim(surface_spline, surface_mesh, inner_wire_splines, outer_wire_splines)
+    # new_surface_mesh = _recompute_mesh(face_id, surface_mesh, is_interior_vert)
+    new_surface_mesh = surface_mesh
+    meshes_list.append(new_surface_mesh)
+    return meshes_list
+
+def _process_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Export face meshes from a STEP file')
+    parser.add_argument('step_file', action='store', help='path to STEP file')
+    parser.add_argument('--workers', dest='workers', action='store', type=int, default=1,
+                        help='number of worker processes')
+    parser.add_argument('--output-format', dest='output_format', action='store',
+                        choices=['bin', 'jsonl'], default='bin',
+                        help='stream meshes to _meshes.bin (binary container) or _meshes.jsonl')
+    add_density_args(parser, engines=('grid', 'occ'), boundary_refinement=False, analytic=False)
+    add_cache_args(parser)
+    add_face_selection_args(parser)
+    return parser.parse_args()
 
-    for i, face in enumerate(shape_faces):
-        print(f'Processing faces {i}/{n_faces}')
-        face_id = f'_FACE_{i:06d}'
-        if i != 74: continue
-        surface = BRepAdaptor_Surface(face)
-        surface_type = surface.GetType()
-
-        primitive_types = [G.GeomAbs_Cylinder, G.GeomAbs_Torus, G.GeomAbs_Sphere]
-        if surface_type in primitive_types:
-            surface = _convert_to_nurbs(face)
-
-        if surface_type != G.GeomAbs_BSplineSurface:
-            print(f'Ignored shape of type {surface_type}')
-            continue
-
-        surface_spline = surface.BSpline()
-
-        # Compute mesh from NURBS params
-        surface_mesh = _compute_mesh_from_spline_surface(face_id, surface_spline)
-
-        # Export raw parameters
-        nurbs_params = _get_2d_spline_params(surface_spline)
-        nurbs_params_list.append(nurbs_params.to_dict())
-
-        # Handle wires
-        face_explorer = TopologyExplorer(face, ignore_orientation=True)
-        wires = list(face_explorer.wires())
-        inner_wire_splines = []
-        outer_wire_splines = []
-
-        for wire in wires:
-            wire_spline = _bspline_curve_from_wire(wire)
-            if wire == breptools_OuterWire(face):
-                outer_wire_splines.append(wire_spline)
-            else:
-                inner_wire_splines.append(wire_spline.Reversed())
-            wire_mesh = _compute_mesh_from_spline_curve(face_id, wire_spline)
-            meshes_list.append(wire_mesh.to_dict())
-
-        is_interior_vert = _trim(surface_spline, surface_mesh, inner_wire_splines, outer_wire_splines)
-        # new_surface_mesh = _recompute_mesh(face_id, surface_mesh, is_interior_vert)
-        new_surface_mesh = surface_mesh
-        meshes_list.append(new_surface_mesh.to_dict())
-
-    # Write meshes to disk
-    with Path('_meshes.json').open('w') as f:
-        json.dump(meshes_list, f, indent=2)
+def main():
+    args = _process_args()
+    policy = density_policy_from_args(args)
+    shape = read_step_shape(args.step_file, brep_cache_from_args(args))
+    selection = face_selection_from_args(args)
+    if policy.engine == 'occ':
+        # Triangulations are stored on the shape and travel with it to the workers
+        mesh_shape(shape, policy)
+
+    def _export_faces():
+        for i, face in iter_selected_faces(shape, selection):
+            print(f'Processing face {i}')
+            yield _export_face(i, face, policy)
+
+    if args.workers > 1:
+        face_indices = [i for i, _ in iter_selected_faces(shape, selection)]
+        face_results = export_faces_parallel(_export_face, shape, face_indices, policy, args.workers)
+    else:
+        face_results = _export_faces()
+
+    # Stream meshes to disk face by face
+    output_file = Path(f'_meshes.{args.output_format}')
+    with open_mesh_writer(output_file) as writer:
+        for face_meshes in face_results:
+            for mesh in face_meshes:
+                # Lists are built only for JSON, the binary writer takes the arrays as is
+                writer.append(mesh.to_dict() if args.output_format == 'jsonl' else mesh.to_arrays())
+
+    # Pool workers keep their own conversion caches
+    if args.workers <= 1:
+        print(f'NURBS conversion cache: {NURBS_CACHE.report()}')
 
 if __name__ == '__main__':
     main()
-
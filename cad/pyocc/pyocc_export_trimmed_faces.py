@@ -1,3 +1,4 @@
+import argparse
 import json
 import sys
 from dataclasses import dataclass
@@ -21,11 +22,30 @@ from OCC.Core.TopoDS import topods_Face, TopoDS_Wire, topods_Edge, TopoDS_Face
 from OCC.Core.gp import gp_Pnt, gp_Vec, gp_Pnt2d
 from OCC.Extend.TopologyUtils import TopologyExplorer, WireExplorer
 from OCC.Core.GeomAPI import GeomAPI_ProjectPointOnCurve
-from OCC.Core.TopAbs import TopAbs_Orientation, TopAbs_IN, TopAbs_ON
+from OCC.Core.TopAbs import TopAbs_Orientation, TopAbs_IN, TopAbs_ON, TopAbs_REVERSED
 from OCC.Core.BOPTools import BOPTools_AlgoTools2D_BuildPCurveForEdgeOnFace
 from OCC.Core.TopTools import TopTools_ListOfShape
 from OCC.Core.BRepClass import BRepClass_FaceClassifier
 
+from nurbs_cache import NURBS_CACHE
+from nurbs_eval import bspline_surface_data, evaluate_surface, bspline_curve_data, evaluate_curve
+from uv_classify import classify_uv_grid, face_uv_polygons
+from quadtree_refine import refine_trimmed_grid
+from uv_triangulate import clean_ring, interior_grid_points, triangulate_rings
+from curve_sampling import adaptive_params
+from grid_density import DensityPolicy, add_density_args, density_policy_from_args, grid_resolution
+from parallel_export import export_faces_parallel
+from step_io import read_step_shape, shape_tolerance
+from brep_cache import add_cache_args, brep_cache_from_args
+from mesh_io import Mesh, open_mesh_writer
+from gltf_export import GlbWriter
+from vertex_weld import WeldingWriter, add_weld_args
+from face_selection import add_face_selection_args, face_selection_from_args, iter_selected_faces
+from occ_mesh import mesh_shape, face_triangulation
+from analytic_tessellation import tessellate_analytic_face
+from shape_instances import add_instance_args, find_part_instances, parts_compound, instance_records
+from mesh_topology import grid_quads, polyline_edges, classify_faces, remap_vertices
+
 NURBSObject = NewType('NURBSObject', Any)
 
 @dataclass
@@ -43,142 +63,114 @@ class NurbsParams:
             'poles_coords': [list(a) for a in self.poles_coords]
         }
 
-@dataclass
-class Mesh:
-    name: str
-    type_: str
-    edges: List[List]
-    faces: List[Tuple]
-    vertices: List[Tuple]
-    uv: Optional[List[List]]
-    is_outer_wire: bool = False
-
-    def to_dict(self) -> Dict:
-        return {
-            'name': self.name,
-            'type': self.type_,
-            'vertices': self.vertices,
-            'edges': self.edges,
-            'faces': self.faces,
-            'is_outer_wire': self.is_outer_wire,
-            'param_grid': self.uv
-        }
-
 def _convert_to_nurbs(face: Any) -> Any:
-    nurbs_face = topods_Face(BRepBuilderAPI_NurbsConvert(face).Shape())
-    nurbs_surf = BRepAdaptor_Surface(nurbs_face)
+    nurbs_surf = BRepAdaptor_Surface(NURBS_CACHE.nurbs_face(face))
     return nurbs_surf
 
-def _compute_faces_from_verts(NU, NV) -> np.ndarray:
-    faces = []
-    for i in range(NV - 1):
-        f_v1 = i * NU
-        for j in range(NU - 1):
-            f_v2 = f_v1 + 1
-            f_v3 = f_v2 + NU
-            f_v4 = f_v1 + NU
-            face = (f_v1, f_v2, f_v3, f_v4)
-            faces.append(face)
-            f_v1 += 1
-        f_v1 += NU
-    return np.array(faces)
-
-def _compute_edges_from_verts(NU):
-    return [[i, i + 1] for i in range(NU - 1)]
-
-def _classify_points(UVgrid, face):
-    """
-    Classifies if points in `uvgrid` lie on trimmed `face` or outside of it
-    """
-    Npts = UVgrid.shape[0]
-    is_point_on_face = np.ones((Npts, ), dtype=bool)
-    for i in range(Npts):
-        u, v = UVgrid[i]
-        pnt = gp_Pnt2d(u, v)
-        fc = BRepClass_FaceClassifier()
-        fc.Perform(face, pnt, 1e-3)
-        state = fc.State()
-        if state not in [TopAbs_IN, TopAbs_ON]:
-            is_point_on_face[i] = False
-
-    return is_point_on_face
-
-def _classify_faces(faces: np.ndarray, is_point_on_face: np.ndarray) -> np.ndarray:
-    # Partition faces into interior and exterior
-    n_faces = faces.shape[0]
-    is_interior_face = np.zeros((n_faces,), dtype=bool)
-    for i, face in enumerate(faces):
-        if all(is_point_on_face[np.array(face)]):
-            is_interior_face[i] = True
-    return is_interior_face
-
-def _mesh_from_spline_surface(name: str, face: NURBSObject) -> Mesh:
+def _mesh_from_spline_surface(name: str, face: NURBSObject, policy: DensityPolicy) -> Mesh:
     bspline_sirface = _bspline_surface_from_face(face)
+    surface_data = bspline_surface_data(bspline_sirface)
     U1, U2, V1, V2 = bspline_sirface.Bounds()
-    tol = 10.
-    URES, VRES = bspline_sirface.Resolution(tol)
-    NU = int((U2 - U1) / URES)
-    NV = int((V2 - V1) / VRES)
-    NU = NV = 50
+    NU, NV = grid_resolution(bspline_sirface, surface_data, policy)
+    if policy.refine_boundary:
+        return _mesh_from_refined_grid(name, face, surface_data, (U1, U2, V1, V2), NU, NV, policy)
     Ulist = np.linspace(U1, U2, NU)
     Vlist = np.linspace(V1, V2, NV)
     Ugrid, Vgrid = np.meshgrid(Ulist, Vlist)
     UVgrid = np.column_stack((Ugrid.ravel(), Vgrid.ravel()))
-    n_pts = UVgrid.shape[0]
-    all_mesh_faces = _compute_faces_from_verts(NU, NV)
+    all_mesh_faces = grid_quads(NU, NV)
 
     # Filter points not on Face
-    included_points = _classify_points(UVgrid, face)
+    included_points = classify_uv_grid(face, Ulist, Vlist)
 
     # Filter mesh faces where any of its vertex is trimmed away
-    included_mesh_faces = _classify_faces(all_mesh_faces, included_points)
+    included_mesh_faces = classify_faces(all_mesh_faces, included_points, require_all=True)
 
     # Recompute vertex numbers and update faces with these new vertex indices
-    included_points_idx = np.where(included_points)[0]
-    vertex_index_map = VM = dict(zip(included_points_idx, range(n_pts)))
     interior_faces = all_mesh_faces[included_mesh_faces]
+    if face.Orientation() == TopAbs_REVERSED:
+        # Grid quads are counter-clockwise in UV, reversed faces point the other way
+        interior_faces = interior_faces[:, ::-1]
     mesh_vert_UV = UVgrid[included_points]  # Mesh vertices in UV space
-    mesh_faces = [(VM[i1], VM[i2], VM[i3], VM[i4]) for i1, i2, i3, i4 in interior_faces]
+    mesh_faces = remap_vertices(interior_faces, included_points)
 
-    n_verts = included_points_idx.shape[0]
-    XYZgrid = np.zeros((n_verts, 3))
-    for i in range(n_verts):
-        u, v = mesh_vert_UV[i]
-        point = bspline_sirface.Value(u, v)
-        XYZgrid[i, :] = point.Coord()
-    mesh_verts = [tuple(row) for row in XYZgrid]
-    return Mesh(name=name, type_='surface', vertices=mesh_verts,
-                edges=[], faces=mesh_faces, param_grid=UVgrid.tolist())
+    XYZgrid = evaluate_surface(surface_data, mesh_vert_UV)
+    return Mesh(name=name, type_='surface', vertices=XYZgrid,
+                edges=[], faces=mesh_faces, param_grid=mesh_vert_UV)
 
 
-def _mesh_from_spline_curve(name: str, spline: NURBSObject) -> Mesh:
+def _mesh_from_constrained_triangulation(name: str, face: TopoDS_Face, policy: DensityPolicy) -> Optional[Mesh]:
+    uv_rings = face_uv_polygons(face)
+    if not uv_rings:
+        return
+    bspline_sirface = _bspline_surface_from_face(face)
+    surface_data = bspline_surface_data(bspline_sirface)
+    U1, U2, V1, V2 = bspline_sirface.Bounds()
+    NU, NV = grid_resolution(bspline_sirface, surface_data, policy)
+
+    # The pcurve polygons are the boundary, the grid points inside it the
+    # Steiner points; only the triangulation vertices are evaluated
+    eps = 1e-9 * max(U2 - U1, V2 - V1)
+    rings = [clean_ring(r, eps) for r in uv_rings]
+    if any(r.shape[0] < 3 for r in rings):
+        return
+    steiner = interior_grid_points(rings, np.linspace(U1, U2, NU), np.linspace(V1, V2, NV))
+    triangulation = triangulate_rings(rings, steiner)
+    if triangulation is None or triangulation[1].shape[0] == 0:
+        # Left to the grid engine
+        return
+    UV, tris = triangulation
+    if face.Orientation() == TopAbs_REVERSED:
+        tris = tris[:, [0, 2, 1]]
+
+    XYZ = evaluate_surface(surface_data, UV)
+    return Mesh(name=name, type_='surface', vertices=XYZ, edges=[], faces=tris, param_grid=UV)
+
+def _mesh_from_refined_grid(name: str, face: TopoDS_Face, surface_data: Any,
+                            bounds: Tuple[float, float, float, float], NU: int, NV: int,
+                            policy: DensityPolicy) -> Mesh:
+    UV, XYZ, faces = refine_trimmed_grid(face, surface_data, bounds, NU, NV, policy)
+    # As on the plain grid, keep only the faces of cells with every corner on
+    # the face; the refined boundary cells bring them closer to the trim
+    faces = [f[:-1] for f in faces if f[-1] == 4]
+    used = np.unique(np.concatenate(faces)) if faces else np.zeros((0, ), dtype=int)
+    remap = np.full(UV.shape[0], -1, dtype=int)
+    remap[used] = np.arange(used.shape[0])
+    return Mesh(name=name, type_='surface', vertices=XYZ[used],
+                edges=[], faces=[remap[f] for f in faces], param_grid=UV[used])
+
+def _mesh_from_triangulation(name: str, face: TopoDS_Face) -> Optional[Mesh]:
+    triangulation = face_triangulation(face)
+    if triangulation is None:
+        print(f'No triangulation for {name}')
+        return
+    XYZ, UV, tris = triangulation
+    return Mesh(name=name, type_='surface', vertices=XYZ, edges=[], faces=tris, param_grid=UV)
+
+def _mesh_from_analytic_surface(name: str, face: TopoDS_Face, policy: DensityPolicy) -> Optional[Mesh]:
+    tessellation = tessellate_analytic_face(face, policy)
+    if tessellation is None:
+        return
+    UV, XYZ, tris = tessellation
+    return Mesh(name=name, type_='surface', vertices=XYZ, edges=[], faces=tris, param_grid=UV)
+
+def _mesh_from_spline_curve(name: str, spline: NURBSObject, policy: DensityPolicy) -> Mesh:
     U1, U2 = spline.FirstParameter(), spline.LastParameter()
-    tol = 10.
-    URES = spline.Resolution(tol)
-    NU = int((U2 - U1) / URES)
-    NU = 200
-    Ugrid = np.linspace(U1, U2, NU)
-    Xgrid = np.zeros((NU, ))
-    Ygrid = np.zeros((NU, ))
-    Zgrid = np.zeros((NU, ))
-    for i in range(NU):
-        point = spline.Value(Ugrid[i])
-        Xgrid[i], Ygrid[i], Zgrid[i] = point.Coord()
-    verts = np.column_stack((Xgrid, Ygrid, Zgrid))
-    verts = verts.tolist()
-    edges = _compute_edges_from_verts(NU)
+    curve_data = bspline_curve_data(spline)
+    # Seeded with the knot spans, then bisected until every chord is within
+    # the chord tolerance of the curve
+    Ugrid = adaptive_params(lambda t: evaluate_curve(curve_data, t), U1, U2, policy.chord_tol,
+                            min_segments=curve_data.degree, breaks=curve_data.knots)
+    verts = evaluate_curve(curve_data, Ugrid)
+    edges = polyline_edges(Ugrid.shape[0])
     return Mesh(name=name, type_='curve', vertices=verts,
-                edges=edges, faces=[], param_grid=Ugrid.tolist())
+                edges=edges, faces=[], param_grid=Ugrid)
 
 def _bspline_surface_from_face(face):
     if not isinstance(face, TopoDS_Face):
         raise TypeError("face must be a TopoDS_Face")
-    # TopoDS_Face converted to Nurbs
-    nurbs_face = topods_Face(BRepBuilderAPI_NurbsConvert(face).Shape())
-    # GeomSurface obtained from Nurbs face
-    surface = BRep_Tool.Surface(nurbs_face)
-    # surface is now further converted to a bspline surface
-    bspline_surface = geomconvert_SurfaceToBSplineSurface(surface)
+    # TopoDS_Face converted to Nurbs and then to a bspline surface, once per run
+    bspline_surface = NURBS_CACHE.bspline_surface(face)
     return bspline_surface
 
 def _bspline_curve_from_wire(wire: NURBSObject) -> NURBSObject:
@@ -202,16 +194,9 @@ def _bspline_curve_from_wire(wire: NURBSObject) -> NURBSObject:
         if BRep_Tool.Degenerated(edge):
             continue
 
-        # the edge must be converted to Nurbs edge
-        nurbs_converter = BRepBuilderAPI_NurbsConvert(edge)
-        nurbs_converter.Perform(edge)
-        nurbs_edge = topods_Edge(nurbs_converter.Shape())
-
-        # here we extract the underlying curve from the Nurbs edge
-        nurbs_curve = BRep_Tool_Curve(nurbs_edge)[0]
-
-        # we convert the Nurbs curve to Bspline curve
-        bspline_curve = geomconvert_CurveToBSplineCurve(nurbs_curve)
+        # the edge is converted to a Nurbs edge and its curve to a Bspline
+        # curve; edges shared with already processed faces hit the cache
+        bspline_curve = NURBS_CACHE.bspline_curve(edge)
 
         # we can now add the Bspline curve to the composite wire curve
         tolerance = 0.1
@@ -222,43 +207,93 @@ def _bspline_curve_from_wire(wire: NURBSObject) -> NURBSObject:
     return comp_curve
 
 
-def main():
-    step_reader = STEPControl_Reader()
-    status = step_reader.ReadFile(sys.argv[1])
-
-    if status != IFSelect_RetDone:
-        raise ValueError('Error parsing STEP file')
-
-    failsonly = False
-    step_reader.PrintCheckLoad(failsonly, IFSelect_ItemsByEntity)
-    step_reader.PrintCheckTransfer(failsonly, IFSelect_ItemsByEntity)
-    step_reader.TransferRoot()
-    shape = step_reader.Shape()
-    topo_explorer = TopologyExplorer(shape)
-    shape_faces = list(topo_explorer.faces())
-    n_faces = len(shape_faces)
+def _export_face(i: int, face: TopoDS_Face, policy: DensityPolicy) -> List[Mesh]:
+    face_id = f'_FACE_{i:06d}'
     meshes_list = []
 
-    for i, face in enumerate(shape_faces):
-        if i != 22: continue
-        print(f'Processing faces {i}/{n_faces}')
-        face_id = f'_FACE_{i:06d}'
-        # Compute raw mesh from NURBS params
-        surface_mesh = _mesh_from_spline_surface(face_id, face)
-        meshes_list.append(surface_mesh.to_dict())
-
-        # Compute meshes for face boundaries
-        facex = TopologyExplorer(face)
-        wires = list(facex.wires())
-        for wire in wires:
-            bspline_curve = _bspline_curve_from_wire(wire)
-            mesh_boundary = _mesh_from_spline_curve(face_id, bspline_curve)
-            meshes_list.append(mesh_boundary.to_dict())
-
-    # Write meshes to disk
-    with Path('_meshes.json').open('w') as f:
-        json.dump(meshes_list, f, indent=2)
+    # Compute raw mesh from NURBS params
+    if policy.engine == 'occ':
+        surface_mesh = _mesh_from_triangulation(face_id, face)
+    else:
+        surface_mesh = _mesh_from_analytic_surface(face_id, face, policy) if policy.analytic else None
+        if surface_mesh is None and policy.engine == 'cdt':
+            surface_mesh = _mesh_from_constrained_triangulation(face_id, face, policy)
+        if surface_mesh is None:
+            surface_mesh = _mesh_from_spline_surface(face_id, face, policy)
+    if surface_mesh is not None:
+        meshes_list.append(surface_mesh)
+
+    # Compute meshes for face boundaries
+    facex = TopologyExplorer(face)
+    wires = list(facex.wires())
+    for wire in wires:
+        bspline_curve = _bspline_curve_from_wire(wire)
+        mesh_boundary = _mesh_from_spline_curve(face_id, bspline_curve, policy)
+        meshes_list.append(mesh_boundary)
+    return meshes_list
+
+def _process_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Export trimmed face meshes from a STEP file')
+    parser.add_argument('step_file', action='store', help='path to STEP file')
+    parser.add_argument('--workers', dest='workers', action='store', type=int, default=1,
+                        help='number of worker processes')
+    parser.add_argument('--output-format', dest='output_format', action='store',
+                        choices=['bin', 'jsonl', 'glb'], default='bin',
+                        help='stream meshes to _meshes.bin (binary container) or _meshes.jsonl, '
+                             'or write surfaces to _meshes.glb (binary glTF)')
+    add_density_args(parser)
+    add_cache_args(parser)
+    add_face_selection_args(parser)
+    add_instance_args(parser)
+    add_weld_args(parser)
+    return parser.parse_args()
+
+def main():
+    args = _process_args()
+    policy = density_policy_from_args(args)
+    shape = read_step_shape(args.step_file, brep_cache_from_args(args))
+    selection = face_selection_from_args(args)
+    records = []
+    if args.instances:
+        # Export the faces of each unique part once, in part coordinates
+        part_instances = find_part_instances(shape)
+        shape, part_faces = parts_compound(part_instances.parts)
+        records = instance_records(part_instances, part_faces)
+        print(f'{len(part_instances.instances)} occurrences of {len(part_instances.parts)} parts '
+              f'(instancing factor {part_instances.instancing_factor:.1f})')
+    if policy.engine == 'occ':
+        # Triangulations are stored on the shape and travel with it to the workers
+        mesh_shape(shape, policy)
+
+    def _export_faces():
+        for i, face in iter_selected_faces(shape, selection):
+            print(f'Processing face {i}')
+            yield _export_face(i, face, policy)
+
+    if args.workers > 1:
+        face_indices = [i for i, _ in iter_selected_faces(shape, selection)]
+        face_results = export_faces_parallel(_export_face, shape, face_indices, policy, args.workers)
+    else:
+        face_results = _export_faces()
+
+    # Stream meshes to disk face by face
+    output_file = Path(f'_meshes.{args.output_format}')
+    writer = GlbWriter(output_file) if args.output_format == 'glb' else open_mesh_writer(output_file)
+    if args.weld:
+        # Welded once all faces are in, with the tolerance of the model
+        writer = WeldingWriter(writer, eps=args.weld_tol, model_tol=shape_tolerance(shape),
+                               as_lists=args.output_format == 'jsonl')
+    with writer:
+        for face_meshes in face_results:
+            for mesh in face_meshes:
+                # Lists are built only for JSON, the binary writer takes the arrays as is
+                writer.append(mesh.to_dict() if args.output_format == 'jsonl' else mesh.to_arrays())
+        for record in records:
+            writer.append(record)
+
+    # Pool workers keep their own conversion caches
+    if args.workers <= 1:
+        print(f'NURBS conversion cache: {NURBS_CACHE.report()}')
 
 if __name__ == '__main__':
     main()
-
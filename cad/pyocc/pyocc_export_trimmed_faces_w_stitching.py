@@ -1,33 +1,41 @@
-import json
-import sys
+import argparse
 from dataclasses import dataclass
+from functools import partial
 from pathlib import Path
-from typing import List, Dict, Any, Optional, Tuple, NewType
+from typing import List, Dict, Any, Optional, NewType
 
-import OCC.Core.GeomAbs as G
 import numpy as np
-from OCC.Core.BRep import BRep_Tool, BRep_Tool_Curve, BRep_Builder
 from OCC.Core.BRepAdaptor import BRepAdaptor_Surface
-from OCC.Core.BRepBuilderAPI import (BRepBuilderAPI_NurbsConvert,
-                                     BRepBuilderAPI_MakeEdge,
-                                     BRepBuilderAPI_MakeFace,
-                                     BRepBuilderAPI_MakeWire)
-from OCC.Core.BRepTools import breptools_OuterWire
-from OCC.Core.GeomConvert import GeomConvert_CompCurveToBSplineCurve, geomconvert_CurveToBSplineCurve, \
-    geomconvert_SurfaceToBSplineSurface
-from OCC.Core.IFSelect import IFSelect_RetDone, IFSelect_ItemsByEntity
-from OCC.Core.STEPControl import STEPControl_Reader
-from OCC.Core.TopoDS import topods_Face, TopoDS_Wire, topods_Edge, TopoDS_Face
-from OCC.Core.gp import gp_Pnt, gp_Vec, gp_Pnt2d
-from OCC.Extend.TopologyUtils import TopologyExplorer, WireExplorer
-from OCC.Core.GeomAPI import GeomAPI_ProjectPointOnCurve
-from OCC.Core.TopAbs import TopAbs_Orientation, TopAbs_IN, TopAbs_ON
-from OCC.Core.BOPTools import BOPTools_AlgoTools2D_BuildPCurveForEdgeOnFace
-from OCC.Core.TopTools import TopTools_ListOfShape
-from OCC.Core.BRepClass import BRepClass_FaceClassifier
+from OCC.Core.TopoDS import TopoDS_Wire, TopoDS_Face
+from OCC.Extend.TopologyUtils import TopologyExplorer
+from OCC.Core.TopAbs import TopAbs_REVERSED
+
+from nurbs_cache import NURBS_CACHE
+from nurbs_eval import bspline_surface_data, evaluate_surface
+from uv_classify import classify_uv_grid
+from quadtree_refine import refine_trimmed_grid
+from grid_density import DensityPolicy, add_density_args, density_policy_from_args, grid_resolution
+from parallel_export import export_faces_parallel
+from step_io import read_step_shape, shape_tolerance
+from brep_cache import add_cache_args, brep_cache_from_args
+from mesh_io import Mesh, open_mesh_writer
+from gltf_export import GlbWriter
+from vertex_weld import WeldingWriter, add_weld_args
+from face_selection import add_face_selection_args, face_selection_from_args, iter_selected_faces
+from occ_mesh import mesh_shape, face_triangulation
+from analytic_tessellation import tessellate_analytic_face
+from shape_instances import add_instance_args, find_part_instances, parts_compound, instance_records
+from edge_tessellation import EdgeTessellation, WireSamples
+from mesh_topology import grid_quads, polyline_edges, face_types, remap_vertices
+from boundary_snap import BoundaryPolyline, boundary_face_vertices, snap_vertices
+from uv_triangulate import clean_ring, interior_grid_points, points_in_rings, triangulate_rings
+from stage_timer import NULL_TIMER, StageTimer
 
 NURBSObject = NewType('NURBSObject', Any)
 
+# Shared samples of all edges of the shape being exported, set by _init_edges
+_edges: Optional[EdgeTessellation] = None
+
 @dataclass
 class NurbsParams:
     num_Upoles: int
@@ -43,44 +51,14 @@ class NurbsParams:
             'poles_coords': [list(a) for a in self.poles_coords]
         }
 
-@dataclass
-class Mesh:
-    name: str
-    type_: str
-    edges: List[List]
-    faces: List[Tuple]
-    vertices: List[Tuple]
-    param_grid: Optional[List[List]]
-
-    def __str__(self):
-        cn = self.__class__.__name__
-        type_ = self.type_
-        idf = id(self.faces)
-        ide = id(self.edges)
-        idv = id(self.vertices)
-        idpg = id(self.param_grid)
-        return f'{cn}({self.name}, type={type_}, faces=<{idf}>, edges=<{ide}>, ' \
-               f'vertices=<{idv}, param_grid=<{idpg}>)'
-
-    def __repr__(self):
-        return self.__str__()
-
-    def to_dict(self) -> Dict:
-        return {
-            'name': self.name,
-            'type': self.type_,
-            'vertices': self.vertices,
-            'edges': self.edges,
-            'faces': self.faces,
-            'param_grid': self.param_grid
-        }
-
-@dataclass
 class TopofaceMesh:
-    name: str
-    surface: Mesh
-    curves: List[Mesh]
-    pcurves: List[Mesh]
+    __slots__ = ('name', 'surface', 'curves', 'pcurves')
+
+    def __init__(self, name: str, surface: Mesh, curves: List[Mesh], pcurves: List[Mesh]):
+        self.name = name
+        self.surface = surface
+        self.curves = curves
+        self.pcurves = pcurves
 
     def __str__(self):
         cn = self.__class__.__name__
@@ -92,7 +70,15 @@ class TopofaceMesh:
     def __repr__(self):
         return self.__str__()
 
-    def to_dict(self):
+    def to_arrays(self) -> Dict:
+        return {
+            'name': self.name,
+            'surface': self.surface.to_arrays(),
+            'curves': [cm.to_arrays() for cm in self.curves],
+            'pcurves': [pc.to_arrays() for pc in self.pcurves],
+        }
+
+    def to_dict(self) -> Dict:
         return {
             'name': self.name,
             'surface': self.surface.to_dict(),
@@ -102,287 +88,297 @@ class TopofaceMesh:
         }
 
 def _convert_to_nurbs(face: Any) -> Any:
-    nurbs_face = topods_Face(BRepBuilderAPI_NurbsConvert(face).Shape())
-    nurbs_surf = BRepAdaptor_Surface(nurbs_face)
+    nurbs_surf = BRepAdaptor_Surface(NURBS_CACHE.nurbs_face(face))
     return nurbs_surf
 
-def _compute_faces_from_verts(NU, NV) -> np.ndarray:
-    faces = []
-    for i in range(NV - 1):
-        f_v1 = i * NU
-        for j in range(NU - 1):
-            f_v2 = f_v1 + 1
-            f_v3 = f_v2 + NU
-            f_v4 = f_v1 + NU
-            face = (f_v1, f_v2, f_v3, f_v4)
-            faces.append(face)
-            f_v1 += 1
-        f_v1 += NU
-    return np.array(faces)
-
-def _compute_edges_from_verts(NU):
-    return [[i, i + 1] for i in range(NU - 1)]
-
-def _classify_points(UVgrid, face):
-    """
-    Classifies if points in `uvgrid` lie on trimmed `face` or outside of it
-    """
-    Npts = UVgrid.shape[0]
-    is_point_on_face = np.ones((Npts, ), dtype=bool)
-    for i in range(Npts):
-        u, v = UVgrid[i]
-        pnt = gp_Pnt2d(u, v)
-        fc = BRepClass_FaceClassifier()
-        fc.Perform(face, pnt, 1e-3)
-        state = fc.State()
-        if state not in [TopAbs_IN, TopAbs_ON]:
-            is_point_on_face[i] = False
-
-    return is_point_on_face
-
-def _classify_faces(faces: np.ndarray, is_point_on_face: np.ndarray) -> np.ndarray:
-    # Partition faces into interior and exterior
-    n_faces = faces.shape[0]
-    is_interior_face = np.ones((n_faces, ), dtype=bool)
-    for i, face in enumerate(faces):
-        if not any(is_point_on_face[np.array(face)]):
-            is_interior_face[i] = False
-    return is_interior_face
-
-def _compute_face_types(faces: np.ndarray, interior_pts: np.ndarray) -> np.ndarray:
-    n_faces = faces.shape[0]
-    face_type = np.ones((n_faces, ), dtype=int)
-    for i, face in enumerate(faces):
-        face_type[i] = interior_pts[np.array(face)].sum()
-    return face_type
-
-def _mesh_from_untrimmed_spline_surface(name: str, face: NURBSObject) -> Mesh:
+def _mesh_from_untrimmed_spline_surface(name: str, face: NURBSObject, policy: DensityPolicy) -> Mesh:
     bspline_sirface = _bspline_surface_from_face(face)
+    surface_data = bspline_surface_data(bspline_sirface)
     U1, U2, V1, V2 = bspline_sirface.Bounds()
-    tol = 10.
-    URES, VRES = bspline_sirface.Resolution(tol)
-    NU = int((U2 - U1) / URES)
-    NV = int((V2 - V1) / VRES)
-    NU = NV = 64
+    NU, NV = grid_resolution(bspline_sirface, surface_data, policy)
     Ulist = np.linspace(U1, U2, NU)
     Vlist = np.linspace(V1, V2, NV)
     Ugrid, Vgrid = np.meshgrid(Ulist, Vlist)
     UVgrid = np.column_stack((Ugrid.ravel(), Vgrid.ravel()))
-    n_pts = UVgrid.shape[0]
-    all_mesh_faces = _compute_faces_from_verts(NU, NV)
+    all_mesh_faces = grid_quads(NU, NV)
 
-    XYZgrid = np.zeros((n_pts, 3))
-    for i in range(n_pts):
-        u, v = UVgrid[i]
-        point = bspline_sirface.Value(u, v)
-        XYZgrid[i, :] = point.Coord()
-    mesh_verts = [tuple(row) for row in XYZgrid]
-    return Mesh(name=name, type_='surface', vertices=mesh_verts,
-                edges=[], faces=all_mesh_faces.tolist(), param_grid=UVgrid.tolist())
+    XYZgrid = evaluate_surface(surface_data, UVgrid)
+    return Mesh(name=name, type_='surface', vertices=XYZgrid,
+                edges=[], faces=all_mesh_faces, param_grid=UVgrid)
 
 
-def _mesh_from_trimmed_spline_surface(name: str, face: NURBSObject) -> Mesh:
-    bspline_sirface = _bspline_surface_from_face(face)
+def _mesh_from_trimmed_spline_surface(name: str, face: NURBSObject, policy: DensityPolicy,
+                                      timer: StageTimer = NULL_TIMER) -> Mesh:
+    with timer.stage('nurbs'):
+        bspline_sirface = _bspline_surface_from_face(face)
+        surface_data = bspline_surface_data(bspline_sirface)
     U1, U2, V1, V2 = bspline_sirface.Bounds()
-    tol = 10.
-    URES, VRES = bspline_sirface.Resolution(tol)
-    NU = int((U2 - U1) / URES)
-    NV = int((V2 - V1) / VRES)
-    NU = NV = 64
+    with timer.stage('density'):
+        NU, NV = grid_resolution(bspline_sirface, surface_data, policy)
+    if policy.refine_boundary:
+        with timer.stage('triangulate'):
+            mesh_verts_UV, XYZgrid, mesh_faces = refine_trimmed_grid(
+                face, surface_data, (U1, U2, V1, V2), NU, NV, policy
+            )
+        return Mesh(name=name, type_='surface', vertices=XYZgrid,
+                    edges=[], faces=mesh_faces, param_grid=mesh_verts_UV)
+
     Ulist = np.linspace(U1, U2, NU)
     Vlist = np.linspace(V1, V2, NV)
     Ugrid, Vgrid = np.meshgrid(Ulist, Vlist)
     UVgrid = np.column_stack((Ugrid.ravel(), Vgrid.ravel()))
-    n_pts = UVgrid.shape[0]
-    all_mesh_faces = _compute_faces_from_verts(NU, NV)
+    all_mesh_faces = grid_quads(NU, NV)
 
     # Compute points strictly in the interior of wires
-    interior_pts = _classify_points(UVgrid, face)
+    with timer.stage('classify'):
+        interior_pts = classify_uv_grid(face, Ulist, Vlist)
 
     # Select faces according to how many of its vertices are interior
-    face_types = _compute_face_types(all_mesh_faces, interior_pts)
-    interior_faces = (face_types > 0)
-    all_mesh_faces = np.column_stack((all_mesh_faces, face_types))
-
-    # Create points that have interior neighbors
-    face_pts_idx = np.unique(all_mesh_faces[:, :4][interior_faces].ravel())
-    interior_pts_and_neighbors_idx = face_pts_idx
-    interior_pts_and_neighbors = interior_pts.copy()
-    interior_pts_and_neighbors[interior_pts_and_neighbors_idx] = True
-    interior_pts = interior_pts_and_neighbors.copy()
+    types = face_types(all_mesh_faces, interior_pts)
+    is_interior_face = (types > 0)
+    interior_faces = all_mesh_faces[is_interior_face]
+    interior_types = types[is_interior_face]
+    if face.Orientation() == TopAbs_REVERSED:
+        # Grid quads are counter-clockwise in UV, reversed faces point the other way
+        interior_faces = interior_faces[:, ::-1]
+
+    # Include points that have interior neighbors
+    interior_pts = interior_pts.copy()
+    interior_pts[interior_faces.ravel()] = True
 
     # Recompute vertex numbers and update faces with these new vertex indices
-    included_points_idx = np.where(interior_pts)[0]
-    vertex_index_map = VM = dict(zip(included_points_idx, range(n_pts)))
-    interior_faces = all_mesh_faces[interior_faces]
     mesh_verts_UV = UVgrid[interior_pts]  # Mesh vertices in UV space
-    mesh_faces = [(VM[i1], VM[i2], VM[i3], VM[i4], t) for i1, i2, i3, i4, t in interior_faces]
-    mesh_faces = np.array(mesh_faces)
-
-    n_verts = included_points_idx.shape[0]
-    XYZgrid = np.zeros((n_verts, 3))
-    for i in range(n_verts):
-        u, v = mesh_verts_UV[i]
-        point = bspline_sirface.Value(u, v)
-        XYZgrid[i, :] = point.Coord()
-    mesh_verts = [tuple(row) for row in XYZgrid]
-    mesh_verts_UV = [tuple(row) for row in mesh_verts_UV]
-    return Mesh(name=name, type_='surface', vertices=mesh_verts,
-                edges=[], faces=mesh_faces.tolist(), param_grid=mesh_verts_UV)
-
-def _mesh_from_spline_curve(name: str, spline: NURBSObject) -> Mesh:
-    U1, U2 = spline.FirstParameter(), spline.LastParameter()
-    tol = 10.
-    URES = spline.Resolution(tol)
-    NU = int((U2 - U1) / URES)
-    NU = 200
-    Ugrid = np.linspace(U1, U2, NU)
-    Xgrid = np.zeros((NU, ))
-    Ygrid = np.zeros((NU, ))
-    Zgrid = np.zeros((NU, ))
-    for i in range(NU):
-        point = spline.Value(Ugrid[i])
-        Xgrid[i], Ygrid[i], Zgrid[i] = point.Coord()
-    verts = np.column_stack((Xgrid, Ygrid, Zgrid))
-    verts = verts.tolist()
-    edges = _compute_edges_from_verts(NU)
-    return Mesh(name=name, type_='curve', vertices=verts,
-                edges=edges, faces=[], param_grid=Ugrid.tolist())
-
-def _pcurve_mesh_from_wire(name, wire, face) -> Optional[Mesh]:
-    wirex = WireExplorer(wire)
-    topo_edges = wirex.ordered_edges()
-    mesh_verts = []
-    n_verts_per_edge = 50
-    for edge in topo_edges:
-        pcurve_object = BRep_Tool().CurveOnSurface(edge, face)
-        if len(pcurve_object) == 3:
-            bspline_pcurve, first, last = pcurve_object
-        else:
-            print('PCurve does not exist')
-            return
-        tgrid = np.linspace(first, last, n_verts_per_edge)
-        mesh_verts.extend([bspline_pcurve.Value(t).Coord() for t in tgrid])
-
-    n_verts = len(mesh_verts)
-    mesh_edges = _compute_edges_from_verts(n_verts)
-    if wire.Closed():
-        mesh_edges.append([n_verts - 1, 0])  # close the loop
-    return Mesh(name=name, type_='pcurve', vertices=mesh_verts,
+    mesh_faces = np.column_stack((remap_vertices(interior_faces, interior_pts), interior_types))
+
+    with timer.stage('surface_eval'):
+        XYZgrid = evaluate_surface(surface_data, mesh_verts_UV)
+    return Mesh(name=name, type_='surface', vertices=XYZgrid,
+                edges=[], faces=mesh_faces, param_grid=mesh_verts_UV)
+
+def _mesh_from_constrained_triangulation(name: str, face: TopoDS_Face, uv_rings: List[np.ndarray],
+                                         policy: DensityPolicy, timer: StageTimer = NULL_TIMER) -> Optional[Mesh]:
+    with timer.stage('nurbs'):
+        bspline_sirface = _bspline_surface_from_face(face)
+        surface_data = bspline_surface_data(bspline_sirface)
+    U1, U2, V1, V2 = bspline_sirface.Bounds()
+    with timer.stage('density'):
+        NU, NV = grid_resolution(bspline_sirface, surface_data, policy)
+
+    # The pcurve samples are the boundary, the grid points inside it the
+    # Steiner points; only the triangulation vertices are evaluated
+    eps = 1e-9 * max(U2 - U1, V2 - V1)
+    rings = [clean_ring(r, eps) for r in uv_rings]
+    if any(r.shape[0] < 3 for r in rings):
+        return
+    with timer.stage('triangulate'):
+        steiner = interior_grid_points(rings, np.linspace(U1, U2, NU), np.linspace(V1, V2, NV))
+        triangulation = triangulate_rings(rings, steiner)
+    if triangulation is None or triangulation[1].shape[0] == 0:
+        # Left to the grid engine
+        return
+    UV, tris = triangulation
+    if face.Orientation() == TopAbs_REVERSED:
+        tris = tris[:, [0, 2, 1]]
+
+    with timer.stage('surface_eval'):
+        XYZ = evaluate_surface(surface_data, UV)
+    # Triangles are bounded by the trim polygons, i.e. face type 4
+    mesh_faces = np.column_stack((tris, np.full(tris.shape[0], 4)))
+    return Mesh(name=name, type_='surface', vertices=XYZ, edges=[], faces=mesh_faces, param_grid=UV)
+
+def _mesh_from_triangulation(name: str, face: TopoDS_Face, timer: StageTimer = NULL_TIMER) -> Optional[Mesh]:
+    with timer.stage('triangulate'):
+        triangulation = face_triangulation(face)
+    if triangulation is None:
+        print(f'No triangulation for {name}')
+        return
+    XYZ, UV, tris = triangulation
+    # OCC triangles lie entirely on the trimmed face, i.e. face type 4
+    mesh_faces = np.column_stack((tris, np.full(tris.shape[0], 4)))
+    return Mesh(name=name, type_='surface', vertices=XYZ, edges=[], faces=mesh_faces, param_grid=UV)
+
+def _mesh_from_analytic_surface(name: str, face: TopoDS_Face, policy: DensityPolicy,
+                                uv_rings: Optional[List[np.ndarray]] = None,
+                                timer: StageTimer = NULL_TIMER) -> Optional[Mesh]:
+    with timer.stage('triangulate'):
+        tessellation = tessellate_analytic_face(face, policy, uv_rings)
+    if tessellation is None:
+        return
+    UV, XYZ, tris = tessellation
+    # Triangles are clipped to the trimming boundary, i.e. face type 4
+    mesh_faces = np.column_stack((tris, np.full(tris.shape[0], 4)))
+    return Mesh(name=name, type_='surface', vertices=XYZ, edges=[], faces=mesh_faces, param_grid=UV)
+
+def _init_edges(shape: Any, chord_tol: Optional[float] = None) -> None:
+    global _edges
+    _edges = EdgeTessellation(shape, chord_tol=chord_tol)
+
+def _mesh_from_wire_samples(name: str, wire: TopoDS_Wire, samples: WireSamples) -> Mesh:
+    edges = polyline_edges(samples.points.shape[0], closed=wire.Closed())
+    return Mesh(name=name, type_='curve', vertices=samples.points, edges=edges, faces=[],
+                param_grid=samples.params, edge_refs=samples.edge_refs)
+
+def _pcurve_mesh_from_wire_samples(name: str, wire: TopoDS_Wire, samples: WireSamples) -> Optional[Mesh]:
+    if samples.uv is None:
+        print('PCurve does not exist')
+        return
+    mesh_edges = polyline_edges(samples.uv.shape[0], closed=wire.Closed())
+    return Mesh(name=name, type_='pcurve', vertices=samples.uv,
                 edges=mesh_edges, faces=[], param_grid=[])
 
 def _bspline_surface_from_face(face):
     if not isinstance(face, TopoDS_Face):
         raise TypeError("face must be a TopoDS_Face")
-    # TopoDS_Face converted to Nurbs
-    nurbs_face = topods_Face(BRepBuilderAPI_NurbsConvert(face).Shape())
-    # GeomSurface obtained from Nurbs face
-    surface = BRep_Tool.Surface(nurbs_face)
-    # surface is now further converted to a bspline surface
-    bspline_surface = geomconvert_SurfaceToBSplineSurface(surface)
+    # TopoDS_Face converted to Nurbs and then to a bspline surface, once per run
+    bspline_surface = NURBS_CACHE.bspline_surface(face)
     return bspline_surface
 
-def _bspline_curve_from_wire(wire: NURBSObject) -> NURBSObject:
+def stitch(topoface_mesh: TopofaceMesh) -> TopofaceMesh:
     """
-    Private method that takes a TopoDS_Wire and transforms it into a
-    Bspline_Curve.
+    Moves the vertices of the boundary quads (face type 1-3) that lie outside
+    the trimmed face onto the polyline of its 3D boundary curve samples, and
+    their UV onto the matching pcurve samples. Returns a new TopofaceMesh
+    sharing the curves and pcurves of `topoface_mesh`.
     """
-    if not isinstance(wire, TopoDS_Wire):
-        raise TypeError("wire must be a TopoDS_Wire")
-
-    # joining all the wire edges in a single curve here
-    # composite curve builder (can only join Bspline curves)
-    composite_curve_builder = GeomConvert_CompCurveToBSplineCurve()
-
-    # iterator to edges in the TopoDS_Wire
-    # edge_explorer = TopologyExplorer(wire, ignore_orientation=False)
-    edge_explorer = WireExplorer(wire)
-    edges = list(edge_explorer.ordered_edges())
-    for edge in edges:
-        # edge can be joined only if it is not degenerated (zero length)
-        if BRep_Tool.Degenerated(edge):
-            continue
-
-        # the edge must be converted to Nurbs edge
-        nurbs_converter = BRepBuilderAPI_NurbsConvert(edge)
-        nurbs_converter.Perform(edge)
-        nurbs_edge = topods_Edge(nurbs_converter.Shape())
-
-        # here we extract the underlying curve from the Nurbs edge
-        nurbs_curve = BRep_Tool_Curve(nurbs_edge)[0]
-
-        # we convert the Nurbs curve to Bspline curve
-        bspline_curve = geomconvert_CurveToBSplineCurve(nurbs_curve)
-
-        # we can now add the Bspline curve to the composite wire curve
-        tolerance = 0.1
-        composite_curve_builder.Add(bspline_curve, tolerance)
-
-    # GeomCurve obtained by the builder after edges are joined
-    comp_curve = composite_curve_builder.BSplineCurve()
-    return comp_curve
-
-def stitch(topoface_mesh: TopofaceMesh) -> TopofaceMesh:
     tfm = topoface_mesh
-    from IPython import embed; embed(); exit(0)
-    return TopofaceMesh()
-
-def main():
-    step_reader = STEPControl_Reader()
-    status = step_reader.ReadFile(sys.argv[1])
-
-    if status != IFSelect_RetDone:
-        raise ValueError('Error parsing STEP file')
-
-    failsonly = False
-    step_reader.PrintCheckLoad(failsonly, IFSelect_ItemsByEntity)
-    step_reader.PrintCheckTransfer(failsonly, IFSelect_ItemsByEntity)
-    step_reader.TransferRoot()
-    shape = step_reader.Shape()
-    topo_explorer = TopologyExplorer(shape)
-    shape_faces = list(topo_explorer.faces())
-    n_faces = len(shape_faces)
-    meshes_list = []
-
-    for i, face in enumerate(shape_faces):
-        print(f'Processing faces {i}/{n_faces}')
-        if i not in [22]: continue
-
-        face_id = f'_FACE_{i:06d}'
-
-        # Compute meshes for face
-        # mesh_surface = _mesh_from_untrimmed_spline_surface(face_id, face)
-        mesh_surface = _mesh_from_trimmed_spline_surface(face_id, face)
-
-        # Compute 3D and 2D meshes for face boundaries
-        facex = TopologyExplorer(face)
-        wires = list(facex.wires())
-        curve3d_meshes = []
-        pcurve2d_meshes = []
+    surface = tfm.surface
+    boundary, interior = boundary_face_vertices(surface.faces)
+    wires = [(c, pc) for c, pc in zip(tfm.curves, tfm.pcurves) if c.vertices.shape[0] > 1]
+    if boundary.shape[0] == 0 or not wires:
+        return tfm
+
+    pcurves = [pc for _, pc in wires]
+    has_uv = len(tfm.pcurves) == len(tfm.curves) and all(pc is not None for pc in pcurves)
+    polyline = BoundaryPolyline([c.vertices for c, _ in wires], [c.edges for c, _ in wires],
+                                uv=[pc.vertices for pc in pcurves] if has_uv else None)
+
+    # Corners of boundary quads outside the trim polygons; without pcurves,
+    # those not shared with fully interior faces
+    if has_uv and surface.param_grid is not None:
+        is_inside = points_in_rings(surface.param_grid[boundary], [pc.vertices for pc in pcurves])
+        outside = boundary[~is_inside]
+    else:
+        outside = np.setdiff1d(boundary, interior)
+
+    XYZ, UV = snap_vertices(surface.vertices, surface.param_grid, outside, polyline)
+    stitched_surface = Mesh(name=surface.name, type_='surface', vertices=XYZ, edges=surface.edges,
+                            faces=surface.faces, param_grid=UV)
+    return TopofaceMesh(name=tfm.name, surface=stitched_surface, curves=tfm.curves, pcurves=tfm.pcurves)
+
+def _export_face(i: int, face: TopoDS_Face, policy: DensityPolicy,
+                 timer: StageTimer = NULL_TIMER) -> List[TopofaceMesh]:
+    face_id = f'_FACE_{i:06d}'
+
+    # Compute 3D and 2D meshes for face boundaries
+    facex = TopologyExplorer(face)
+    wires = list(facex.wires())
+    curve3d_meshes = []
+    pcurve2d_meshes = []
+    with timer.stage('curves'):
         for wire in wires:
-            # Discretize 3D curve
-            bspline_curve = _bspline_curve_from_wire(wire)
-            mesh_boundary = _mesh_from_spline_curve(face_id, bspline_curve)
-            curve3d_meshes.append(mesh_boundary)
-
-            # Discretize 2D curves (Pcurves)
-            mesh_pcurve = _pcurve_mesh_from_wire(face_id, wire, face)
-            pcurve2d_meshes.append(mesh_pcurve)
-
-        # Construct mesh for this TopoFace
-        tfm = TopofaceMesh(
-            name=face_id,
-            surface=mesh_surface,
-            curves=curve3d_meshes,
-            pcurves=pcurve2d_meshes
-        )
+            # Each edge is sampled once for the whole shape; the 3D curve and
+            # the pcurves of the wire reuse those samples
+            samples = _edges.wire_samples(wire, face)
+            curve3d_meshes.append(_mesh_from_wire_samples(face_id, wire, samples))
+            pcurve2d_meshes.append(_pcurve_mesh_from_wire_samples(face_id, wire, samples))
+
+    # Compute meshes for face
+    # mesh_surface = _mesh_from_untrimmed_spline_surface(face_id, face, policy)
+    if policy.engine == 'occ':
+        mesh_surface = _mesh_from_triangulation(face_id, face, timer)
+    else:
+        # The shared edge samples bound the analytic and cdt meshes, so that
+        # they meet their neighbours on the same vertices
+        uv_rings = None
+        if all(pc is not None for pc in pcurve2d_meshes):
+            uv_rings = [pc.vertices for pc in pcurve2d_meshes]
+        # Planes, cylinders and cones skip the NURBS grid
+        mesh_surface = None
+        if policy.analytic:
+            mesh_surface = _mesh_from_analytic_surface(face_id, face, policy, uv_rings, timer)
+        if mesh_surface is None and policy.engine == 'cdt' and uv_rings is not None:
+            mesh_surface = _mesh_from_constrained_triangulation(face_id, face, uv_rings, policy, timer)
+        if mesh_surface is None:
+            mesh_surface = _mesh_from_trimmed_spline_surface(face_id, face, policy, timer)
+    if mesh_surface is None:
+        return []
+
+    # Construct mesh for this TopoFace
+    tfm = TopofaceMesh(
+        name=face_id,
+        surface=mesh_surface,
+        curves=curve3d_meshes,
+        pcurves=pcurve2d_meshes
+    )
+    with timer.stage('stitch'):
         stitched_tfm = stitch(tfm)
-        meshes_list.append(stitched_tfm.to_dict())
+    stitched_tfm.pcurves = [pc for pc in stitched_tfm.pcurves if pc is not None]
+    return [stitched_tfm]
+
+def _process_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Export trimmed and stitched face meshes from a STEP file')
+    parser.add_argument('step_file', action='store', help='path to STEP file')
+    parser.add_argument('--workers', dest='workers', action='store', type=int, default=1,
+                        help='number of worker processes')
+    parser.add_argument('--output-format', dest='output_format', action='store',
+                        choices=['bin', 'jsonl', 'glb'], default='bin',
+                        help='stream meshes to _meshes.bin (binary container) or _meshes.jsonl, '
+                             'or write surfaces to _meshes.glb (binary glTF)')
+    add_density_args(parser)
+    add_cache_args(parser)
+    add_face_selection_args(parser)
+    add_instance_args(parser)
+    add_weld_args(parser)
+    return parser.parse_args()
 
-    # Write meshes to disk
-    with Path('_meshes.json').open('w') as f:
-        json.dump(meshes_list, f)
+def main():
+    args = _process_args()
+    policy = density_policy_from_args(args)
+    shape = read_step_shape(args.step_file, brep_cache_from_args(args))
+    selection = face_selection_from_args(args)
+    records = []
+    if args.instances:
+        # Export the faces of each unique part once, in part coordinates
+        part_instances = find_part_instances(shape)
+        shape, part_faces = parts_compound(part_instances.parts)
+        records = instance_records(part_instances, part_faces)
+        print(f'{len(part_instances.instances)} occurrences of {len(part_instances.parts)} parts '
+              f'(instancing factor {part_instances.instancing_factor:.1f})')
+    if policy.engine == 'occ':
+        # Triangulations are stored on the shape and travel with it to the workers
+        mesh_shape(shape, policy)
+
+    def _export_faces():
+        for i, face in iter_selected_faces(shape, selection):
+            print(f'Processing face {i}')
+            yield _export_face(i, face, policy)
+
+    if args.workers > 1:
+        face_indices = [i for i, _ in iter_selected_faces(shape, selection)]
+        face_results = export_faces_parallel(_export_face, shape, face_indices, policy, args.workers,
+                                             on_load=partial(_init_edges, chord_tol=policy.chord_tol))
+    else:
+        _init_edges(shape, policy.chord_tol)
+        face_results = _export_faces()
+
+    # Stream meshes to disk face by face
+    output_file = Path(f'_meshes.{args.output_format}')
+    writer = GlbWriter(output_file) if args.output_format == 'glb' else open_mesh_writer(output_file)
+    if args.weld:
+        # Welded once all faces are in, with the tolerance of the model
+        writer = WeldingWriter(writer, eps=args.weld_tol, model_tol=shape_tolerance(shape),
+                               as_lists=args.output_format == 'jsonl')
+    with writer:
+        for face_meshes in face_results:
+            for mesh in face_meshes:
+                # Lists are built only for JSON, the binary writer takes the arrays as is
+                writer.append(mesh.to_dict() if args.output_format == 'jsonl' else mesh.to_arrays())
+        for record in records:
+            writer.append(record)
+
+    # Pool workers keep their own conversion caches
+    if args.workers <= 1:
+        print(f'NURBS conversion cache: {NURBS_CACHE.report()}')
 
 if __name__ == '__main__':
     main()
-
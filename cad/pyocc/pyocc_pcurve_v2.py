@@ -1,3 +1,4 @@
+import argparse
 import json
 import sys
 from pathlib import Path
@@ -32,11 +33,15 @@ from OCC.Core.GeomProjLib import geomprojlib
 from OCC.Core.Adaptor2d import Adaptor2d_Curve2d,  Adaptor2d_HCurve2d
 from OCC.Core.Geom2dAdaptor import geom2dadaptor_MakeCurve, Geom2dAdaptor_Curve
 
+from nurbs_cache import NURBS_CACHE
+from nurbs_eval import pcurve_points
+from step_io import read_step_shape
+from brep_cache import add_cache_args, brep_cache_from_args
+
 NURBSObject = NewType('NURBSObject', Any)
 
 def _convert_to_nurbs(face: Any) -> Any:
-    nurbs_face = topods_Face(BRepBuilderAPI_NurbsConvert(face).Shape())
-    nurbs_surf = BRepAdaptor_Surface(nurbs_face)
+    nurbs_surf = BRepAdaptor_Surface(NURBS_CACHE.nurbs_face(face))
     return nurbs_surf
 
 def _bspline_curve_from_wire(wire: NURBSObject) -> NURBSObject:
@@ -60,16 +65,9 @@ def _bspline_curve_from_wire(wire: NURBSObject) -> NURBSObject:
         if BRep_Tool.Degenerated(edge):
             continue
 
-        # the edge must be converted to Nurbs edge
-        nurbs_converter = BRepBuilderAPI_NurbsConvert(edge)
-        nurbs_converter.Perform(edge)
-        nurbs_edge = topods_Edge(nurbs_converter.Shape())
-
-        # here we extract the underlying curve from the Nurbs edge
-        nurbs_curve = BRep_Tool_Curve(nurbs_edge)[0]
-
-        # we convert the Nurbs curve to Bspline curve
-        bspline_curve = geomconvert_CurveToBSplineCurve(nurbs_curve)
+        # the edge is converted to a Nurbs edge and its curve to a Bspline
+        # curve; edges shared with already processed faces hit the cache
+        bspline_curve = NURBS_CACHE.bspline_curve(edge)
 
         # we can now add the Bspline curve to the composite wire curve
         tolerance = 1e-9
@@ -82,12 +80,8 @@ def _bspline_curve_from_wire(wire: NURBSObject) -> NURBSObject:
 def _bspline_surface_from_face(face):
     if not isinstance(face, TopoDS_Face):
         raise TypeError("face must be a TopoDS_Face")
-    # TopoDS_Face converted to Nurbs
-    nurbs_face = topods_Face(BRepBuilderAPI_NurbsConvert(face).Shape())
-    # GeomSurface obtained from Nurbs face
-    surface = BRep_Tool.Surface(nurbs_face)
-    # surface is now further converted to a bspline surface
-    bspline_surface = geomconvert_SurfaceToBSplineSurface(surface)
+    # TopoDS_Face converted to Nurbs and then to a bspline surface, once per run
+    bspline_surface = NURBS_CACHE.bspline_surface(face)
     return bspline_surface
 
 def _get_composite_edge_from_wire(wire: Any) -> Any:
@@ -99,21 +93,18 @@ def _get_composite_edge_from_wire(wire: Any) -> Any:
 def _generate_points(edge_curve, t1, t2) -> List:
     npts = 50
     tlist = np.linspace(t1, t2, npts)
-    points = [edge_curve.Value(t).Coord() for t in tlist]
+    points = pcurve_points(edge_curve, tlist).tolist()
     return points
 
-def main():
-    step_reader = STEPControl_Reader()
-    status = step_reader.ReadFile(sys.argv[1])
-
-    if status != IFSelect_RetDone:
-        raise ValueError('Error parsing STEP file')
+def _process_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Dump surface bounds and pcurve points of a STEP file')
+    parser.add_argument('step_file', action='store', help='path to STEP file')
+    add_cache_args(parser)
+    return parser.parse_args()
 
-    failsonly = False
-    step_reader.PrintCheckLoad(failsonly, IFSelect_ItemsByEntity)
-    step_reader.PrintCheckTransfer(failsonly, IFSelect_ItemsByEntity)
-    step_reader.TransferRoot()
-    shape = step_reader.Shape()
+def main():
+    args = _process_args()
+    shape = read_step_shape(args.step_file, brep_cache_from_args(args))
     topo_explorer = TopologyExplorer(shape)
     shape_faces = list(topo_explorer.faces())
     n_faces = len(shape_faces)
@@ -170,6 +161,7 @@ def main():
 
     with Path('_surfaces.json').open('w') as f:
         json.dump(surfaces, f, indent=2)
+    print(f'NURBS conversion cache: {NURBS_CACHE.report()}')
 
 
 if __name__ == '__main__':
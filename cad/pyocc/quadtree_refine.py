@@ -0,0 +1,185 @@
+from typing import Any, List, Tuple
+
+import numpy as np
+from OCC.Core.TopAbs import TopAbs_REVERSED
+
+from grid_density import DensityPolicy
+from nurbs_eval import BSplineSurfaceData, evaluate_surface
+from uv_classify import classify_points, classify_points_near_polygons, classify_uv_grid, face_uv_polygons
+
+
+class _LatticePoints:
+    """
+    Grid points of the quadtree, addressed by integer lattice coordinates
+    (i, j) on the finest level. Keys are encoded as i * width + j and kept
+    sorted so that lookups are vectorized.
+    """
+    def __init__(self, width: int):
+        self.width = width
+        self.keys = np.zeros((0, ), dtype=np.int64)
+        self.index = np.zeros((0, ), dtype=np.int64)
+        self.n_points = 0
+
+    def encode(self, i: np.ndarray, j: np.ndarray) -> np.ndarray:
+        return i.astype(np.int64) * self.width + j.astype(np.int64)
+
+    def lookup(self, keys: np.ndarray) -> np.ndarray:
+        """
+        Point index for every key, -1 for keys that are not known
+        """
+        if self.keys.shape[0] == 0:
+            return np.full(keys.shape, -1, dtype=np.int64)
+        pos = np.minimum(np.searchsorted(self.keys, keys), self.keys.shape[0] - 1)
+        return np.where(self.keys[pos] == keys, self.index[pos], -1)
+
+    def add(self, new_keys: np.ndarray) -> None:
+        """
+        Registers keys that are not known yet, numbering them in the given order
+        """
+        new_index = np.arange(self.n_points, self.n_points + new_keys.shape[0])
+        self.n_points += new_keys.shape[0]
+        keys = np.concatenate((self.keys, new_keys))
+        index = np.concatenate((self.index, new_index))
+        order = np.argsort(keys, kind='stable')
+        self.keys, self.index = keys[order], index[order]
+
+
+def _cell_corner_keys(lattice: _LatticePoints, cells: np.ndarray) -> np.ndarray:
+    i, j, s = cells[:, 0], cells[:, 1], cells[:, 2]
+    return np.column_stack((lattice.encode(i, j), lattice.encode(i + s, j),
+                            lattice.encode(i + s, j + s), lattice.encode(i, j + s)))
+
+
+def _cell_boundary_keys(lattice: _LatticePoints, cells: np.ndarray) -> np.ndarray:
+    # Lattice positions along the boundaries of cells of equal size, one row
+    # per cell, counter-clockwise from (i, j)
+    i, j, s = cells[:, 0:1], cells[:, 1:2], int(cells[0, 2])
+    r = np.arange(s)
+    bi = np.hstack((i + r, np.repeat(i + s, s, axis=1), i + s - r, np.repeat(i, s, axis=1)))
+    bj = np.hstack((np.repeat(j, s, axis=1), j + r, np.repeat(j + s, s, axis=1), j + s - r))
+    return lattice.encode(bi, bj)
+
+
+def refine_trimmed_grid(face: Any, surface_data: BSplineSurfaceData,
+                        bounds: Tuple[float, float, float, float], NU: int, NV: int,
+                        policy: DensityPolicy) -> Tuple[np.ndarray, np.ndarray, List[List]]:
+    """
+    Tessellates the trimmed `face` starting from a coarse NU x NV grid and
+    recursively subdividing only the cells that straddle the trim boundary
+    (face type 1-3) until their 3D diagonal is below `policy.boundary_tol` or
+    `policy.max_depth` is reached. Interior and exterior cells stay coarse.
+
+    Returns the UV and XYZ coordinates of the mesh vertices and the mesh
+    faces. As in `_mesh_from_trimmed_spline_surface` the last entry of every
+    face is its face type (number of interior corners). Cells that border
+    finer cells are fanned into triangles around their center so that the
+    mesh has no T-junctions. Faces are oriented along the face normal.
+    """
+    U1, U2, V1, V2 = bounds
+    S = 2 ** policy.max_depth
+    n_i, n_j = (NU - 1) * S, (NV - 1) * S
+    du, dv = (U2 - U1) / n_i, (V2 - V1) / n_j
+    lattice = _LatticePoints(n_j + 1)
+    UV, XYZ, inside = [], [], []
+
+    # Points added by the refinement are classified against the UV polygons
+    # of the wires; the OCC classifier only decides those close to them
+    polygons = face_uv_polygons(face)
+
+    def _classify(uv):
+        if not polygons:
+            return classify_points(uv, face)
+        return classify_points_near_polygons(uv, face, polygons, margin=max(du, dv))
+
+    def _add_points(keys, is_inside=None):
+        # Classifies and evaluates the points among `keys` that are not known
+        # yet, in one batch. `is_inside` skips the classifier when given.
+        is_new = lattice.lookup(keys) < 0
+        new_keys = keys[is_new]
+        if new_keys.shape[0] == 0:
+            return
+        lattice.add(new_keys)
+        uv = np.column_stack((U1 + (new_keys // lattice.width) * du,
+                              V1 + (new_keys % lattice.width) * dv))
+        UV.append(uv)
+        XYZ.append(evaluate_surface(surface_data, uv))
+        inside.append(_classify(uv) if is_inside is None else is_inside[is_new])
+
+    # Coarse grid, ordered as np.meshgrid(Ulist, Vlist) raveled
+    Ulist = np.linspace(U1, U2, NU)
+    Vlist = np.linspace(V1, V2, NV)
+    gi, gj = np.meshgrid(np.arange(NU) * S, np.arange(NV) * S)
+    coarse_keys = lattice.encode(gi.ravel(), gj.ravel())
+    coarse_inside = classify_uv_grid(face, Ulist, Vlist)
+    order = np.argsort(coarse_keys)
+    _add_points(coarse_keys[order], coarse_inside[order])
+
+    ci, cj = np.meshgrid(np.arange(NU - 1) * S, np.arange(NV - 1) * S)
+    active = np.column_stack((ci.ravel(), cj.ravel(), np.full(ci.size, S)))
+    leaves, leaf_types = [], []
+    while active.shape[0] > 0:
+        all_inside = np.concatenate(inside)
+        all_xyz = np.concatenate(XYZ)
+        corners = lattice.lookup(_cell_corner_keys(lattice, active))
+        face_types = all_inside[corners].sum(axis=1)
+        diag = np.maximum(np.linalg.norm(all_xyz[corners[:, 2]] - all_xyz[corners[:, 0]], axis=1),
+                          np.linalg.norm(all_xyz[corners[:, 3]] - all_xyz[corners[:, 1]], axis=1))
+        refine = (face_types > 0) & (face_types < 4) & (active[:, 2] > 1) & (diag > policy.boundary_tol)
+        leaves.append(active[~refine])
+        leaf_types.append(face_types[~refine])
+
+        # Split refined cells into four children and add the five new points
+        parents = active[refine]
+        h = parents[:, 2] // 2
+        i, j = parents[:, 0], parents[:, 1]
+        active = np.concatenate([
+            np.column_stack((i + di * h, j + dj * h, h)) for di, dj in ((0, 0), (1, 0), (1, 1), (0, 1))
+        ])
+        mid_keys = np.concatenate([lattice.encode(i + di * h, j + dj * h)
+                                   for di, dj in ((1, 0), (2, 1), (1, 2), (0, 1), (1, 1))])
+        _add_points(np.unique(mid_keys))
+
+    leaves = np.concatenate(leaves)
+    leaf_types = np.concatenate(leaf_types)
+    kept = leaf_types > 0
+    leaves, leaf_types = leaves[kept], leaf_types[kept]
+
+    # Cells whose edges carry vertices of finer neighbours are fanned into
+    # triangles around their center instead of being emitted as quads. Cells
+    # are processed in batches of equal size.
+    quads, fans = [np.zeros((0, 5), dtype=np.int64)], [np.zeros((0, 4), dtype=np.int64)]
+    for s in np.unique(leaves[:, 2]):
+        of_size = leaves[:, 2] == s
+        cells, types = leaves[of_size], leaf_types[of_size]
+        boundary = lattice.lookup(_cell_boundary_keys(lattice, cells))
+        is_point = boundary >= 0
+        is_quad = is_point.sum(axis=1) == 4
+        quads.append(np.column_stack((lattice.lookup(_cell_corner_keys(lattice, cells[is_quad])),
+                                      types[is_quad])))
+
+        cells, types, boundary, is_point = cells[~is_quad], types[~is_quad], boundary[~is_quad], is_point[~is_quad]
+        if cells.shape[0] == 0:
+            continue
+        center_keys = lattice.encode(cells[:, 0] + s // 2, cells[:, 1] + s // 2)
+        unique_centers = np.unique(center_keys)
+        _add_points(unique_centers, np.ones(unique_centers.shape, dtype=bool))
+        centers = lattice.lookup(center_keys)
+        # Consecutive boundary points of every cell, the last one followed by the first
+        row, col = np.nonzero(is_point)
+        a = boundary[row, col]
+        b = np.roll(a, -1)
+        last = np.append(row[1:] != row[:-1], True)
+        b[last] = a[np.searchsorted(row, row[last])]
+        fans.append(np.column_stack((centers[row], a, b, types[row])))
+    quads, fans = np.concatenate(quads), np.concatenate(fans)
+
+    # Keep only the vertices referenced by kept faces and remap indices
+    UV = np.concatenate(UV)
+    XYZ = np.concatenate(XYZ)
+    used = np.unique(np.concatenate((quads[:, :-1].ravel(), fans[:, :-1].ravel())))
+    remap = np.full(UV.shape[0], -1, dtype=np.int64)
+    remap[used] = np.arange(used.shape[0])
+    # Cells and fans are counter-clockwise in UV, reversed faces point the other way
+    order = slice(None, None, -1) if face.Orientation() == TopAbs_REVERSED else slice(None)
+    mesh_faces = [np.column_stack((remap[F[:, :-1]][:, order], F[:, -1])) for F in (quads, fans)]
+    return UV[used], XYZ[used], [row for F in mesh_faces for row in F.tolist()]
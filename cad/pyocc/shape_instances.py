@@ -0,0 +1,111 @@
+import argparse
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Tuple
+
+import numpy as np
+from OCC.Core.BRep import BRep_Builder
+from OCC.Core.TopAbs import TopAbs_FACE, TopAbs_SHAPE, TopAbs_SHELL, TopAbs_SOLID
+from OCC.Core.TopExp import TopExp_Explorer
+from OCC.Core.TopLoc import TopLoc_Location
+from OCC.Core.TopoDS import TopoDS_Compound
+
+from face_selection import iter_faces
+
+
+@dataclass
+class PartInstances:
+    """
+    Unique parts of a shape, located at the origin, and the placements of
+    all their occurrences
+    """
+    parts: List[Any]
+    instances: List[Tuple[int, np.ndarray]]  # (part index, 4x4 transform)
+
+    @property
+    def instancing_factor(self) -> float:
+        return len(self.instances) / max(len(self.parts), 1)
+
+
+def location_matrix(location: Any) -> np.ndarray:
+    """
+    4x4 matrix of a TopLoc_Location
+    """
+    trsf = location.Transformation()
+    M = np.eye(4)
+    M[:3] = [[trsf.Value(r, c) for c in range(1, 5)] for r in range(1, 4)]
+    return M
+
+
+def _occurrences(shape: Any) -> Iterator[Any]:
+    # Solids, shells outside of solids and faces outside of shells; the
+    # explorer composes the locations of the assembly levels above them
+    for to_find, to_avoid in [(TopAbs_SOLID, TopAbs_SHAPE), (TopAbs_SHELL, TopAbs_SOLID), (TopAbs_FACE, TopAbs_SHELL)]:
+        explorer = TopExp_Explorer(shape, to_find, to_avoid)
+        while explorer.More():
+            yield explorer.Current()
+            explorer.Next()
+
+
+def find_part_instances(shape: Any) -> PartInstances:
+    """
+    Groups the occurrences of `shape` that share their underlying TShape
+    (e.g. a screw placed many times in an assembly) into parts
+    """
+    parts, instances = [], []
+    buckets: Dict[Tuple[int, int], List[int]] = {}
+    for occurrence in _occurrences(shape):
+        part = occurrence.Located(TopLoc_Location())
+        bucket = buckets.setdefault((hash(part), part.Orientation()), [])
+        for p in bucket:
+            if parts[p].IsEqual(part):
+                break
+        else:
+            p = len(parts)
+            parts.append(part)
+            bucket.append(p)
+        instances.append((p, location_matrix(occurrence.Location())))
+    return PartInstances(parts, instances)
+
+
+def parts_compound(parts: List[Any]) -> Tuple[Any, List[List[int]]]:
+    """
+    Compound of `parts` and the indices of the faces of each part among the
+    faces of the compound, as numbered by `iter_faces`
+    """
+    compound = TopoDS_Compound()
+    builder = BRep_Builder()
+    builder.MakeCompound(compound)
+    for part in parts:
+        builder.Add(compound, part)
+
+    part_faces = []
+    face_index = {}
+    for i, face in enumerate(iter_faces(compound)):
+        face_index.setdefault(hash(face), i)
+    for part in parts:
+        part_faces.append([face_index[hash(face)] for face in iter_faces(part)])
+    return compound, part_faces
+
+
+def instance_records(part_instances: PartInstances, part_faces: List[List[int]],
+                     face_name: str = '_FACE_{:06d}') -> List[Dict]:
+    """
+    One record per occurrence with the part it places, the names of the
+    face meshes of that part and the 4x4 part-to-world transform
+    """
+    records = []
+    for k, (p, M) in enumerate(part_instances.instances):
+        records.append({
+            'name': f'_INSTANCE_{k:06d}',
+            'type': 'instance',
+            'part': p,
+            'face_names': [face_name.format(i) for i in part_faces[p]],
+            'transform': M.tolist(),
+        })
+    return records
+
+
+def add_instance_args(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument('--instances', dest='instances', action='store_true',
+                        help='tessellate each part shared by several occurrences once '
+                             'and emit instance records with their transforms')
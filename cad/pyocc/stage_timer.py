@@ -0,0 +1,33 @@
+import time
+from contextlib import contextmanager, nullcontext
+from typing import ContextManager, Iterator
+
+# Stages of the STEP to mesh pipeline, in pipeline order
+STAGES = ['read', 'transfer', 'nurbs', 'density', 'classify', 'triangulate', 'surface_eval', 'curves',
+          'stitch', 'serialize']
+
+
+class StageTimer:
+    """
+    Accumulates wall-clock seconds per pipeline stage. Exporters time their
+    stages with `with timer.stage(name):`
+    """
+    def __init__(self):
+        self.seconds = dict.fromkeys(STAGES, 0.)
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[name] += time.perf_counter() - t0
+
+
+class _NullTimer(StageTimer):
+    def stage(self, name: str) -> ContextManager[None]:
+        return nullcontext()
+
+
+# Default timer of the exporters, which records nothing
+NULL_TIMER = _NullTimer()
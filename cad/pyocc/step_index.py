@@ -0,0 +1,313 @@
+import argparse
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from part21 import Statement, first_string, instance_references, iter_statements, parse_instance
+
+# Inverse references followed upwards from a PRODUCT to its shape
+_PRODUCT_CHAIN_TYPES = {
+    'PRODUCT_DEFINITION_FORMATION',
+    'PRODUCT_DEFINITION_FORMATION_WITH_SPECIFIED_SOURCE',
+    'PRODUCT_DEFINITION',
+    'PRODUCT_DEFINITION_SHAPE',
+    'SHAPE_DEFINITION_REPRESENTATION',
+}
+
+
+@dataclass
+class StepIndex:
+    """
+    Byte offset, length, type and references of every entity instance of a
+    STEP file, sorted by entity id. References are stored in CSR form: the
+    references of instance k are refs[ref_offsets[k]:ref_offsets[k + 1]].
+    """
+    ids: np.ndarray  # (n, ) int64, sorted
+    offsets: np.ndarray  # (n, ) int64
+    lengths: np.ndarray  # (n, ) int64
+    type_codes: np.ndarray  # (n, ) int32 into type_names
+    type_names: np.ndarray  # (n_types, ) str; complex instances join their types with ' '
+    ref_offsets: np.ndarray  # (n + 1, ) int64
+    refs: np.ndarray  # (n_refs, ) int64 entity ids
+    data_offset: int  # byte offset just after the DATA; statement
+    source_size: int
+    source_mtime_ns: int
+
+    def positions(self, entity_ids: Iterable[int]) -> np.ndarray:
+        entity_ids = np.asarray(list(entity_ids), dtype=np.int64)
+        pos = np.searchsorted(self.ids, entity_ids)
+        pos = np.minimum(pos, self.ids.shape[0] - 1)
+        if not np.array_equal(self.ids[pos], entity_ids):
+            missing = entity_ids[self.ids[pos] != entity_ids]
+            raise KeyError(f'Unknown entity ids {missing[:10].tolist()}')
+        return pos
+
+    def references(self, k: int) -> np.ndarray:
+        return self.refs[self.ref_offsets[k]:self.ref_offsets[k + 1]]
+
+    def ids_of_type(self, type_name: str) -> np.ndarray:
+        codes = np.where(self.type_names == type_name)[0]
+        return self.ids[np.isin(self.type_codes, codes)]
+
+    def save(self, path: Path) -> None:
+        with Path(path).open('wb') as f:
+            np.savez(f, ids=self.ids, offsets=self.offsets, lengths=self.lengths,
+                     type_codes=self.type_codes, type_names=self.type_names,
+                     ref_offsets=self.ref_offsets, refs=self.refs,
+                     meta=np.array([self.data_offset, self.source_size, self.source_mtime_ns],
+                                   dtype=np.int64))
+
+    @classmethod
+    def load(cls, path: Path) -> 'StepIndex':
+        with np.load(path, allow_pickle=False) as z:
+            data_offset, source_size, source_mtime_ns = z['meta'].tolist()
+            return cls(z['ids'], z['offsets'], z['lengths'], z['type_codes'], z['type_names'],
+                       z['ref_offsets'], z['refs'], data_offset, source_size, source_mtime_ns)
+
+
+def index_path(step_file: Path) -> Path:
+    step_file = Path(step_file)
+    return step_file.with_name(step_file.name + '.idx.npz')
+
+
+def build_index(step_file: Path) -> StepIndex:
+    """
+    Scans `step_file` once and records where every entity instance is and
+    which instances it references
+    """
+    ids, offsets, lengths, type_codes, ref_counts, refs = [], [], [], [], [], []
+    type_code_map: Dict[str, int] = {}
+    data_offset = -1
+    with Path(step_file).open('rb') as f:
+        for statement in iter_statements(f):
+            instance = parse_instance(statement)
+            if instance is None:
+                if data_offset < 0 and statement.text.strip() == b'DATA;':
+                    data_offset = statement.offset + len(statement.text)
+                continue
+            type_name = ' '.join(instance.types)
+            ids.append(instance.entity_id)
+            offsets.append(instance.offset)
+            lengths.append(instance.length)
+            type_codes.append(type_code_map.setdefault(type_name, len(type_code_map)))
+            instance_refs = instance_references(instance)
+            ref_counts.append(len(instance_refs))
+            refs.extend(instance_refs)
+    if data_offset < 0:
+        raise ValueError(f'{step_file} has no DATA section')
+
+    ids = np.array(ids, dtype=np.int64)
+    order = np.argsort(ids, kind='stable')
+    ref_counts = np.array(ref_counts, dtype=np.int64)
+    ref_starts = np.concatenate(([0], np.cumsum(ref_counts)))[:-1]
+    refs = np.array(refs, dtype=np.int64)
+    sorted_refs = [refs[ref_starts[k]:ref_starts[k] + ref_counts[k]] for k in order]
+    stat = os.stat(step_file)
+    return StepIndex(
+        ids=ids[order],
+        offsets=np.array(offsets, dtype=np.int64)[order],
+        lengths=np.array(lengths, dtype=np.int64)[order],
+        type_codes=np.array(type_codes, dtype=np.int32)[order],
+        type_names=np.array(list(type_code_map.keys()), dtype=str),
+        ref_offsets=np.concatenate(([0], np.cumsum(ref_counts[order]))).astype(np.int64),
+        refs=np.concatenate(sorted_refs) if sorted_refs else np.zeros((0, ), dtype=np.int64),
+        data_offset=data_offset,
+        source_size=stat.st_size,
+        source_mtime_ns=stat.st_mtime_ns,
+    )
+
+
+def load_or_build_index(step_file: Path) -> StepIndex:
+    """
+    Index saved next to `step_file`, rebuilt if missing or if the file
+    changed since it was built
+    """
+    path = index_path(step_file)
+    stat = os.stat(step_file)
+    if path.exists():
+        index = StepIndex.load(path)
+        if (index.source_size, index.source_mtime_ns) == (stat.st_size, stat.st_mtime_ns):
+            return index
+    index = build_index(step_file)
+    index.save(path)
+    return index
+
+
+def closure(index: StepIndex, roots: Iterable[int]) -> np.ndarray:
+    """
+    Sorted ids of `roots` and of every instance they reference, transitively
+    """
+    seen = np.zeros(index.ids.shape[0], dtype=bool)
+    frontier = index.positions(roots)
+    while frontier.shape[0] > 0:
+        frontier = np.unique(frontier[~seen[frontier]])
+        seen[frontier] = True
+        refs = [index.references(k) for k in frontier]
+        if not refs:
+            break
+        frontier = index.positions(np.unique(np.concatenate(refs)))
+    return index.ids[seen]
+
+
+def _referrers(index: StepIndex, targets: np.ndarray, type_names: Iterable[str]) -> np.ndarray:
+    # Ids of the instances of `type_names` that reference any of `targets`
+    codes = np.where(np.isin(index.type_names, list(type_names)))[0]
+    candidates = np.where(np.isin(index.type_codes, codes))[0]
+    hits = [k for k in candidates if np.isin(index.references(k), targets).any()]
+    return index.ids[np.array(hits, dtype=np.int64)]
+
+
+def product_subset(index: StepIndex, product_id: int) -> np.ndarray:
+    """
+    Ids of the instances that carry the shape of one PRODUCT: the chain of
+    product definitions up to its SHAPE_DEFINITION_REPRESENTATION, the
+    representations linked to it by SHAPE_REPRESENTATION_RELATIONSHIP and
+    everything they reference
+    """
+    roots = np.array([product_id], dtype=np.int64)
+    frontier = roots
+    while frontier.shape[0] > 0:
+        frontier = np.setdiff1d(_referrers(index, frontier, _PRODUCT_CHAIN_TYPES), roots)
+        roots = np.union1d(roots, frontier)
+    ids = closure(index, roots)
+    linked = _referrers(index, ids, ['SHAPE_REPRESENTATION_RELATIONSHIP'])
+    if linked.shape[0] > 0:
+        ids = np.union1d(ids, closure(index, linked))
+    return ids
+
+
+def find_product(index: StepIndex, step_file: Path, name: str) -> int:
+    with Path(step_file).open('rb') as f:
+        for entity_id in index.ids_of_type('PRODUCT'):
+            k = index.positions([entity_id])[0]
+            f.seek(index.offsets[k])
+            instance = parse_instance(Statement(index.offsets[k], f.read(index.lengths[k])))
+            if first_string(instance) == name:
+                return int(entity_id)
+    raise KeyError(f'No PRODUCT named {name}')
+
+
+def write_subset(step_file: Path, index: StepIndex, entity_ids: np.ndarray, out_file: Path,
+                 extra: Optional[List[bytes]] = None) -> None:
+    """
+    Writes the header of `step_file` and the instances `entity_ids` (which
+    must be closed under references) as a standalone STEP file, followed by
+    the `extra` statements
+    """
+    positions = index.positions(entity_ids)
+    positions = positions[np.argsort(index.offsets[positions])]
+    with Path(step_file).open('rb') as src, Path(out_file).open('wb') as dst:
+        dst.write(src.read(index.data_offset))
+        for k in positions:
+            src.seek(index.offsets[k])
+            dst.write(b'\n' + src.read(index.lengths[k]).lstrip())
+        for statement in extra or []:
+            dst.write(b'\n' + statement)
+        dst.write(b'\nENDSEC;\nEND-ISO-10303-21;\n')
+
+
+def representation_context(index: StepIndex, entity_id: int) -> Optional[int]:
+    """
+    Id of the GEOMETRIC_REPRESENTATION_CONTEXT (which carries the length
+    units) of the nearest representation above `entity_id`, following
+    references upwards, or None if there is none
+    """
+    is_context = np.char.find(index.type_names, 'GEOMETRIC_REPRESENTATION_CONTEXT') >= 0
+    context_ids = index.ids[is_context[index.type_codes]]
+    owners = np.repeat(np.arange(index.ids.shape[0]), np.diff(index.ref_offsets))
+    seen = np.array([entity_id], dtype=np.int64)
+    frontier = seen
+    while frontier.shape[0] > 0:
+        referrers = np.unique(owners[np.isin(index.refs, frontier)])
+        for k in referrers:
+            contexts = index.references(k)[np.isin(index.references(k), context_ids)]
+            if contexts.shape[0] > 0:
+                return int(contexts[0])
+        frontier = np.setdiff1d(index.ids[referrers], seen)
+        seen = np.union1d(seen, frontier)
+    return None
+
+
+def face_subset_statements(index: StepIndex, face_ids: Iterable[int],
+                           context_id: Optional[int] = None) -> List[bytes]:
+    """
+    OPEN_SHELL and SHELL_BASED_SURFACE_MODEL instances wrapping `face_ids`,
+    and a SHAPE_REPRESENTATION of them in the representation context
+    `context_id` of the source file, so that a STEP reader transfers the
+    faces as a root shape in their original units
+    """
+    next_id = int(index.ids[-1]) + 1
+    faces = ','.join(f'#{i}' for i in face_ids)
+    statements = [f"#{next_id}=OPEN_SHELL('',({faces}));".encode('ascii'),
+                  f"#{next_id + 1}=SHELL_BASED_SURFACE_MODEL('',(#{next_id}));".encode('ascii')]
+    if context_id is not None:
+        statements.append(f"#{next_id + 2}=SHAPE_REPRESENTATION('',(#{next_id + 1}),#{context_id});".encode('ascii'))
+    return statements
+
+
+def _face_subset(index: StepIndex, face_id: int) -> Tuple[np.ndarray, List[bytes]]:
+    # Instances and extra statements of a standalone file of one face
+    ids = closure(index, [face_id])
+    context_id = representation_context(index, face_id)
+    if context_id is None:
+        print(f'no representation context found for #{face_id}, units default to mm')
+    else:
+        ids = np.union1d(ids, closure(index, [context_id]))
+    return ids, face_subset_statements(index, [face_id], context_id)
+
+
+def _process_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Index a STEP file and extract standalone subsets of it')
+    parser.add_argument('step_file', action='store', help='path to STEP file')
+    selection = parser.add_mutually_exclusive_group()
+    selection.add_argument('--advanced-face', dest='advanced_face', action='store', type=int,
+                           help='extract the k-th ADVANCED_FACE instance in file order, from 0; this is '
+                                'not the numbering of the exporters (_FACE_k), which follows the '
+                                'transferred shape, use --entity with the instance id to be exact')
+    selection.add_argument('--entity', dest='entity', action='store', type=int,
+                           help='extract the instance #ENTITY and everything it references')
+    selection.add_argument('--product', dest='product', action='store',
+                           help='extract the shape of the PRODUCT with this id (#number) or name')
+    parser.add_argument('--output', dest='output', action='store', default='_subset.stp',
+                        help='path of the extracted STEP file')
+    parser.add_argument('--rebuild', dest='rebuild', action='store_true',
+                        help='rebuild the index even if it is up to date')
+    return parser.parse_args()
+
+
+def main():
+    args = _process_args()
+    step_file = Path(args.step_file)
+    if args.rebuild and index_path(step_file).exists():
+        index_path(step_file).unlink()
+    index = load_or_build_index(step_file)
+    print(f'{index.ids.shape[0]} instances indexed in {index_path(step_file)}')
+
+    extra = []
+    if args.advanced_face is not None:
+        faces = index.ids[index.offsets.argsort()]
+        faces = faces[np.isin(faces, index.ids_of_type('ADVANCED_FACE'))]
+        ids, extra = _face_subset(index, int(faces[args.advanced_face]))
+    elif args.entity is not None:
+        if args.entity in index.ids_of_type('ADVANCED_FACE'):
+            ids, extra = _face_subset(index, args.entity)
+        else:
+            ids = closure(index, [args.entity])
+    elif args.product is not None:
+        if args.product.startswith('#'):
+            product_id = int(args.product[1:])
+        else:
+            product_id = find_product(index, step_file, args.product)
+        ids = product_subset(index, product_id)
+    else:
+        return
+
+    write_subset(step_file, index, ids, Path(args.output), extra)
+    print(f'wrote {ids.shape[0] + len(extra)} instances to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+from typing import Any, Optional
+
+from OCC.Core.BRep import BRep_Tool
+from OCC.Core.IFSelect import IFSelect_RetDone, IFSelect_ItemsByEntity
+from OCC.Core.STEPControl import STEPControl_Reader
+from OCC.Core.TopAbs import TopAbs_EDGE, TopAbs_VERTEX
+from OCC.Core.TopExp import TopExp_Explorer
+from OCC.Core.TopoDS import topods_Edge, topods_Vertex
+
+from brep_cache import BRepCache, step_cache_key
+
+# Reader settings that determine the transferred shape, part of the cache key
+READER_OPTIONS = {'transfer': 'root'}
+
+
+def _transfer_step_shape(step_file: str) -> Any:
+    step_reader = STEPControl_Reader()
+    status = step_reader.ReadFile(step_file)
+
+    if status != IFSelect_RetDone:
+        raise ValueError('Error parsing STEP file')
+
+    failsonly = False
+    step_reader.PrintCheckLoad(failsonly, IFSelect_ItemsByEntity)
+    step_reader.PrintCheckTransfer(failsonly, IFSelect_ItemsByEntity)
+    step_reader.TransferRoot()
+    shape = step_reader.Shape()
+    return shape
+
+
+def read_step_shape(step_file: str, cache: Optional[BRepCache] = None) -> Any:
+    """
+    Reads `step_file` and returns the transferred TopoDS_Shape. With a
+    `cache`, the shape is loaded from the BRep file stored for the contents
+    of `step_file` if there is one, and stored there otherwise.
+    """
+    if cache is None:
+        return _transfer_step_shape(step_file)
+
+    key = step_cache_key(step_file, READER_OPTIONS)
+    shape = cache.get(key)
+    if shape is None:
+        shape = _transfer_step_shape(step_file)
+        cache.put(key, shape)
+    return shape
+
+
+def shape_tolerance(shape: Any) -> Optional[float]:
+    """
+    Largest B-rep tolerance of the vertices and edges of `shape`, i.e. the
+    largest gap its topology closes, or None if it has neither
+    """
+    tolerance = None
+    for shape_type, cast in ((TopAbs_VERTEX, topods_Vertex), (TopAbs_EDGE, topods_Edge)):
+        explorer = TopExp_Explorer(shape, shape_type)
+        while explorer.More():
+            t = BRep_Tool.Tolerance(cast(explorer.Current()))
+            tolerance = t if tolerance is None else max(tolerance, t)
+            explorer.Next()
+    return tolerance
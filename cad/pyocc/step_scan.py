@@ -0,0 +1,148 @@
+import argparse
+from collections import Counter
+from multiprocessing import Pool
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from part21 import instance_references, iter_instances
+
+# Entity types reported as CSV columns, in this order
+ENTITY_TYPES = [
+    'PRODUCT',
+    'NEXT_ASSEMBLY_USAGE_OCCURRENCE',
+    'MAPPED_ITEM',
+    'MANIFOLD_SOLID_BREP',
+    'BREP_WITH_VOIDS',
+    'SHELL_BASED_SURFACE_MODEL',
+    'CLOSED_SHELL',
+    'OPEN_SHELL',
+    'ADVANCED_FACE',
+    'FACE_SURFACE',
+    'EDGE_CURVE',
+    'PLANE',
+    'CYLINDRICAL_SURFACE',
+    'CONICAL_SURFACE',
+    'SPHERICAL_SURFACE',
+    'TOROIDAL_SURFACE',
+    'SURFACE_OF_REVOLUTION',
+    'SURFACE_OF_LINEAR_EXTRUSION',
+    'B_SPLINE_SURFACE_WITH_KNOTS',
+    'B_SPLINE_CURVE_WITH_KNOTS',
+]
+
+
+# Entities that the STEP transfer turns into the shapes reported by the
+# count scripts: a solid per solid B-rep and a face per face
+SOLID_TYPES = ['MANIFOLD_SOLID_BREP', 'BREP_WITH_VOIDS', 'FACETED_BREP']
+FACE_TYPES = ['ADVANCED_FACE', 'FACE_SURFACE']
+SHAPE_COLUMNS = ['num_compounds', 'num_solids', 'num_faces']
+
+
+def scan_step_file(step_file: str) -> Tuple[str, int, Counter]:
+    """
+    Counts the entity instances of `step_file` by type without transferring
+    any geometry. Every partial type of a complex instance is counted.
+    Returns the file path, the number of instances and the type counts.
+    """
+    counts = Counter()
+    n_instances = 0
+    with open(step_file, 'rb') as f:
+        for instance in iter_instances(f):
+            n_instances += 1
+            counts.update(instance.types)
+    return step_file, n_instances, counts
+
+
+def count_shapes(step_file: str) -> Tuple[str, Dict[str, int]]:
+    """
+    Counts of the compounds, solids and faces the STEP transfer of
+    `step_file` yields, from its entities alone. Every assembly, i.e. every
+    product definition that NEXT_ASSEMBLY_USAGE_OCCURRENCE relates to its
+    components, becomes a compound.
+    """
+    counts = Counter()
+    assemblies = set()
+    with open(step_file, 'rb') as f:
+        for instance in iter_instances(f):
+            counts.update(instance.types)
+            if 'NEXT_ASSEMBLY_USAGE_OCCURRENCE' in instance.types:
+                # The relating product definition is the first reference
+                refs = instance_references(instance)
+                if refs:
+                    assemblies.add(refs[0])
+    return step_file, {
+        'num_compounds': len(assemblies),
+        'num_solids': sum(counts[t] for t in SOLID_TYPES),
+        'num_faces': sum(counts[t] for t in FACE_TYPES),
+    }
+
+
+def write_shape_stats(step_files: List[str], outfile: Path, workers: Optional[int] = None) -> None:
+    """
+    Writes the `count_shapes` of every file as one CSV row, scanning the
+    files in a pool of `workers` processes; in this process if it is 1
+    """
+    if workers == 1:
+        results = [count_shapes(step_file) for step_file in step_files]
+    else:
+        with Pool(workers) as pool:
+            results = list(pool.imap(count_shapes, step_files, chunksize=4))
+    with outfile.open('w') as f:
+        f.write(','.join(['filepath', *SHAPE_COLUMNS]) + '\n')
+        for step_file, counts in results:
+            f.write(','.join(map(str, [step_file, *[counts[c] for c in SHAPE_COLUMNS]])) + '\n')
+
+
+def find_step_files(root: Path) -> List[str]:
+    """
+    Paths of the .stp and .step files under `root`, in any letter case
+    """
+    return sorted(p.as_posix() for p in Path(root).glob('**/*')
+                  if p.suffix.lower() in ('.stp', '.step') and p.is_file())
+
+
+def _scan_or_error(step_file: str) -> Tuple[str, int, Counter]:
+    try:
+        return scan_step_file(step_file)
+    except OSError as e:
+        print(f'failed to scan {step_file}: {e}')
+        return step_file, -1, Counter()
+
+
+def write_stats(results: List[Tuple[str, int, Counter]], outfile: Path, entity_types: List[str]) -> None:
+    with outfile.open('w') as f:
+        f.write(','.join(['filepath', 'num_instances', *[t.lower() for t in entity_types]]) + '\n')
+        for step_file, n_instances, counts in results:
+            row = [step_file, n_instances, *[counts.get(t, 0) for t in entity_types]]
+            f.write(','.join(map(str, row)) + '\n')
+
+
+def _process_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Count STEP entity types without transferring geometry')
+    parser.add_argument('--step-dir', dest='step_dir', action='store', default='../step_files',
+                        help='directory searched recursively for STEP files')
+    parser.add_argument('--output', dest='output', action='store', default='step_file_stats.csv',
+                        help='path of the CSV file')
+    parser.add_argument('--workers', dest='workers', action='store', type=int, default=None,
+                        help='number of worker processes, all CPUs by default')
+    parser.add_argument('--all-types', dest='all_types', action='store_true',
+                        help='report every entity type found instead of the default columns')
+    return parser.parse_args()
+
+
+def main():
+    args = _process_args()
+    step_files = find_step_files(Path(args.step_dir))
+
+    with Pool(args.workers) as pool:
+        results = list(pool.imap(_scan_or_error, step_files, chunksize=4))
+
+    entity_types = ENTITY_TYPES
+    if args.all_types:
+        entity_types = sorted(set().union(*(counts.keys() for _, _, counts in results)))
+    write_stats(results, Path(args.output), entity_types)
+    print(f'scanned {len(results)} files into {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+import argparse
+from pathlib import Path
+from typing import Any, Callable, Dict
+
+from OCC.Core.BRepAlgoAPI import BRepAlgoAPI_Cut, BRepAlgoAPI_Fuse
+from OCC.Core.BRepFilletAPI import BRepFilletAPI_MakeFillet
+from OCC.Core.BRepPrimAPI import BRepPrimAPI_MakeBox, BRepPrimAPI_MakeCylinder
+from OCC.Core.IFSelect import IFSelect_RetDone
+from OCC.Core.STEPControl import STEPControl_Writer, STEPControl_AsIs
+from OCC.Core.gp import gp_Ax2, gp_Dir, gp_Pnt
+from OCC.Extend.TopologyUtils import TopologyExplorer
+
+
+def _plate_with_holes(n: int) -> Any:
+    # n x n grid of through holes in a 100 x 100 x 5 plate
+    plate = BRepPrimAPI_MakeBox(100., 100., 5.).Shape()
+    pitch = 100. / (n + 1)
+    for i in range(1, n + 1):
+        for j in range(1, n + 1):
+            axis = gp_Ax2(gp_Pnt(i * pitch, j * pitch, -1.), gp_Dir(0., 0., 1.))
+            hole = BRepPrimAPI_MakeCylinder(axis, 0.25 * pitch, 7.).Shape()
+            plate = BRepAlgoAPI_Cut(plate, hole).Shape()
+    return plate
+
+
+def _filleted_block(radius: float) -> Any:
+    block = BRepPrimAPI_MakeBox(60., 40., 30.).Shape()
+    fillet = BRepFilletAPI_MakeFillet(block)
+    for edge in TopologyExplorer(block).edges():
+        fillet.Add(radius, edge)
+    return fillet.Shape()
+
+
+def _cylinder_boss() -> Any:
+    # Cylinder standing on a filleted base plate, a typical turned part
+    base = BRepPrimAPI_MakeBox(gp_Pnt(-30., -30., 0.), 60., 60., 8.).Shape()
+    boss = BRepPrimAPI_MakeCylinder(gp_Ax2(gp_Pnt(0., 0., 8.), gp_Dir(0., 0., 1.)), 15., 40.).Shape()
+    bore = BRepPrimAPI_MakeCylinder(gp_Ax2(gp_Pnt(0., 0., -1.), gp_Dir(0., 0., 1.)), 8., 50.).Shape()
+    part = BRepAlgoAPI_Fuse(base, boss).Shape()
+    return BRepAlgoAPI_Cut(part, bore).Shape()
+
+
+# Reproducible baseline corpus: file stem -> shape builder
+SYNTHETIC_SHAPES: Dict[str, Callable[[], Any]] = {
+    'plate_holes_2x2': lambda: _plate_with_holes(2),
+    'plate_holes_6x6': lambda: _plate_with_holes(6),
+    'block_fillet_2': lambda: _filleted_block(2.),
+    'block_fillet_8': lambda: _filleted_block(8.),
+    'cylinder_boss': _cylinder_boss,
+}
+
+
+def write_step(shape: Any, step_file: Path) -> None:
+    writer = STEPControl_Writer()
+    writer.Transfer(shape, STEPControl_AsIs)
+    status = writer.Write(step_file.as_posix())
+    if status != IFSelect_RetDone:
+        raise ValueError(f'Error writing STEP file {step_file}')
+
+
+def _process_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Write a synthetic STEP corpus for benchmarks')
+    parser.add_argument('output_dir', action='store', help='directory for the STEP files')
+    return parser.parse_args()
+
+
+def main():
+    args = _process_args()
+    output_dir = Path(args.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    for name, build in SYNTHETIC_SHAPES.items():
+        step_file = output_dir / f'{name}.stp'
+        print(f'writing {step_file}')
+        write_step(build(), step_file)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+import numpy as np
+
+from curve_sampling import _distance_to_segments, adaptive_params, seed_params
+
+
+def _sine(t):
+    return np.column_stack((t, np.sin(4. * t)))
+
+
+def _max_chord_error(evaluate, t, n_dense=64):
+    # Largest distance of the curve to the chord of its interval, densely sampled
+    s = np.linspace(0., 1., n_dense)
+    T = t[:-1, None] + np.diff(t)[:, None] * s
+    P = evaluate(T.ravel()).reshape(T.shape[0], n_dense, -1)
+    return _distance_to_segments(P, evaluate(t[:-1]), evaluate(t[1:])).max()
+
+
+def test_seed_params_split_pieces_between_breaks():
+    t = seed_params(0., 3., min_segments=2, breaks=np.array([-1., 0., 1., 1., 3., 4.]))
+    np.testing.assert_allclose(t, [0., 0.5, 1., 2., 3.])
+
+
+def test_line_keeps_its_end_points():
+    t = adaptive_params(lambda t: np.column_stack((t, 2. * t)), 0., 1., 1e-3, min_segments=1)
+    np.testing.assert_allclose(t, [0., 1.])
+
+
+def test_oscillating_curve_within_tolerance():
+    # With a single seed interval the probes at 1/4, 1/2 and 3/4 of [0, pi]
+    # all lie on the chord of sin(4t)
+    t = adaptive_params(_sine, 0., np.pi, 0.01, min_segments=4)
+    assert t[0] == 0. and t[-1] == np.pi
+    assert _max_chord_error(_sine, t) < 0.01
+
+
+def test_oscillating_curve_seeded_by_breaks():
+    t = adaptive_params(_sine, 0., np.pi, 0.01, breaks=np.linspace(0., np.pi, 5))
+    assert _max_chord_error(_sine, t) < 0.01
+
+
+def test_curves_sharing_parameters_all_within_tolerance():
+    def _evaluate(t):
+        return np.stack((np.column_stack((t, 0. * t)), _sine(t)), axis=1)
+
+    t = adaptive_params(_evaluate, 0., np.pi, 0.01, min_segments=4)
+    assert _max_chord_error(_sine, t) < 0.01
@@ -0,0 +1,40 @@
+import numpy as np
+
+from uv_triangulate import points_in_rings, triangulate_rings
+
+# Star-shaped ring with an edge between its first two points that the
+# Delaunay triangulation of its vertices crosses
+CONCAVE_RING = np.array([[0.35, 0.54], [0.47, 0.81], [0.04, 0.2], [-0.13, 0.3], [-0.5, 0.59],
+                         [0.02, -0.52], [0.27, -0.34], [0.84, -0.49]])
+
+
+def _area(UV, tris):
+    a, b, c = UV[tris[:, 0]], UV[tris[:, 1]], UV[tris[:, 2]]
+    return 0.5 * ((b[:, 0] - a[:, 0]) * (c[:, 1] - a[:, 1]) - (b[:, 1] - a[:, 1]) * (c[:, 0] - a[:, 0]))
+
+
+def _ring_area(ring):
+    u, v = ring[:, 0], ring[:, 1]
+    return 0.5 * abs(np.dot(u, np.roll(v, -1)) - np.dot(v, np.roll(u, -1)))
+
+
+def test_square_with_hole():
+    outer = np.array([[0., 0.], [4., 0.], [4., 4.], [0., 4.]])
+    hole = np.array([[1., 1.], [1., 3.], [3., 3.], [3., 1.]])
+    UV, tris = triangulate_rings([outer, hole])
+    area = _area(UV, tris)
+    assert (area > 0.).all()
+    np.testing.assert_allclose(area.sum(), 12.)
+
+
+def test_concave_ring_follows_its_boundary():
+    UV, tris = triangulate_rings([CONCAVE_RING])
+    area = _area(UV, tris)
+    assert (area > 0.).all()
+    np.testing.assert_allclose(area.sum(), _ring_area(CONCAVE_RING))
+    assert points_in_rings(UV[tris].mean(axis=1), [CONCAVE_RING]).all()
+
+
+def test_missing_boundary_segments_give_none():
+    # One round of splitting does not recover the crossed edge
+    assert triangulate_rings([CONCAVE_RING], max_iter=1) is None
@@ -0,0 +1,138 @@
+from typing import Any, List, Optional
+
+import numpy as np
+from scipy.spatial import cKDTree
+from OCC.Core.BRep import BRep_Tool
+from OCC.Core.BRepClass import BRepClass_FaceClassifier
+from OCC.Core.TopAbs import TopAbs_IN, TopAbs_ON, TopAbs_REVERSED
+from OCC.Core.gp import gp_Pnt2d
+from OCC.Extend.TopologyUtils import TopologyExplorer, WireExplorer
+
+from nurbs_eval import pcurve_points
+from uv_triangulate import points_in_rings
+
+
+def classify_points(UVgrid: np.ndarray, face: Any, tol: float = 1e-3) -> np.ndarray:
+    """
+    Classifies if points in `UVgrid` lie on trimmed `face` or outside of it
+    using the OCC face classifier, one point at a time
+    """
+    Npts = UVgrid.shape[0]
+    is_point_on_face = np.ones((Npts, ), dtype=bool)
+    fc = BRepClass_FaceClassifier()
+    for i in range(Npts):
+        u, v = UVgrid[i]
+        fc.Perform(face, gp_Pnt2d(u, v), tol)
+        state = fc.State()
+        if state not in [TopAbs_IN, TopAbs_ON]:
+            is_point_on_face[i] = False
+
+    return is_point_on_face
+
+
+def wire_uv_polygon(wire: Any, face: Any, n_verts_per_edge: int = 50) -> Optional[np.ndarray]:
+    """
+    Discretizes the pcurves of `wire` on `face` into a closed UV polygon.
+    Returns None if any edge of the wire has no pcurve.
+    """
+    polygon = []
+    for edge in WireExplorer(wire).ordered_edges():
+        pcurve_object = BRep_Tool().CurveOnSurface(edge, face)
+        if len(pcurve_object) != 3:
+            return None
+        pcurve, first, last = pcurve_object
+        tgrid = np.linspace(first, last, n_verts_per_edge)
+        if edge.Orientation() == TopAbs_REVERSED:
+            tgrid = tgrid[::-1]
+        polygon.append(pcurve_points(pcurve, tgrid))
+    if len(polygon) == 0:
+        return None
+    return np.vstack(polygon)
+
+
+def face_uv_polygons(face: Any, n_verts_per_edge: int = 50) -> Optional[List[np.ndarray]]:
+    """
+    UV polygons of all (outer and inner) wires of `face`
+    """
+    polygons = []
+    for wire in TopologyExplorer(face).wires():
+        polygon = wire_uv_polygon(wire, face, n_verts_per_edge)
+        if polygon is None:
+            return None
+        polygons.append(polygon)
+    return polygons
+
+
+def scanline_classify(polygons: List[np.ndarray], Ulist: np.ndarray,
+                      Vlist: np.ndarray) -> np.ndarray:
+    """
+    Even-odd classification of the regular grid `Ulist` x `Vlist` against
+    closed UV polygons. Each grid row is intersected with the polygon
+    edges once and the inside/outside runs between crossings are filled.
+    Returns a boolean array of shape (len(Vlist), len(Ulist)).
+    """
+    starts = np.vstack(polygons)
+    ends = np.vstack([np.roll(p, -1, axis=0) for p in polygons])
+    inside = np.zeros((Vlist.shape[0], Ulist.shape[0]), dtype=bool)
+    for j, v in enumerate(Vlist):
+        # Half-open rule so that a vertex lying on the scanline is counted once
+        crossing = (starts[:, 1] <= v) != (ends[:, 1] <= v)
+        s, e = starts[crossing], ends[crossing]
+        u_crossings = s[:, 0] + (v - s[:, 1]) * (e[:, 0] - s[:, 0]) / (e[:, 1] - s[:, 1])
+        u_crossings.sort()
+        n_left = np.searchsorted(u_crossings, Ulist, side='right')
+        inside[j] = (n_left % 2) == 1
+    return inside
+
+
+def _boundary_cell_corners(inside: np.ndarray) -> np.ndarray:
+    # A cell is on the boundary if its four corners do not all agree
+    corners = (inside[:-1, :-1], inside[:-1, 1:], inside[1:, 1:], inside[1:, :-1])
+    n_inside = sum(c.astype(int) for c in corners)
+    mixed = (n_inside > 0) & (n_inside < 4)
+    on_boundary = np.zeros_like(inside)
+    on_boundary[:-1, :-1] |= mixed
+    on_boundary[:-1, 1:] |= mixed
+    on_boundary[1:, 1:] |= mixed
+    on_boundary[1:, :-1] |= mixed
+    return on_boundary
+
+
+def classify_uv_grid(face: Any, Ulist: np.ndarray, Vlist: np.ndarray,
+                     tol: float = 1e-3) -> np.ndarray:
+    """
+    Classifies the points of the UV grid spanned by `Ulist` and `Vlist` as on
+    the trimmed `face` (IN or ON) or outside of it. Points are ordered as in
+    `np.meshgrid(Ulist, Vlist)` raveled. The scanline pass decides all points
+    and the OCC classifier is only called for corners of boundary cells.
+    """
+    Ugrid, Vgrid = np.meshgrid(Ulist, Vlist)
+    UVgrid = np.column_stack((Ugrid.ravel(), Vgrid.ravel()))
+    polygons = face_uv_polygons(face)
+    if not polygons:
+        # Missing pcurves, or no wires at all
+        return classify_points(UVgrid, face, tol)
+
+    inside = scanline_classify(polygons, Ulist, Vlist)
+    on_boundary = _boundary_cell_corners(inside).ravel()
+    inside = inside.ravel()
+    inside[on_boundary] = classify_points(UVgrid[on_boundary], face, tol)
+    return inside
+
+
+def classify_points_near_polygons(UV: np.ndarray, face: Any, polygons: List[np.ndarray], margin: float,
+                                  tol: float = 1e-3) -> np.ndarray:
+    """
+    Classifies the points `UV` as on the trimmed `face` or outside of it by
+    the even-odd test against its UV polygons. The OCC classifier is only
+    called for points within `margin` of a polygon.
+    """
+    inside = points_in_rings(UV, polygons)
+    vertices = np.vstack(polygons)
+    segments = np.vstack([np.roll(p, -1, axis=0) for p in polygons]) - vertices
+    # A point within `margin` of a segment is within `margin` plus half the
+    # segment length of one of its end points
+    distance, _ = cKDTree(vertices).query(UV)
+    near = distance < margin + 0.5 * np.linalg.norm(segments, axis=1).max()
+    inside[near] = classify_points(UV[near], face, tol)
+    return inside
@@ -0,0 +1,152 @@
+from typing import List, Optional, Tuple
+
+import numpy as np
+from scipy.spatial import Delaunay, cKDTree
+
+
+def clean_ring(ring: np.ndarray, eps: float) -> np.ndarray:
+    """
+    Drops consecutive duplicate points (e.g. the shared endpoints of
+    adjacent edges) and the closing point of a ring
+    """
+    keep = np.linalg.norm(np.diff(ring, axis=0, append=ring[:1]), axis=1) > eps
+    return ring[keep]
+
+
+def simplify_ring(ring: np.ndarray, tol: float, scale: Tuple[float, float] = (1., 1.)) -> np.ndarray:
+    """
+    Douglas-Peucker simplification of a closed ring: drops the points that
+    lie within `tol` of the chord between the kept points around them.
+    Distances are measured on coordinates multiplied by `scale`.
+    """
+    n = ring.shape[0]
+    if n <= 3:
+        return ring
+    P = ring * np.asarray(scale)
+    keep = np.zeros(n, dtype=bool)
+    # Split the ring at its first point and the point farthest from it
+    far = int(np.argmax(np.linalg.norm(P - P[0], axis=1)))
+    keep[0] = keep[far] = True
+    stack = [(0, far), (far, n)]
+    while stack:
+        a, b = stack.pop()
+        if b - a < 2:
+            continue
+        pa, pb = P[a], P[b % n]
+        d = pb - pa
+        inner = P[a + 1:b]
+        length = np.linalg.norm(d)
+        if length > 0.:
+            dist = np.abs(d[0] * (inner[:, 1] - pa[1]) - d[1] * (inner[:, 0] - pa[0])) / length
+        else:
+            dist = np.linalg.norm(inner - pa, axis=1)
+        k = int(np.argmax(dist))
+        if dist[k] > tol:
+            keep[a + 1 + k] = True
+            stack.extend([(a, a + 1 + k), (a + 1 + k, b)])
+    return ring[keep]
+
+
+def points_in_rings(P: np.ndarray, rings: List[np.ndarray], chunk_size: int = 4096) -> np.ndarray:
+    """
+    Even-odd classification of points `P` against closed rings
+    """
+    starts = np.vstack(rings)
+    ends = np.vstack([np.roll(r, -1, axis=0) for r in rings])
+    inside = np.zeros(P.shape[0], dtype=bool)
+    for k in range(0, P.shape[0], chunk_size):
+        u, v = P[k:k + chunk_size, 0:1], P[k:k + chunk_size, 1:2]
+        crossing = (starts[:, 1] <= v) != (ends[:, 1] <= v)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            u_cross = starts[:, 0] + (v - starts[:, 1]) * (ends[:, 0] - starts[:, 0]) / (ends[:, 1] - starts[:, 1])
+        inside[k:k + chunk_size] = ((crossing & (u_cross > u)).sum(axis=1) % 2) == 1
+    return inside
+
+
+def _edge_keys(a: np.ndarray, b: np.ndarray, n: int) -> np.ndarray:
+    lo, hi = np.minimum(a, b), np.maximum(a, b)
+    return lo.astype(np.int64) * n + hi
+
+
+def interior_grid_points(rings: List[np.ndarray], Ulist: np.ndarray, Vlist: np.ndarray,
+                         clearance: float = 0.5) -> np.ndarray:
+    """
+    Points of the grid `Ulist` x `Vlist` inside the rings and at least
+    `clearance` grid cells away from every ring point, to be used as Steiner
+    points without creating slivers along the boundary
+    """
+    Ugrid, Vgrid = np.meshgrid(Ulist, Vlist)
+    P = np.column_stack((Ugrid.ravel(), Vgrid.ravel()))
+    P = P[points_in_rings(P, rings)]
+    if P.shape[0] == 0:
+        return P
+    cell = np.array([Ulist[1] - Ulist[0] if Ulist.shape[0] > 1 else 1.,
+                     Vlist[1] - Vlist[0] if Vlist.shape[0] > 1 else 1.])
+    distance, _ = cKDTree(np.vstack(rings) / cell).query(P / cell)
+    return P[distance >= clearance]
+
+
+def triangulate_rings(rings: List[np.ndarray], steiner: Optional[np.ndarray] = None,
+                      max_iter: int = 16) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Triangulates the region bounded by closed UV `rings` (outer and inner
+    boundaries, in any order) with optional interior `steiner` points.
+    Boundary segments missing from the Delaunay triangulation are split at
+    their midpoints until every one of them is a triangle edge (conforming
+    Delaunay). Triangles outside the region are dropped and the rest are
+    oriented counter-clockwise in UV.
+    Returns the UV points used by the triangles and the (n, 3) triangles, or
+    None if some segments are still missing after `max_iter` rounds, since
+    triangles could then cross the boundary.
+    """
+    points = [r for r in rings]
+    segments = []
+    offset = 0
+    for r in rings:
+        k = np.arange(r.shape[0]) + offset
+        segments.append(np.column_stack((k, np.roll(k, -1))))
+        offset += r.shape[0]
+    if steiner is not None and steiner.shape[0] > 0:
+        points.append(steiner)
+
+    # Points repeated across rings (e.g. along a seam) are merged
+    UV, inverse = np.unique(np.vstack(points), axis=0, return_inverse=True)
+    segments = inverse.reshape(-1)[np.vstack(segments)]
+    segments = segments[segments[:, 0] != segments[:, 1]]
+
+    for _ in range(max_iter):
+        tri = Delaunay(UV)
+        simplices = tri.simplices
+        n = UV.shape[0]
+        # Points Qhull left out as (nearly) coincident with a vertex
+        if tri.coplanar.shape[0] > 0:
+            nearest = np.arange(n)
+            nearest[tri.coplanar[:, 0]] = tri.coplanar[:, 2]
+            segments = nearest[segments]
+            segments = segments[segments[:, 0] != segments[:, 1]]
+        tri_edges = np.concatenate([_edge_keys(simplices[:, i], simplices[:, (i + 1) % 3], n)
+                                    for i in range(3)])
+        missing = ~np.isin(_edge_keys(segments[:, 0], segments[:, 1], n), tri_edges)
+        if not missing.any():
+            break
+        split = segments[missing]
+        mid_index = np.arange(n, n + split.shape[0])
+        UV = np.vstack((UV, 0.5 * (UV[split[:, 0]] + UV[split[:, 1]])))
+        segments = np.vstack((segments[~missing],
+                              np.column_stack((split[:, 0], mid_index)),
+                              np.column_stack((mid_index, split[:, 1]))))
+    else:
+        return None
+
+    centroids = UV[simplices].mean(axis=1)
+    simplices = simplices[points_in_rings(centroids, rings)]
+
+    # Counter-clockwise in UV
+    a, b, c = UV[simplices[:, 0]], UV[simplices[:, 1]], UV[simplices[:, 2]]
+    area = (b[:, 0] - a[:, 0]) * (c[:, 1] - a[:, 1]) - (b[:, 1] - a[:, 1]) * (c[:, 0] - a[:, 0])
+    simplices[area < 0] = simplices[area < 0][:, [0, 2, 1]]
+
+    used = np.unique(simplices)
+    remap = np.full(UV.shape[0], -1, dtype=np.int64)
+    remap[used] = np.arange(used.shape[0])
+    return UV[used], remap[simplices]
@@ -0,0 +1,249 @@
+import argparse
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from mesh_io import face_groups, iter_meshes, open_mesh_writer, surface_meshes
+from mesh_topology import boundary_vertices
+
+# Shifts, in half cells, of the 8 grids of cell size 2 eps: two points
+# closer than eps share a cell in at least one of them
+_SHIFTS = np.stack(np.meshgrid([0, 1], [0, 1], [0, 1], indexing='ij'), axis=-1).reshape(-1, 3)
+
+# Large primes of the spatial hash of a grid cell; colliding cells only add
+# candidates that the distance test rejects
+_HASH_PRIMES = np.array([73856093, 19349663, 83492791], dtype=np.int64)
+
+
+def _cell_hash(cells: np.ndarray) -> np.ndarray:
+    h = cells * _HASH_PRIMES  # wraps around on overflow
+    return h[:, 0] ^ h[:, 1] ^ h[:, 2]
+
+
+def _close_pairs(P: np.ndarray, eps: float) -> Tuple[np.ndarray, np.ndarray]:
+    # Pairs (i, j), i < j, of points closer than eps. In each shifted grid
+    # the points are sorted by cell and compared with the following points
+    # of the same cell, k = 1, 2, ... positions ahead.
+    I, J = [], []
+    for shift in _SHIFTS:
+        keys = _cell_hash(np.floor(P / (2. * eps) + 0.5 * shift).astype(np.int64))
+        order = np.argsort(keys)
+        sorted_keys = keys[order]
+        k = 1
+        while k < P.shape[0]:
+            same = sorted_keys[k:] == sorted_keys[:-k]
+            if not same.any():
+                break
+            i, j = order[:-k][same], order[k:][same]
+            d = P[i] - P[j]
+            close = np.einsum('ij,ij->i', d, d) < eps * eps
+            I.append(np.minimum(i, j)[close])
+            J.append(np.maximum(i, j)[close])
+            k += 1
+    if not I:
+        return np.zeros((0, ), dtype=np.int64), np.zeros((0, ), dtype=np.int64)
+    return np.concatenate(I), np.concatenate(J)
+
+
+def _components(n: int, I: np.ndarray, J: np.ndarray) -> np.ndarray:
+    # Smallest vertex index of the connected component of every vertex of
+    # the graph with edges (I, J), by min-label propagation
+    labels = np.arange(n)
+    while True:
+        m = np.minimum(labels[I], labels[J])
+        new_labels = labels.copy()
+        np.minimum.at(new_labels, I, m)
+        np.minimum.at(new_labels, J, m)
+        new_labels = new_labels[new_labels]  # pointer jumping
+        if np.array_equal(new_labels, labels):
+            return labels
+        labels = new_labels
+
+
+def weld_vertices(P: np.ndarray, eps: float,
+                  candidates: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Merges the vertices of `P` that lie within `eps` of each other, directly
+    or through a chain of such vertices. Only the vertices of the boolean
+    mask `candidates` (all by default) are considered. Returns the indices
+    of the kept vertices and, for every vertex of `P`, the index of its
+    welded vertex among the kept ones.
+    """
+    n = P.shape[0]
+    candidates = np.arange(n) if candidates is None else np.where(candidates)[0]
+    labels = np.arange(n)
+    if candidates.shape[0] > 1:
+        I, J = _close_pairs(P[candidates], eps)
+        labels[candidates] = candidates[_components(candidates.shape[0], I, J)]
+    kept, inverse = np.unique(labels, return_inverse=True)
+    return kept, inverse
+
+
+def weld_surfaces(surfaces: List[Tuple[Dict, bool]], eps: float) -> Tuple[np.ndarray, List[np.ndarray], int]:
+    """
+    Concatenates surface meshes into one shared vertex buffer, welding the
+    boundary vertices of every mesh with those of the others. Returns the
+    welded vertices, the faces grouped by polygon size and the number of
+    merged vertices.
+    """
+    vertices, faces, is_boundary = [], [], []
+    n_verts = 0
+    for mesh, has_face_types in surfaces:
+        V = np.asarray(mesh['vertices'], dtype=np.float64).reshape(-1, 3)
+        mask = np.zeros(V.shape[0], dtype=bool)
+        for F in face_groups(mesh['faces'], has_face_types):
+            mask |= boundary_vertices(F, V.shape[0])
+            faces.append(F + n_verts)
+        vertices.append(V)
+        is_boundary.append(mask)
+        n_verts += V.shape[0]
+    if n_verts == 0:
+        return np.zeros((0, 3)), [], 0
+
+    vertices = np.vstack(vertices)
+    kept, inverse = weld_vertices(vertices, eps, np.concatenate(is_boundary))
+    by_size = {}
+    for F in faces:
+        by_size.setdefault(F.shape[1], []).append(inverse[F])
+    faces = [np.vstack(by_size[k]).astype(np.int32) for k in sorted(by_size)]
+    return vertices[kept].astype(np.float32), faces, n_verts - kept.shape[0]
+
+
+def _welded_record(name: str, vertices: np.ndarray, faces: List[np.ndarray], as_lists: bool) -> Dict:
+    if as_lists:
+        return {'name': name, 'type': 'surface', 'vertices': vertices.tolist(), 'edges': [],
+                'faces': [row for F in faces for row in F.tolist()], 'param_grid': None}
+    if len(faces) == 1:
+        faces = faces[0]
+    else:
+        faces = [row for F in faces for row in F]
+    return {'name': name, 'type': 'surface', 'vertices': vertices,
+            'edges': np.zeros((0, 2), dtype=np.int32), 'faces': faces, 'param_grid': None}
+
+
+def default_tolerance(records: List[Dict]) -> float:
+    """
+    1e-6 of the diagonal of the bounding box of all surface vertices
+    """
+    V = [np.asarray(mesh['vertices']).reshape(-1, 3)
+         for record in records for mesh, _ in surface_meshes(record)]
+    V = [v for v in V if v.shape[0] > 0]
+    if not V:
+        return 1e-6
+    V = np.vstack(V)
+    return 1e-6 * float(np.linalg.norm(V.max(axis=0) - V.min(axis=0))) or 1e-6
+
+
+def weld_records(records: List[Dict], eps: float, as_lists: bool = False) -> Tuple[List[Dict], int]:
+    """
+    Welds the surface meshes of exported `records`: the faces of each
+    instanced part into one mesh in part coordinates, all other faces into a
+    single mesh. Returns the welded meshes followed by the instance records,
+    which now name the welded part meshes, and the number of merged vertices.
+    """
+    instances = [r for r in records if r.get('type') == 'instance']
+    surfaces: Dict[str, List[Tuple[Dict, bool]]] = {}
+    for record in records:
+        surfaces.setdefault(record['name'], []).extend(surface_meshes(record))
+
+    groups: Dict[str, List[str]] = {}
+    part_names = {}
+    for record in instances:
+        name = part_names.setdefault(record['part'], f'_PART_{record["part"]:06d}')
+        groups[name] = record['face_names']
+        record['face_names'] = [name]
+    grouped = {face_name for face_names in groups.values() for face_name in face_names}
+    groups['_WELDED'] = [name for name in surfaces if name not in grouped]
+
+    welded, n_merged = [], 0
+    for name, face_names in groups.items():
+        group = [s for face_name in face_names for s in surfaces.get(face_name, [])]
+        if not group:
+            continue
+        vertices, faces, merged = weld_surfaces(group, eps)
+        n_merged += merged
+        welded.append(_welded_record(name, vertices, faces, as_lists))
+    return welded + instances, n_merged
+
+
+def weld_tolerance(model_tol: Optional[float], records: List[Dict]) -> float:
+    """
+    Welding distance for meshes of a model with B-rep tolerance `model_tol`,
+    which float32 vertices cannot resolve below their rounding; the bounding
+    box based `default_tolerance` without a model tolerance
+    """
+    if model_tol is None or model_tol <= 0.:
+        return default_tolerance(records)
+    V = [np.abs(np.asarray(mesh['vertices'])).max()
+         for record in records for mesh, _ in surface_meshes(record) if len(mesh['vertices']) > 0]
+    rounding = 4. * float(np.spacing(np.float32(max(V)))) if V else 0.
+    return max(model_tol, rounding)
+
+
+class WeldingWriter:
+    """
+    Mesh writer stage of the exporters: collects the appended records and,
+    on `close()`, writes their welded surface meshes and the instance
+    records to `writer`. `eps` defaults to the `weld_tolerance` of the
+    model tolerance `model_tol`.
+    """
+    def __init__(self, writer: Any, eps: Optional[float] = None, model_tol: Optional[float] = None,
+                 as_lists: bool = False):
+        self.writer = writer
+        self.eps = eps
+        self.model_tol = model_tol
+        self.as_lists = as_lists
+        self._records: List[Dict] = []
+
+    def append(self, record: Dict) -> None:
+        self._records.append(record)
+
+    def close(self) -> None:
+        eps = self.eps if self.eps is not None else weld_tolerance(self.model_tol, self._records)
+        welded, n_merged = weld_records(self._records, eps, self.as_lists)
+        with self.writer:
+            for record in welded:
+                self.writer.append(record)
+        print(f'merged {n_merged} vertices (tolerance {eps:g})')
+
+    def __enter__(self) -> 'WeldingWriter':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def add_weld_args(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument('--weld', dest='weld', action='store_true',
+                        help='weld the boundary vertices of all face meshes into shared vertex buffers '
+                             'when writing; boundary curves are not written')
+    parser.add_argument('--weld-tol', dest='weld_tol', action='store', type=float, default=None,
+                        help='welding distance, the largest tolerance of the shape\'s vertices and '
+                             'edges by default')
+
+
+def _process_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Weld the boundary vertices of exported face meshes')
+    parser.add_argument('meshes_file', action='store', help='path to mesh file')
+    parser.add_argument('--output', dest='output', action='store', default='_welded.bin',
+                        help='path of the welded mesh file (.bin or .jsonl)')
+    parser.add_argument('--tol', dest='tol', action='store', type=float, default=None,
+                        help='welding distance, 1e-6 of the model size by default')
+    return parser.parse_args()
+
+
+def main():
+    args = _process_args()
+    records = list(iter_meshes(Path(args.meshes_file)))
+    eps = args.tol if args.tol is not None else default_tolerance(records)
+    jsonl = Path(args.output).suffix == '.jsonl'
+    welded, n_merged = weld_records(records, eps, as_lists=jsonl)
+    with open_mesh_writer(Path(args.output)) as writer:
+        for record in welded:
+            writer.append(record)
+    print(f'merged {n_merged} vertices (tolerance {eps:g}) into {args.output}')
+
+
+if __name__ == '__main__':
+    main()